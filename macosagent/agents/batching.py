@@ -0,0 +1,239 @@
+"""Execution of the actions of one ReAct step as a batch.
+
+The model can return several actions per step, all planned on the state
+captured at the start of the step. Each action declares at registration
+(``effect=``) how it affects that state:
+
+* ``"input"``: keyboard events (typing, hot keys). Consecutive input actions
+  are coalesced into one event burst: the GUI lock is held across the burst,
+  and the waits for the UI to process the events (:func:`settle`) are merged
+  into a single wait at its end instead of one per action;
+* ``"gui"``, the default of GUI-bound actions: pointer events (clicks, drags,
+  scrolls) on the elements of the captured state;
+* ``"layout"``: actions that open, close or rearrange windows. The element
+  coordinates of the captured state are stale afterwards, so the batch stops
+  and its remaining actions are skipped and reported to the model, which
+  re-plans them on the next capture. That capture is the refresh;
+* ``"static"``, the default of actions registered with ``gui_bound=False``:
+  file edits and extraction. They leave the screen alone, so when a step ran
+  only static actions the next step reuses the captured state instead of
+  walking the accessibility tree and taking screenshots again.
+
+Each action runs within the action timeout of the agent (see
+:mod:`macosagent.deadlines`). An action that times out gets a
+:class:`TimedOutAction` result and, as its effect on the app is unknown,
+stops the batch like a layout change.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Mapping
+from contextlib import AbstractAsyncContextManager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from macosagent.deadlines import PhaseTimeout, deadline_scope, find_timeout
+from macosagent.llm.streaming import iterate_actions
+from macosagent.metrics import get_metrics
+from macosagent.profiling import get_profiler, instrument_pyautogui, profile_phase
+
+logger = logging.getLogger(__name__)
+
+EFFECTS = ("input", "gui", "layout", "static")
+
+
+def default_effect(gui_bound: bool) -> str:
+    return "gui" if gui_bound else "static"
+
+
+class EventBurst:
+    """Settle deadline shared by the actions of one burst of keyboard events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.deadline = 0.0
+        self.deferred = 0.0
+
+    def defer(self, seconds: float) -> None:
+        with self._lock:
+            self.deadline = max(self.deadline, time.monotonic() + seconds)
+            self.deferred += seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+_burst: ContextVar[EventBurst | None] = ContextVar("macosagent_event_burst", default=None)
+
+
+def settle(seconds: float) -> None:
+    """Give the UI ``seconds`` to process the events just posted.
+
+    Outside of an event burst this is ``time.sleep(seconds)``. Inside one, the
+    wait is deferred to the end of the burst, so a sequence of input actions
+    waits once, for the longest of their settle times.
+    """
+    burst = _burst.get()
+    if burst is None:
+        with profile_phase("settle"):
+            time.sleep(seconds)
+    else:
+        burst.defer(seconds)
+
+
+def action_name(action: Any) -> str:
+    return next(iter(action.model_dump(exclude_unset=True)), "")
+
+
+@dataclass
+class SkippedAction:
+    """Result of an action skipped after a layout change or a timeout in the same step."""
+
+    name: str
+    after: str
+    reason: str = "changed the layout"
+    is_done: bool = False
+    success: bool = False
+    error: str | None = None
+    include_in_memory: bool = True
+
+    @property
+    def extracted_content(self) -> str:
+        return f"Skipped {self.name}: {self.after} {self.reason}, plan it again on the new state"
+
+
+@dataclass
+class TimedOutAction:
+    """Result of an action that went past its deadline."""
+
+    name: str
+    timeout: PhaseTimeout
+    is_done: bool = False
+    success: bool = False
+    extracted_content: str | None = None
+    include_in_memory: bool = True
+
+    @property
+    def error(self) -> str:
+        return f"{self.name}: {self.timeout}, its effect on the app is unknown"
+
+
+class ActionBatch:
+    """Runs the actions of one step according to their declared effects.
+
+    Args:
+        effects: Effect of each action name; unknown actions count as ``"gui"``.
+        session: Returns the GUI lock session held across an event burst, an
+            async context manager such as :func:`macosagent.scheduler.async_gui_session`.
+        timeout: Time limit of each action in seconds, None for no limit.
+    """
+
+    def __init__(
+        self,
+        effects: Mapping[str, str],
+        session: Callable[[], AbstractAsyncContextManager] | None = None,
+        timeout: float | None = None,
+    ):
+        self.effects = effects
+        self.session = session or nullcontext
+        self.timeout = timeout
+        self.stopped_by: str | None = None
+        self.stop_reason = "changed the layout"
+        self.timed_out: list[dict[str, Any]] = []
+        self.touched_screen = False
+        self.executed: list[str] = []
+        self.skipped: list[str] = []
+        self.settle_saved = 0.0
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "skipped": self.skipped,
+            "stopped_by": self.stopped_by,
+            "touched_screen": self.touched_screen,
+            "timed_out": self.timed_out,
+            "settle_saved": self.settle_saved,
+        }
+
+    async def run(self, actions: Iterable[Any] | AsyncIterator[Any], act: Callable[[Any], Awaitable[Any]]) -> list[Any]:
+        """Execute ``actions`` (a list or an action stream) with ``act`` and return their results.
+
+        May be called more than once per step; a batch stopped by a layout
+        change skips the actions of later calls too.
+        """
+        results = []
+        burst = None
+        # A stream tells whether its next action already arrived, so that the GUI
+        # lock is not held while the model is still generating it.
+        ready = getattr(actions, "ready", None)
+        if get_profiler() is not None:
+            # The controllers have imported pyautogui by now.
+            instrument_pyautogui()
+        try:
+            async for action in iterate_actions(actions):
+                name = action_name(action)
+                if self.stopped_by is not None:
+                    logger.info(f"Skipping {name}: {self.stopped_by} {self.stop_reason}")
+                    self.skipped.append(name)
+                    results.append(SkippedAction(name, self.stopped_by, self.stop_reason))
+                    continue
+                effect = self.effects.get(name, "gui")
+                if effect == "input" and burst is None:
+                    burst = await self._start_burst()
+                elif effect != "input" and burst is not None:
+                    await self._end_burst(*burst)
+                    burst = None
+                # Before the action runs: a failed action may have touched the screen as well.
+                if effect != "static":
+                    self.touched_screen = True
+                if effect == "layout":
+                    self.stopped_by = name
+                try:
+                    results.append(await self._act(act, action))
+                except Exception as e:
+                    timeout = find_timeout(e)
+                    if timeout is None:
+                        raise
+                    logger.warning(f"Action {name}: {timeout}")
+                    get_metrics().record_timeout("action")
+                    self.timed_out.append({"action": name, **timeout.to_dict()})
+                    self.stopped_by, self.stop_reason = name, "timed out"
+                    results.append(TimedOutAction(name, timeout))
+                self.executed.append(name)
+                if burst is not None and ready is not None and not ready():
+                    await self._end_burst(*burst)
+                    burst = None
+        finally:
+            if burst is not None:
+                await self._end_burst(*burst)
+        return results
+
+    async def _act(self, act: Callable[[Any], Awaitable[Any]], action: Any) -> Any:
+        with deadline_scope("action", self.timeout) as deadline:
+            try:
+                return await asyncio.wait_for(act(action), deadline.remaining())
+            except PhaseTimeout:
+                raise
+            except TimeoutError:
+                deadline.cancel()
+                raise deadline.timeout() from None
+
+    async def _start_burst(self) -> tuple[EventBurst, Any, AbstractAsyncContextManager]:
+        session = self.session()
+        await session.__aenter__()
+        burst = EventBurst()
+        return burst, _burst.set(burst), session
+
+    async def _end_burst(self, burst: EventBurst, token: Any, session: AbstractAsyncContextManager) -> None:
+        _burst.reset(token)
+        try:
+            remaining = burst.remaining()
+            self.settle_saved += burst.deferred - remaining
+            if remaining > 0:
+                with profile_phase("settle"):
+                    await asyncio.sleep(remaining)
+        finally:
+            await session.__aexit__(None, None, None)
@@ -21,7 +21,7 @@ class BrowserAgent(Tool):
     }
     output_type = "string"
 
-    llm = create_langchain_llm_client()
+    llm = create_langchain_llm_client(tier="vision")
     @trace_with_metadata(observation_name="browser_agent", tags=["browser_agent"])
     def forward(self, instruction: str) -> str:
         logger.info(f"BrowserAgent instruction: {instruction}")
@@ -13,6 +13,8 @@ from macosagent.agents.calendar_agent.calendar.utils import (
     BoxDrawer,
     parse_axvalue_bounds,
 )
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +48,9 @@ class CalendarContext:
 
 
     def get_state(self):
-        windows, screenshots = self.calendar.get_app_windows()
+        # Only the capture itself needs the desktop; drawing the boxes does not.
+        with gui_session('calendar_agent', getattr(self.calendar, 'calendar_app', None)):
+            windows, screenshots = self.calendar.get_app_windows()
         self.state.accessibility_tree = windows
         self.state.screenshots = screenshots
         frame = parse_axvalue_bounds(windows[0]["attributes"]["AXFrame"])
@@ -61,7 +65,8 @@ class CalendarContext:
         draw = ImageDraw.Draw(background)
         # Process the tree and draw bounding boxes
         som_drawer = BoxDrawer()
-        boxes = som_drawer.process_tree(draw, windows, offset)
+        with profile_phase("box_drawer"):
+            boxes = som_drawer.process_tree(draw, windows, offset)
         self.state.screenshots_som = [background]
         self.state.accessibility_tree_json = boxes
         return self.state
@@ -2,7 +2,6 @@ import enum
 import json
 import logging
 import re
-import subprocess
 import tempfile
 from datetime import datetime
 from typing import Generic, TypeVar
@@ -23,6 +22,7 @@ from macosagent.agents.calendar_agent.controller.views import (
     DoneAction,
     InputTextAction,
 )
+from macosagent.deadlines import run_command
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +49,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=ExtendedOutputModel,
+                gui_bound=False,
             )
             async def done(params: ExtendedOutputModel):
                 # Exclude success from the output JSON since it's an internal parameter
@@ -65,6 +66,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=DoneAction,
+                gui_bound=False,
             )
             async def done(params: DoneAction):
                 return ActionResult(is_done=True, success=params.success, extracted_content=params.text)
@@ -98,6 +100,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Input text into the element",
             param_model=InputTextAction,
+            effect="input",
         )
         async def input_text(params: InputTextAction, context: CalendarContext):
             index = params.index
@@ -119,6 +122,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Create calendar event",
             param_model=CreateCalendarEventAction,
+            effect="layout",
         )
         async def create_calendar_event(params: CreateCalendarEventAction):
             cal = icalendar.Calendar()
@@ -139,7 +143,7 @@ class Controller(Generic[Context]):
                 f.write(cal.to_ical())
                 f.flush()
                 logger.info(f"Created calendar event {f.name}")
-                subprocess.run(['open', f.name], check=False)
+                run_command(['open', f.name], check=False)
             return ActionResult(is_done=False, success=True, extracted_content=f"🗓️  Created calendar event {params.summary}")
 
     async def act(
@@ -219,7 +223,7 @@ def get_calendar_events(start_date, end_date):
     '''
     logger.info(f"Script: {script}")
     try:
-        result = subprocess.run(['osascript', '-e', script], capture_output=True, text=True, encoding='utf-8', check=False)
+        result = run_command(['osascript', '-e', script], capture_output=True, text=True, encoding='utf-8', check=False)
         if result.returncode != 0:
             return f"Error executing AppleScript: {result.stderr}"
         return result.stdout
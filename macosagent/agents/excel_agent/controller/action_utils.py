@@ -170,8 +170,9 @@ def parsing_response_to_pyautogui_code(responses, input_swap:bool=True) -> str:
 
     return pyautogui_code
 
-import openpyxl
-from openpyxl.utils import get_column_letter
+from macosagent.lazy import lazy_import
+
+openpyxl = lazy_import("openpyxl")
 
 
 def insert_text_to_cell_function(file_path, file_save_path, sheet_name, cell_address,insert_text, insert_pos):
@@ -243,9 +244,8 @@ def insert_text_to_cell_function(file_path, file_save_path, sheet_name, cell_add
     
     return result
 
-from openpyxl import Workbook
 def create_excel_function(input_path):
-    wb = Workbook()
+    wb = openpyxl.Workbook()
     # 保存为Excel文件
     wb.save(input_path)
     
@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import json
 import enum
 import logging
@@ -16,6 +15,7 @@ from langchain_openai import AzureChatOpenAI, AzureOpenAI
 from omegaconf import OmegaConf
 from pydantic import BaseModel
 import time 
+from macosagent.agents.imaging import ImagePolicy
 from macosagent.agents.excel_agent.controller.registry.service import Registry
 from macosagent.agents.excel_agent.excel.context import ExcelContext
 from macosagent.agents.excel_agent.controller.views import ClickElementAction, InputTextAction, DoneAction, OpenExcelAction, SaveFileAction
@@ -26,6 +26,7 @@ import pyautogui
 import re
 import shutil
 
+from macosagent.deadlines import run_command
 from macosagent.llm.llm import create_smol_llm_client
 
 logger = logging.getLogger(__name__)
@@ -49,6 +50,7 @@ class Controller(Generic[Context]):
 			@self.registry.action(
 				'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
 				param_model=ExtendedOutputModel,
+				gui_bound=False,
 			)
 			async def done(params: ExtendedOutputModel):
 				# Exclude success from the output JSON since it's an internal parameter
@@ -60,7 +62,7 @@ class Controller(Generic[Context]):
 						output_dict[key] = value.value
 				def run_applescript(script):
 					"""运行 AppleScript 并返回输出"""
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -86,6 +88,7 @@ class Controller(Generic[Context]):
 			@self.registry.action(
 				'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
 				param_model=DoneAction,
+				gui_bound=False,
 			)
 			async def done(params: DoneAction):
 				return ActionResult(is_done=True, success=params.success, extracted_content=params.text)
@@ -119,6 +122,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Input text into the element",
 			param_model=InputTextAction,
+			effect="input",
 		)
 		async def input_text(params: InputTextAction, context: ExcelContext):
 			offset = context.state.offset
@@ -137,6 +141,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Open mac excel application with file path.",
 			param_model=OpenExcelAction,
+			effect="layout",
 		)
 		async def open_excel(params: OpenExcelAction, context: ExcelContext):
 			context.excel.open_excel(params.file_path)
@@ -145,6 +150,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save current file opened by excel application into a path.",
 			param_model=SaveFileAction,
+			effect="input",
 		)
 		async def save_file(params: SaveFileAction, context: ExcelContext):
 			
@@ -162,6 +168,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Generate pyautogui codes to compelete a subgoal , this includes all possible actions. Use this one other actions failed to achieve the expected goals.",
 			param_model=ComputerUseAction,
+			effect="layout",
 		)
 		async def computer_use(params: ComputerUseAction,context:ExcelContext):
 			# client = AzureChatOpenAI(
@@ -172,7 +179,7 @@ class Controller(Generic[Context]):
 			# 		api_version=os.environ.get("OPENAI_API_VERSION"),
 			# 		max_completion_tokens=256,
 			# 	)
-			client = create_smol_llm_client()
+			client = create_smol_llm_client(tier="vision")
 			SYSTEM_PROMPT = """You are an AI agent designed to automate GUI tasks. Your goal is to accomplish the task.
 				You will be given a task instruction, interactive elements, the clean screenshot, and screenshot with highlighted elements. You are provided with screenshots of the app, not the entire desktop. The current offset of the app is x:""" +  f""" {context.state.offset[0]}, y: {context.state.offset[1]}.""" + """ Please take these offsets into account when generating positions.
 				Please output the next action and wait for the next observation. 
@@ -210,14 +217,13 @@ class Controller(Generic[Context]):
 				In order to improve the success rate of interaction, the position should be in the middle of bounding box, not on the edge.
 				NOTE that, this is the Mac operating system. The hot key for 'paste' is 'command v' instead of 'ctrl v'. The hot key for 'save' is 'command s' instead of 'ctrl s'. 
 			"""
-			def encode_image(image_path):
-				with open(image_path, "rb") as image_file:
-					return base64.b64encode(image_file.read()).decode("utf-8")
+			# The positions are read off the screenshots, so they keep their size; only their encoding follows the policy.
+			image_policy = ImagePolicy.from_env('excel_agent')
 			try:
-				context.state.screenshots[-1].save('./temp_screenshots.png')
-				context.state.screenshots_som[-1].save('./temp_screenshots_som.png')
+				screenshot = image_policy.encode(context.state.screenshots[-1], resize=False)
+				screenshot_som = image_policy.encode(context.state.screenshots_som[-1], resize=False)
 			except:
-				return ActionResult(is_done=False, success=False, extracted_content=f"save image failed", include_in_memory=True)
+				return ActionResult(is_done=False, success=False, extracted_content="encode image failed", include_in_memory=True)
 			try:
 				messages = [
 				{"role": "system", "content": SYSTEM_PROMPT},
@@ -225,11 +231,11 @@ class Controller(Generic[Context]):
 					{"type": "text", "text": params.goal_description},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots.png')}"}
+						{"url": screenshot.data_url}
 					},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots_som.png')}"}
+						{"url": screenshot_som.data_url}
 					},
 				]},
 	
@@ -267,12 +273,13 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save the current file opened by word and close the word",
 			param_model=SaveAndCloseAction,
+			effect="layout",
 		)
 		async def save_and_close(params: SaveAndCloseAction,context:ExcelContext):
 			try:
 				def run_applescript(script):
 					"""运行 AppleScript 并返回输出"""
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -306,6 +313,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert text to a specific cell. before executing this action, one must first save and close the current file.",
 			param_model=InsertCellTextAction,
+			gui_bound=False,
 		)
 		async def insert_cell_text(params: InsertCellTextAction,context:ExcelContext):
 			result = insert_text_to_cell_function(params.file_path,params.file_save_path,params.sheet_name,params.cell_address,params.insert_text,params.insert_pos)
@@ -317,6 +325,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"delete text of a specific cell. before executing this action, one must first save and close the current file.",
 			param_model=DeleteCellTextAction,
+			gui_bound=False,
 		)
 		async def delete_cell_text(params: DeleteCellTextAction,context:ExcelContext):
 			result = delete_single_cell_text_function(params.file_path,params.file_save_path,params.sheet_name,params.cell_address)
@@ -329,6 +338,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"create a ppt file",
 			param_model=CreateExcelAction,
+			gui_bound=False,
 		)
 		async def create_worksheet(params: CreateExcelAction,context:ExcelContext):
 			try:
@@ -27,6 +27,8 @@ import random
 
 from macosagent.agents.excel_agent.excel.excel import Excel
 from macosagent.agents.excel_agent.excel.utils import BoxDrawer, parse_axvalue_bounds
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 logger = logging.getLogger(__name__)
 
 
@@ -57,7 +59,9 @@ class ExcelContext:
 
 
 	def get_state(self):
-		windows, screenshots = self.excel.get_app_windows()
+		# Only the capture itself needs the desktop; drawing the boxes does not.
+		with gui_session('excel_agent', getattr(self.excel, 'excel_app', None)):
+			windows, screenshots = self.excel.get_app_windows()
 		self.state.accessibility_tree = windows
 		self.state.screenshots = screenshots
 		frame = parse_axvalue_bounds(windows[0]["attributes"]["AXFrame"])
@@ -72,7 +76,8 @@ class ExcelContext:
 		draw = ImageDraw.Draw(background)
 		# Process the tree and draw bounding boxes
 		som_drawer = BoxDrawer()
-		boxes = som_drawer.process_tree(draw, windows, offset)
+		with profile_phase("box_drawer"):
+			boxes = som_drawer.process_tree(draw, windows, offset)
 		self.state.screenshots_som = [background]
 		self.state.accessibility_tree_json = boxes
 		return self.state
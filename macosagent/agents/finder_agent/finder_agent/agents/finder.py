@@ -30,7 +30,7 @@ def create_agent() :
     # else:
     #     raise ValueError("Invalid API server type. Please check your .env file and ensure API_SERVER_TYPE is set to either 'AZURE' or 'OPENAI'.")
 
-    model = create_smol_llm_client()
+    model = create_smol_llm_client(tier="planner")
 
     prompt_path = str(Path('macosagent/agents/finder_agent/finder_agent').joinpath("prompt.yaml"))
     # with open(str(files("finder_agent").joinpath("prompt.yaml"))) as file:    
@@ -45,7 +45,7 @@ class ComputerControl(Tool):
     # else:
     #     raise ValueError("Invalid API server type. Please check your .env file and ensure API_SERVER_TYPE is set to either 'AZURE' or 'OPENAI'.")
 
-    model = create_smol_llm_client()
+    model = create_smol_llm_client(tier="vision")
 
     SYSTEM_PROMPT = """You are an AI agent designed to automate GUI tasks. Your goal is to accomplish the task.
     You will be given a task instruction, interactive elements, the clean screenshot, and screenshot with highlighted elements.
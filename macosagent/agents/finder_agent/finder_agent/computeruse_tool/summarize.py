@@ -46,7 +46,7 @@ class Summarizer(Tool):
     # else:
     #     raise ValueError("Invalid API server type. Please check your .env file and ensure API_SERVER_TYPE is set to either 'AZURE' or 'OPENAI'.")
 
-    model = create_smol_llm_client()
+    model = create_smol_llm_client(tier="fast")
 
     SYSTEM_PROMPT = """You are an AI agent designed to automate GUI tasks. Your goal is to decompose and analyze the task.
     You will be given a task instruction and the current screenshot.
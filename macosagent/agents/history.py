@@ -0,0 +1,221 @@
+"""Token-budgeted step history of the ReAct app agents.
+
+Each step used to replay every earlier tool call and observation verbatim,
+so the prompt tokens of a run grew quadratically with its steps.
+:class:`StepHistory` keeps the last steps verbatim and collapses older ones
+into a rolling summary once the history is over its token budget:
+
+* ``MACOSAGENT_HISTORY_TOKENS`` (default 12000) is the budget of the history
+  part of the prompt, and ``MACOSAGENT_HISTORY_TOKENS_<AGENT>`` (e.g.
+  ``MACOSAGENT_HISTORY_TOKENS_EXCEL_AGENT``) overrides it for one agent;
+* ``MACOSAGENT_HISTORY_KEEP_STEPS`` (default 3) is the number of last steps
+  that always stay verbatim.
+
+The summary needs no extra LLM call: a collapsed step becomes one line with
+its goal, its actions and their results, and the ``memory`` the model wrote
+at the last collapsed step is kept as is. Tokens are counted with the
+tokenizer of the model (tiktoken), once per step and once per summary line.
+Where tiktoken cannot load the encoding of the model (e.g. offline, as it
+downloads it on first use), token counts are estimated as a quarter of the
+characters.
+"""
+
+import functools
+import json
+import logging
+import os
+from collections.abc import Iterator
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_TOKENS = 12000
+DEFAULT_KEEP_STEPS = 3
+# Share of the budget the summary may take; its oldest lines are dropped beyond it.
+SUMMARY_SHARE = 0.25
+# Tokens added by the chat format to every message.
+MESSAGE_OVERHEAD_TOKENS = 4
+MAX_SUMMARY_LINE_CHARS = 300
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={os.getenv(name)!r}")
+        return default
+
+
+def history_budget(agent: str) -> int:
+    """Token budget of the step history of ``agent``, e.g. ``"excel_agent"``."""
+    default = _int_env("MACOSAGENT_HISTORY_TOKENS", DEFAULT_HISTORY_TOKENS)
+    return _int_env(f"MACOSAGENT_HISTORY_TOKENS_{agent.upper()}", default)
+
+
+@functools.cache
+def _encoding(model: str | None) -> Any:
+    """tiktoken encoding of ``model``, or None if tiktoken or its data are not available."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model or "gpt-4o")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"No tokenizer for {model}, estimating token counts from characters: {e}")
+        return None
+
+
+class TokenCounter:
+    """Counts the prompt tokens of messages with the tokenizer of ``model``."""
+
+    def __init__(self, model: str | None = None):
+        self.model = model
+
+    def count_text(self, text: str) -> int:
+        encoding = _encoding(self.model)
+        if encoding is None:
+            return len(text) // 4 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: BaseMessage) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS
+        content = message.content
+        if isinstance(content, str):
+            tokens += self.count_text(content)
+        else:
+            for item in content:
+                if isinstance(item, dict) and "text" in item:
+                    tokens += self.count_text(item["text"])
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += self.count_text(tool_call["name"] + json.dumps(tool_call["args"], ensure_ascii=False))
+        return tokens
+
+
+def step_messages(step: dict[str, Any]) -> list[BaseMessage]:
+    """Prompt messages of a history step: the tool call, its tool message and the observations.
+
+    A step whose output had no tool call has the model's text, if any, instead.
+    """
+    if step["tool_calls"]:
+        messages: list[BaseMessage] = [
+            AIMessage(content="", tool_calls=step["tool_calls"]),
+            ToolMessage(content="", tool_call_id=step["tool_calls"][0]["id"]),
+        ]
+    else:
+        messages = [AIMessage(content=step["content"])] if step.get("content") else []
+    messages.extend(HumanMessage(content=obs) for obs in step["observation"])
+    return messages
+
+
+def _summary_line(number: int, step: dict[str, Any]) -> str:
+    args = step["tool_calls"][0]["args"] if step["tool_calls"] else {}
+    state = args.get("current_state") or {}
+    actions = ", ".join(
+        f"{name}({json.dumps(params, ensure_ascii=False)})"
+        for action in args.get("action") or []
+        for name, params in action.items()
+    )
+    line = f"Step {number}: goal: {state.get('next_goal', '')}; actions: {actions or 'none'}"
+    if step["observation"]:
+        line += "; " + " ".join(step["observation"])
+    if len(line) > MAX_SUMMARY_LINE_CHARS:
+        line = line[: MAX_SUMMARY_LINE_CHARS - 3] + "..."
+    return line
+
+
+class StepHistory:
+    """History steps of a run, as ``{"tool_calls": ..., "observation": [...]}`` dicts.
+
+    Iterating yields all the steps; :meth:`messages` gives the budgeted prompt view.
+
+    Args:
+        budget_tokens: Token budget of the history messages.
+        keep_steps: Number of last steps never collapsed.
+        counter: Token counter; counts with the default tokenizer if not given.
+    """
+
+    def __init__(self, budget_tokens: int, keep_steps: int | None = None, counter: TokenCounter | None = None):
+        self.budget_tokens = budget_tokens
+        self.keep_steps = keep_steps if keep_steps is not None else _int_env("MACOSAGENT_HISTORY_KEEP_STEPS", DEFAULT_KEEP_STEPS)
+        self.counter = counter or TokenCounter()
+        self.steps: list[dict[str, Any]] = []
+        self._tokens: list[int] = []
+        # Steps before this index are in the summary.
+        self.collapsed = 0
+        self._summary_lines: list[str] = []
+        self._summary_memory = ""
+        # Tokens of each summary line and of the memory line, counted once when they are added.
+        self._line_tokens: list[int] = []
+        self._line_tokens_total = 0
+        self._memory_tokens = 0
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(self.steps)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def append(self, step: dict[str, Any]) -> None:
+        self.steps.append(step)
+        self._tokens.append(sum(self.counter.count_message(message) for message in step_messages(step)))
+        self._compact()
+
+    def verbatim_tokens(self) -> int:
+        return sum(self._tokens[self.collapsed:])
+
+    def _compact(self) -> None:
+        while self.verbatim_tokens() + self.summary_tokens() > self.budget_tokens and len(self.steps) - self.collapsed > self.keep_steps:
+            step = self.steps[self.collapsed]
+            self.collapsed += 1
+            line = _summary_line(self.collapsed, step)
+            self._summary_lines.append(line)
+            self._line_tokens.append(self.counter.count_text("\n" + line))
+            self._line_tokens_total += self._line_tokens[-1]
+            args = step["tool_calls"][0]["args"] if step["tool_calls"] else {}
+            memory = (args.get("current_state") or {}).get("memory")
+            if memory:
+                self._summary_memory = memory
+                self._memory_tokens = self.counter.count_text(f"\nMemory at step {self.collapsed}: {memory}")
+        max_summary_tokens = int(self.budget_tokens * SUMMARY_SHARE)
+        while len(self._summary_lines) > 1 and self.summary_tokens() > max_summary_tokens:
+            self._summary_lines.pop(0)
+            self._line_tokens_total -= self._line_tokens.pop(0)
+        if self.collapsed:
+            logger.debug(
+                f"History: {self.collapsed} steps summarized, {len(self.steps) - self.collapsed} verbatim, "
+                f"{self.verbatim_tokens() + self.summary_tokens()}/{self.budget_tokens} tokens"
+            )
+
+    def _summary_header(self) -> str:
+        omitted = self.collapsed - len(self._summary_lines)
+        header = f"[Summary of steps 1-{self.collapsed}]"
+        return header + f"\n(steps 1-{omitted} omitted)" if omitted else header
+
+    def summary(self) -> str | None:
+        if not self.collapsed:
+            return None
+        lines = [self._summary_header(), *self._summary_lines]
+        if self._summary_memory:
+            lines.append(f"Memory at step {self.collapsed}: {self._summary_memory}")
+        return "\n".join(lines)
+
+    def summary_tokens(self) -> int:
+        """Tokens of the summary message, from the cached counts of its lines."""
+        if not self.collapsed:
+            return 0
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.counter.count_text(self._summary_header()) + self._line_tokens_total
+        return tokens + (self._memory_tokens if self._summary_memory else 0)
+
+    def messages(self) -> list[BaseMessage]:
+        """The summary of the collapsed steps, if any, then the last steps verbatim."""
+        messages: list[BaseMessage] = []
+        summary = self.summary()
+        if summary is not None:
+            messages.append(HumanMessage(content=summary))
+        for step in self.steps[self.collapsed:]:
+            messages.extend(step_messages(step))
+        return messages
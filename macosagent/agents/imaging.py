@@ -0,0 +1,364 @@
+"""Encoding of the screenshots sent to the model.
+
+Screenshots of Retina windows used to be sent as full-size PNGs, several
+megabytes per step. An :class:`ImagePolicy` sets how they are encoded:
+
+* ``MACOSAGENT_IMAGE_FORMAT``: ``jpeg`` (default), ``webp`` or ``png``;
+* ``MACOSAGENT_IMAGE_MAX_EDGE`` and ``MACOSAGENT_IMAGE_SHORT_EDGE``: the image
+  is scaled down to fit both, by default 2048 and 768 pixels, the size OpenAI
+  vision models scale high-detail images to anyway; 0 disables a limit;
+* ``MACOSAGENT_IMAGE_QUALITY`` (default 85): JPEG/WebP quality;
+* ``MACOSAGENT_IMAGE_TARGET_BYTES`` (default 0, no target): the quality is
+  lowered, down to ``MACOSAGENT_IMAGE_MIN_QUALITY`` (default 40), until the
+  image fits;
+* ``MACOSAGENT_IMAGE_GRAYSCALE``: ``true`` drops the colors.
+
+Many steps (reading text, a failed click) leave the window as it was.
+:class:`ScreenDiffer` compares each screenshot with the one of the previous
+step, using a perceptual hash and the bounding box of the changed pixels on
+downsampled frames. The prompt of each step is built from scratch and the
+history carries no images, so the last full frame is always sent again, as
+already encoded: alone with a note when the screen is unchanged, or followed
+by a crop of the changed region. This skips encoding unchanged screens and
+points the model at what changed, but does not make the prompt smaller:
+
+* ``MACOSAGENT_SCREEN_DIFF`` (default ``false``) turns diffing on;
+* ``MACOSAGENT_SCREEN_DIFF_PIXEL_THRESHOLD`` (default 16): gray level
+  difference from which a pixel counts as changed;
+* ``MACOSAGENT_SCREEN_DIFF_HASH_DISTANCE`` (default 48): hash bits, out of 256,
+  from which the frame is sent in full without looking for a changed region;
+* ``MACOSAGENT_SCREEN_DIFF_CROP_SHARE`` (default 0.3): largest share of the
+  frame sent as a crop;
+* ``MACOSAGENT_SCREEN_DIFF_MAX_REUSE`` (default 2): steps in a row without a
+  full frame before one is sent anyway.
+
+Each setting can be overridden for one agent with an ``_<AGENT>`` suffix,
+e.g. ``MACOSAGENT_IMAGE_FORMAT_WORD_AGENT=png``.
+"""
+
+import base64
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any
+
+from macosagent.metrics import get_metrics
+from macosagent.profiling import profile_phase
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    format: str
+    size: tuple[int, int]
+    original_size: tuple[int, int]
+    quality: int | None
+    encode_time: float
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "jpeg" else self.format
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64," + base64.b64encode(self.data).decode()
+
+    @property
+    def scale(self) -> float:
+        """Size of the encoded image relative to the original one."""
+        return self.size[0] / self.original_size[0] if self.original_size[0] else 1.0
+
+    def describe(self) -> str:
+        quality = f" q{self.quality}" if self.quality is not None else ""
+        return (
+            f"{self.original_size[0]}x{self.original_size[1]} -> {self.size[0]}x{self.size[1]} "
+            f"{self.format}{quality}, {len(self.data) / 1024:.0f} KB in {self.encode_time * 1000:.0f} ms"
+        )
+
+
+def _setting(name: str, agent: str | None, default: str) -> str:
+    value = os.getenv(name, default)
+    if agent:
+        value = os.getenv(f"{name}_{agent.upper()}", value)
+    return value
+
+
+def _int_setting(name: str, agent: str | None, default: int) -> int:
+    return int(_float_setting(name, agent, default))
+
+
+def _float_setting(name: str, agent: str | None, default: float) -> float:
+    value = _setting(name, agent, str(default))
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        return default
+
+
+@dataclass(frozen=True)
+class ImagePolicy:
+    format: str = "jpeg"
+    max_edge: int = 2048
+    short_edge: int = 768
+    quality: int = 85
+    target_bytes: int = 0
+    min_quality: int = 40
+    grayscale: bool = False
+
+    @classmethod
+    def from_env(cls, agent: str | None = None) -> "ImagePolicy":
+        """Policy from the ``MACOSAGENT_IMAGE_*`` settings, with the overrides of ``agent``."""
+        image_format = _setting("MACOSAGENT_IMAGE_FORMAT", agent, cls.format).lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in FORMATS:
+            logger.warning(f"Unknown image format {image_format!r}, using {cls.format}")
+            image_format = cls.format
+        return cls(
+            format=image_format,
+            max_edge=_int_setting("MACOSAGENT_IMAGE_MAX_EDGE", agent, cls.max_edge),
+            short_edge=_int_setting("MACOSAGENT_IMAGE_SHORT_EDGE", agent, cls.short_edge),
+            quality=_int_setting("MACOSAGENT_IMAGE_QUALITY", agent, cls.quality),
+            target_bytes=_int_setting("MACOSAGENT_IMAGE_TARGET_BYTES", agent, cls.target_bytes),
+            min_quality=_int_setting("MACOSAGENT_IMAGE_MIN_QUALITY", agent, cls.min_quality),
+            grayscale=_setting("MACOSAGENT_IMAGE_GRAYSCALE", agent, "false").lower() == "true",
+        )
+
+    def fit(self, size: tuple[int, int]) -> tuple[int, int]:
+        """Size of an image of ``size`` once scaled down to the edge limits."""
+        width, height = size
+        scale = 1.0
+        if self.max_edge > 0:
+            scale = min(scale, self.max_edge / max(width, height, 1))
+        if self.short_edge > 0:
+            scale = min(scale, self.short_edge / max(min(width, height), 1))
+        if scale >= 1.0:
+            return size
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _save(self, image: Any, quality: int | None) -> bytes:
+        buffered = BytesIO()
+        options = {} if quality is None else {"quality": quality}
+        image.save(buffered, format=FORMATS[self.format], **options)
+        return buffered.getvalue()
+
+    @profile_phase("image_encode")
+    def encode(self, image: Any, resize: bool = True) -> EncodedImage:
+        """Encode a PIL image; ``resize=False`` keeps its pixel coordinates, e.g. for position-based actions."""
+        from PIL import Image
+
+        start_time = time.perf_counter()
+        original_size = image.size
+        if resize:
+            size = self.fit(original_size)
+            if size != original_size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+        if self.grayscale:
+            image = image.convert("L")
+        elif self.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        if self.format == "png":
+            quality = None
+            data = self._save(image, None)
+        else:
+            quality = self.quality
+            data = self._save(image, quality)
+            if self.target_bytes and len(data) > self.target_bytes:
+                quality, data = self._search_quality(image, data)
+        encoded = EncodedImage(data, self.format, image.size, original_size, quality, time.perf_counter() - start_time)
+        if self.target_bytes and len(data) > self.target_bytes:
+            logger.info(f"Screenshot over its {self.target_bytes} byte target at the lowest quality")
+        logger.info(f"Screenshot: {encoded.describe()}")
+        return encoded
+
+    def _search_quality(self, image: Any, data: bytes) -> tuple[int, bytes]:
+        """Highest quality fitting the byte target, by bisection; the lowest quality if none does."""
+        low, high = self.min_quality, self.quality - 1
+        best: tuple[int, bytes] | None = None
+        # When nothing fits, the last quality tried is the lowest one.
+        lowest = (self.quality, data)
+        while low <= high:
+            quality = (low + high) // 2
+            candidate = self._save(image, quality)
+            if len(candidate) <= self.target_bytes:
+                best = (quality, candidate)
+                low = quality + 1
+            else:
+                lowest = (quality, candidate)
+                high = quality - 1
+        return best if best is not None else lowest
+
+
+# Downsampling factor of the frames compared by ScreenDiffer.
+DIFF_REDUCE = 4
+# Margin, in pixels of the frame, around the changed region of a crop.
+CROP_MARGIN = 16
+
+
+@dataclass(frozen=True)
+class ScreenFrame:
+    """What a step sends of its screenshot: ``full``, a ``crop`` of the changed region, or ``unchanged``.
+
+    ``image`` is the newly encoded image (the frame or the crop, None when
+    unchanged) and ``reference`` the last full frame, sent again with a crop
+    or an unchanged note so the model always sees the whole screen.
+    """
+
+    kind: str
+    image: EncodedImage | None
+    reference: EncodedImage | None = None
+    # Changed region (x, y, w, h) of a crop, in pixels of the reference frame.
+    box: tuple[int, int, int, int] | None = None
+    frame_size: tuple[int, int] | None = None
+
+    def note(self) -> str | None:
+        """Text sent before the images."""
+        if self.kind == "unchanged":
+            return "The screen has not changed since the last screenshot, which is attached again below."
+        if self.kind == "crop":
+            x, y, w, h = self.box
+            return (
+                f"Only a region of the screen changed since the last screenshot. The first image below is that "
+                f"screenshot, the second one the current content of the region at x={x}, y={y}, width={w}, "
+                f"height={h} in its {self.frame_size[0]}x{self.frame_size[1]} pixels."
+            )
+        return None
+
+    def content(self) -> list[dict[str, Any]]:
+        """Message content parts of the frame: the note, the reference frame, then the new image."""
+        parts: list[dict[str, Any]] = []
+        note = self.note()
+        if note is not None:
+            parts.append({"type": "text", "text": note})
+        for image in (self.reference, self.image):
+            if image is not None:
+                parts.append({"type": "image_url", "image_url": {"url": image.data_url}})
+        return parts
+
+
+@dataclass
+class ScreenDiffStats:
+    full: int = 0
+    crop: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class ScreenDiffer:
+    """Decides, step after step, how much of the screenshot of one app context to send."""
+
+    policy: ImagePolicy = field(default_factory=ImagePolicy)
+    enabled: bool = False
+    pixel_threshold: int = 16
+    hash_distance: int = 48
+    crop_share: float = 0.3
+    max_reuse: int = 2
+
+    def __post_init__(self):
+        self.reset()
+
+    @classmethod
+    def from_env(cls, agent: str | None = None, policy: ImagePolicy | None = None) -> "ScreenDiffer":
+        return cls(
+            policy=policy or ImagePolicy.from_env(agent),
+            enabled=_setting("MACOSAGENT_SCREEN_DIFF", agent, "false").lower() == "true",
+            pixel_threshold=_int_setting("MACOSAGENT_SCREEN_DIFF_PIXEL_THRESHOLD", agent, cls.pixel_threshold),
+            hash_distance=_int_setting("MACOSAGENT_SCREEN_DIFF_HASH_DISTANCE", agent, cls.hash_distance),
+            crop_share=_float_setting("MACOSAGENT_SCREEN_DIFF_CROP_SHARE", agent, cls.crop_share),
+            max_reuse=_int_setting("MACOSAGENT_SCREEN_DIFF_MAX_REUSE", agent, cls.max_reuse),
+        )
+
+    def reset(self) -> None:
+        """Forget the previous frame, e.g. at the start of a run; the next frame is sent in full."""
+        self.stats = ScreenDiffStats()
+        self._previous: Any = None
+        self._previous_hash = 0
+        self._reference: EncodedImage | None = None
+        self._reused = 0
+
+    @staticmethod
+    def _hash(small: Any) -> int:
+        """256-bit difference hash of a downsampled grayscale frame."""
+        from PIL import Image
+
+        pixels = small.resize((17, 16), Image.Resampling.BILINEAR).tobytes()
+        bits = 0
+        for row in range(16):
+            for col in range(16):
+                bits = (bits << 1) | (pixels[row * 17 + col] > pixels[row * 17 + col + 1])
+        return bits
+
+    def _changed_box(self, previous: Any, small: Any, size: tuple[int, int]) -> tuple[int, int, int, int] | None:
+        """Changed region (x, y, w, h) between two downsampled frames, in pixels of the full frame."""
+        from PIL import ImageChops
+
+        threshold = self.pixel_threshold
+        mask = ImageChops.difference(previous, small).point(lambda value: 255 if value > threshold else 0)
+        box = mask.getbbox()
+        if box is None:
+            return None
+        left, top, right, bottom = (edge * DIFF_REDUCE for edge in box)
+        left, top = max(0, left - CROP_MARGIN), max(0, top - CROP_MARGIN)
+        right, bottom = min(size[0], right + CROP_MARGIN), min(size[1], bottom + CROP_MARGIN)
+        return left, top, right - left, bottom - top
+
+    def prepare(self, image: Any) -> ScreenFrame:
+        """Compare ``image`` with the previous frame and encode what should be sent of it."""
+        if not self.enabled:
+            return self._full(image)
+        small = image.convert("L").reduce(DIFF_REDUCE)
+        frame_hash = self._hash(small)
+        previous, previous_hash = self._previous, self._previous_hash
+        self._previous, self._previous_hash = small, frame_hash
+        if (
+            previous is None
+            or self._reference is None
+            or previous.size != small.size
+            or self._reused >= self.max_reuse
+            or bin(frame_hash ^ previous_hash).count("1") > self.hash_distance
+        ):
+            return self._full(image)
+        box = self._changed_box(previous, small, image.size)
+        reference = self._reference
+        if box is None:
+            frame = ScreenFrame("unchanged", None, reference=reference, frame_size=reference.size)
+        elif box[2] * box[3] <= self.crop_share * image.size[0] * image.size[1]:
+            x, y, w, h = box
+            crop = self.policy.encode(image.crop((x, y, x + w, y + h)))
+            scale = reference.size[0] / image.size[0]
+            frame = ScreenFrame(
+                "crop",
+                crop,
+                reference=reference,
+                box=(round(x * scale), round(y * scale), round(w * scale), round(h * scale)),
+                frame_size=reference.size,
+            )
+        else:
+            return self._full(image)
+        self._reused += 1
+        return self._record(frame)
+
+    def _full(self, image: Any) -> ScreenFrame:
+        encoded = self.policy.encode(image)
+        self._reference = encoded
+        self._reused = 0
+        return self._record(ScreenFrame("full", encoded, frame_size=image.size))
+
+    def _record(self, frame: ScreenFrame) -> ScreenFrame:
+        setattr(self.stats, frame.kind, getattr(self.stats, frame.kind) + 1)
+        get_metrics().record_screenshot(frame.kind)
+        if frame.kind != "full":
+            logger.info(f"Screenshot {frame.kind}: re-sending the last full screenshot as encoded")
+        return frame
@@ -0,0 +1,289 @@
+"""Pipelined step loop of the ReAct app agents.
+
+A step used to run strictly in order: state capture (accessibility walk, then
+``screencapture``, then set-of-marks drawing), the accessibility tree prompt,
+screenshot encoding, prompt assembly with the conversation log written to
+disk, the LLM call and a fresh event loop for the actions. Now:
+
+* :class:`StepLoop` keeps one event loop for a whole run and runs blocking
+  work on a few worker threads, so the screenshot is encoded while the text
+  of the prompt is assembled (the conversation log is written by the
+  background writer of :mod:`macosagent.artifacts`);
+* :func:`capture_windows` takes the window screenshots while the
+  accessibility trees are walked instead of after them.
+
+Every step records a :class:`StepTimeline` of its phases. It is logged at the
+end of the step, kept in the step log entry and exported as the
+``macosagent_step_phase_seconds`` histogram. Phases run with :meth:`StepLoop.call`
+can be given a timeout (see :mod:`macosagent.deadlines`).
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections.abc import Callable, Coroutine, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from macosagent.deadlines import deadline_scope
+from macosagent.metrics import get_metrics
+from macosagent.profiling import profile_phase
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Frame = tuple[float, float, float, float]
+
+
+@dataclass
+class Phase:
+    name: str
+    start: float
+    end: float
+    critical: bool = True
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class StepTimeline:
+    """Phases of one step, with start and end times relative to the start of the step.
+
+    Phases may overlap. Off-critical-path phases (``critical=False``) are work
+    the step does not wait for, such as writing logs; they may end after the
+    step itself.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time: float | None = None
+        self.phases: list[Phase] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start_time: float, end_time: float, critical: bool = True) -> Phase:
+        phase = Phase(name, start_time - self.start_time, end_time - self.start_time, critical)
+        with self._lock:
+            self.phases.append(phase)
+        return phase
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    def serial_time(self) -> float:
+        """Time the critical phases would take one after the other."""
+        with self._lock:
+            return sum(phase.duration for phase in self.phases if phase.critical)
+
+    def to_dict(self) -> dict[str, Any]:
+        serial_time = self.serial_time()
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase.start)
+        return {
+            "duration": round(self.duration, 4),
+            "serial": round(serial_time, 4),
+            "overlap": round(max(0.0, serial_time - self.duration), 4),
+            "phases": [
+                {
+                    "name": phase.name,
+                    "start": round(phase.start, 4),
+                    "end": round(phase.end, 4),
+                    "critical": phase.critical,
+                }
+                for phase in phases
+            ],
+        }
+
+    def format(self) -> str:
+        data = self.to_dict()
+        phases = ", ".join(
+            f"{phase['name']}{'' if phase['critical'] else '*'} {phase['start']:.3f}-{phase['end']:.3f}s"
+            for phase in data["phases"]
+        )
+        return f"{data['duration']:.3f}s ({data['overlap']:.3f}s overlapped; * off critical path): {phases}"
+
+
+class StepLoop:
+    """Event loop and worker threads shared by the steps of one agent run.
+
+    Use as a context manager around the run; :meth:`close` waits for the
+    off-critical-path work of the last step.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._runner = asyncio.Runner()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="macosagent-step")
+        self._background: set[Future] = set()
+        self._background_lock = threading.Lock()
+        # Workers still busy with calls that timed out; they are not waited for on close.
+        self._abandoned = 0
+        self.timeline = StepTimeline()
+
+    def __enter__(self) -> "StepLoop":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run one step on the loop of the run, with a new timeline."""
+        self.timeline = StepTimeline()
+        try:
+            # Run in the caller's current context so that metrics keep its agent and run id labels.
+            with profile_phase("step"):
+                return self._runner.run(coro, context=contextvars.copy_context())
+        finally:
+            self.timeline.finish()
+            logger.info(f"Step timeline: {self.timeline.format()}")
+
+    def _record(self, timeline: StepTimeline, name: str, start_time: float, critical: bool) -> None:
+        phase = timeline.add(name, start_time, time.perf_counter(), critical)
+        get_metrics().record_phase(name, phase.duration)
+
+    @contextmanager
+    def phase(self, name: str, critical: bool = True) -> Iterator[None]:
+        """Record the enclosed block, e.g. work done on the loop itself, as a phase."""
+        timeline = self.timeline
+        start_time = time.perf_counter()
+        try:
+            with profile_phase(name):
+                yield
+        finally:
+            self._record(timeline, name, start_time, critical)
+
+    def timed(self, name: str, fn: Callable[..., T], *args: Any, critical: bool = True) -> T:
+        """Call ``fn`` in the current thread, recording the call as a phase."""
+        with self.phase(name, critical):
+            return fn(*args)
+
+    def _submit(self, name: str, fn: Callable[..., T], args: tuple, critical: bool) -> Future:
+        timeline = self.timeline
+        context = contextvars.copy_context()
+
+        def call() -> T:
+            start_time = time.perf_counter()
+            try:
+                with profile_phase(name):
+                    return fn(*args)
+            finally:
+                self._record(timeline, name, start_time, critical)
+
+        return self._executor.submit(context.run, call)
+
+    def submit(self, name: str, fn: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        """Start ``fn`` on a worker thread now and return a future to await later."""
+        return asyncio.wrap_future(self._submit(name, fn, args, critical=True))
+
+    async def call(self, name: str, fn: Callable[..., T], *args: Any, timeout: float | None = None) -> T:
+        """Run blocking ``fn`` on a worker thread, keeping the loop free.
+
+        Raises:
+            PhaseTimeout: ``fn`` did not return within ``timeout`` seconds or the
+                current deadline. Its deadline scope is cancelled, which kills the
+                subprocesses it runs with :func:`macosagent.deadlines.run_command`.
+        """
+        with deadline_scope(name, timeout) as deadline:
+            future = self._submit(name, fn, args, critical=True)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), deadline.remaining())
+            except TimeoutError:
+                if future.done() and not future.cancelled():
+                    # Raised by ``fn`` itself, e.g. a subprocess it ran timed out.
+                    raise
+                deadline.cancel()
+                self._abandoned += 1
+                raise deadline.timeout() from None
+
+    def background(self, name: str, fn: Callable[..., Any], *args: Any) -> None:
+        """Run ``fn`` off the critical path; errors are logged, not raised."""
+        future = self._submit(name, fn, args, critical=False)
+        with self._background_lock:
+            self._background.add(future)
+        future.add_done_callback(self._background_done)
+
+    def _background_done(self, future: Future) -> None:
+        with self._background_lock:
+            self._background.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Background step work failed: {future.exception()!r}")
+
+    def close(self) -> None:
+        with self._background_lock:
+            pending = list(self._background)
+        wait(pending)
+        self._runner.close()
+        self._executor.shutdown(wait=not self._abandoned, cancel_futures=True)
+
+
+_capture_pool: ThreadPoolExecutor | None = None
+_capture_pool_lock = threading.Lock()
+
+
+def _get_capture_pool() -> ThreadPoolExecutor:
+    global _capture_pool
+    with _capture_pool_lock:
+        if _capture_pool is None:
+            _capture_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="macosagent-capture")
+        return _capture_pool
+
+
+def capture_windows(
+    windows: list[Any],
+    frame_of: Callable[[Any], Frame | None],
+    walk_tree: Callable[[Any], dict | None],
+    take_screenshot: Callable[[Frame], Any],
+) -> tuple[list[dict], list[Any]]:
+    """Walk the accessibility trees of ``windows`` while their screenshots are taken.
+
+    Screenshots only need the window frames, which are cheap to read, so the
+    ``screencapture`` subprocesses run on worker threads during the walk. As
+    before, the i-th screenshot shows the largest of the first i+1 windows.
+
+    Args:
+        windows: Accessibility elements of the app windows.
+        frame_of: Returns the ``(x, y, w, h)`` frame of a window, or None.
+        walk_tree: Returns the accessibility tree of a window.
+        take_screenshot: Captures a frame of the screen.
+
+    Returns:
+        The accessibility trees and the screenshots.
+    """
+    targets: list[Frame] = []
+    largest: Frame | None = None
+    for window in windows:
+        frame = frame_of(window)
+        if frame is None:
+            continue
+        if largest is None or frame[2] * frame[3] > largest[2] * largest[3]:
+            largest = frame
+        targets.append(largest)
+    pool = _get_capture_pool()
+
+    def screenshot(frame: Frame) -> Any:
+        with profile_phase("screencapture"):
+            return take_screenshot(frame)
+
+    screenshots = {
+        frame: pool.submit(contextvars.copy_context().run, screenshot, frame) for frame in dict.fromkeys(targets)
+    }
+    trees = []
+    for window in windows:
+        try:
+            with profile_phase("ax_walk"):
+                tree = walk_tree(window)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Could not get the accessibility tree of a window: {e}")
+            continue
+        if tree is not None:
+            trees.append(tree)
+    return trees, [screenshots[frame].result() for frame in targets]
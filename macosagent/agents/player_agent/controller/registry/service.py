@@ -17,17 +17,22 @@ from browser_use.utils import time_execution_async, time_execution_sync
 from pydantic import BaseModel, Field, create_model
 
 from macosagent.agents.player_agent.player.context import PlayerContext
+from macosagent.scheduler import GuiActionRegistry
 
 Context = TypeVar('Context')
 
 
-class Registry(Generic[Context]):
+class Registry(GuiActionRegistry, Generic[Context]):
     """Service for registering and managing actions"""
 
+    holder = 'player_agent'
+    app_name = 'player'
+
     def __init__(self, exclude_actions: list[str] | None = None):
         self.registry = ActionRegistry()
         self.telemetry = ProductTelemetry()
         self.exclude_actions = exclude_actions if exclude_actions is not None else []
+        self.init_gui_actions()
 
     @time_execution_sync('--create_param_model')
     def _create_param_model(self, function: Callable) -> type[BaseModel]:
@@ -49,8 +54,19 @@ class Registry(Generic[Context]):
         self,
         description: str,
         param_model: type[BaseModel] | None = None,
+        gui_bound: bool = True,
+        effect: str | None = None,
     ):
-        """Decorator for registering actions"""
+        """Decorator for registering actions
+
+        Actions are GUI-bound (clicks, typing, hot keys) unless registered with
+        ``gui_bound=False``, e.g. actions that only edit files on disk.
+        ``effect`` is one of ``EFFECTS``: ``"input"`` for keyboard actions,
+        ``"layout"`` for actions that move or replace windows; it defaults to
+        ``"gui"``, or ``"static"`` when the action is not GUI-bound.
+        """
+
+        effect = self.action_effect(gui_bound, effect)
 
         def decorator(func: Callable):
             # Skip registration if action is in exclude_actions
@@ -81,6 +97,7 @@ class Registry(Generic[Context]):
                 param_model=actual_param_model,
             )
             self.registry.actions[func.__name__] = action
+            self.register_gui_action(func.__name__, gui_bound, effect)
             return func
 
         return decorator
@@ -113,9 +130,10 @@ class Registry(Generic[Context]):
                 extra_args['player_context'] = player_context
             if 'context' in parameter_names:
                 extra_args['context'] = player_context
-            if is_pydantic:
-                return await action.function(validated_params, **extra_args)
-            return await action.function(**validated_params.model_dump(), **extra_args)
+            async with self.action_session(action_name, player_context):
+                if is_pydantic:
+                    return await action.function(validated_params, **extra_args)
+                return await action.function(**validated_params.model_dump(), **extra_args)
 
         except Exception as e:
             raise RuntimeError(f'Error executing action {action_name}: {e!s}') from e
@@ -3,15 +3,14 @@ import enum
 import json
 import logging
 import re
-import time
 from typing import Generic, TypeVar
 
 import pyautogui
 import Quartz
-from moviepy.editor import VideoFileClip
 from openai import OpenAI
 from pydantic import BaseModel
 
+from macosagent.agents.batching import settle
 from macosagent.agents.player_agent.agent.views import ActionModel, ActionResult
 from macosagent.agents.player_agent.controller.registry.service import Registry
 from macosagent.agents.player_agent.controller.views import (
@@ -24,6 +23,9 @@ from macosagent.agents.player_agent.controller.views import (
     PressHotKeyAction,
 )
 from macosagent.agents.player_agent.player.context import PlayerContext
+from macosagent.lazy import lazy_import
+
+moviepy_editor = lazy_import("moviepy.editor")
 
 logger = logging.getLogger(__name__)
 Context = TypeVar('Context')
@@ -46,6 +48,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=ExtendedOutputModel,
+                gui_bound=False,
             )
             async def done(params: ExtendedOutputModel):
                 # Exclude success from the output JSON since it's an internal parameter
@@ -62,6 +65,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=DoneAction,
+                gui_bound=False,
             )
             async def done(params: DoneAction):
                 return ActionResult(is_done=True, success=params.success, extracted_content=params.text)
@@ -95,6 +99,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Input text into the element",
             param_model=InputTextAction,
+            effect="input",
         )
         async def input_text(params: InputTextAction, context: PlayerContext):
             index = params.index
@@ -121,6 +126,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Open QuickTime player with file path.",
             param_model=OpenQuickTimePlayerAction,
+            effect="layout",
         )
         async def open_quicktime_player(params: OpenQuickTimePlayerAction, context: PlayerContext):
             metadata = None
@@ -137,6 +143,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Press hot key combination. Key are separated by space",
             param_model=PressHotKeyAction,
+            effect="input",
         )
         async def press_hot_key(params: PressHotKeyAction, context: PlayerContext):
             logger.info(f"Pressing hot key combination: {params.keys}")
@@ -171,6 +178,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Extract video content. It returns a list of events with start time, end time and event description. Good for trim part of the video.",
             param_model=ExtractVideoEventsAction,
+            gui_bound=False,
         )
         async def extract_video_events(params: ExtractVideoEventsAction, context: PlayerContext):
 
@@ -266,7 +274,7 @@ def escape_single_quotes(text):
 
 def get_video_metadata(file_path):
     try:
-        clip = VideoFileClip(file_path)
+        clip = moviepy_editor.VideoFileClip(file_path)
         metadata = {
             'duration': clip.duration,          # 持续时间（秒）
             'width': clip.w,                    # 宽度
@@ -359,8 +367,8 @@ def simulate_key_combination(keys):
             up_event = Quartz.CGEventCreateKeyboardEvent(None, key, False)
             Quartz.CGEventPost(Quartz.kCGHIDEventTap, up_event)
 
-        # Give events some processing time
-        time.sleep(0.1)
+        # Give events some processing time, once per burst of key presses
+        settle(0.1)
 
     except Exception as e:
         logger.error(f"Error simulating keypress: {e}")
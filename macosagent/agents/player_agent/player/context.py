@@ -10,6 +10,8 @@ from PIL import Image, ImageDraw
 
 from macosagent.agents.player_agent.player.player import Player
 from macosagent.agents.player_agent.player.utils import BoxDrawer, parse_axvalue_bounds
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +43,9 @@ class PlayerContext:
 
 
     def get_state(self):
-        windows, screenshots = self.player.get_app_windows()
+        # Only the capture itself needs the desktop; drawing the boxes does not.
+        with gui_session('player_agent', getattr(self.player, 'player_app', None)):
+            windows, screenshots = self.player.get_app_windows()
         self.state.accessibility_tree = windows
         self.state.screenshots = screenshots
         frame = parse_axvalue_bounds(windows[0]["attributes"]["AXFrame"])
@@ -56,7 +60,8 @@ class PlayerContext:
         draw = ImageDraw.Draw(background)
         # Process the tree and draw bounding boxes
         som_drawer = BoxDrawer()
-        boxes = som_drawer.process_tree(draw, windows, offset)
+        with profile_phase("box_drawer"):
+            boxes = som_drawer.process_tree(draw, windows, offset)
         self.state.screenshots_som = [background]
         self.state.accessibility_tree_json = boxes
         return self.state
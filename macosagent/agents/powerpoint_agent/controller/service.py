@@ -1,4 +1,3 @@
-import base64
 import enum
 import json
 import logging
@@ -18,9 +17,11 @@ from pydantic import BaseModel
 # ClickElementAction, InputTextAction, DoneAction, OpenPowerPointAction, SaveFileAction
 from macosagent.agents.powerpoint_agent.agent.views import ActionModel, ActionResult
 from macosagent.agents.powerpoint_agent.controller.action_utils import *
+from macosagent.agents.imaging import ImagePolicy
 from macosagent.agents.powerpoint_agent.controller.registry.service import Registry
 from macosagent.agents.powerpoint_agent.controller.views import *
 from macosagent.agents.powerpoint_agent.powerpoint.context import PowerPointContext
+from macosagent.deadlines import run_command
 from macosagent.llm.llm import create_smol_llm_client
 
 logger = logging.getLogger(__name__)
@@ -44,6 +45,7 @@ class Controller(Generic[Context]):
 			@self.registry.action(
 				'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
 				param_model=ExtendedOutputModel,
+				gui_bound=False,
 			)
 			async def done(params: ExtendedOutputModel):
 				# Exclude success from the output JSON since it's an internal parameter
@@ -65,7 +67,7 @@ class Controller(Generic[Context]):
 				# close the app 
 				def run_applescript(script):
 					"""运行 AppleScript 并返回输出"""
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -118,6 +120,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Input text into the element",
 			param_model=InputTextAction,
+			effect="input",
 		)
 		async def input_text(params: InputTextAction, context: PowerPointContext):
 			# index = params.index
@@ -139,6 +142,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Open mac powerpoint application with file path.",
 			param_model=OpenPowerPointAction,
+			effect="layout",
 		)
 		async def open_powerpoint(params: OpenPowerPointAction, context: PowerPointContext):
 			context.powerpoint.open_powerpoint(params.file_path)
@@ -147,12 +151,13 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save the current file opened by word and close the word",
 			param_model=SaveAndCloseAction,
+			effect="layout",
 		)
 		async def save_and_close(params: SaveAndCloseAction,context:PowerPointContext):
 			try:
 				def run_applescript(script):
 					"""运行 AppleScript 并返回输出"""
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -186,6 +191,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"create a ppt file",
 			param_model=CreatePresentationAction,
+			gui_bound=False,
 		)
 		async def create_presentation(params: CreatePresentationAction,context:PowerPointContext):
 			try:
@@ -197,6 +203,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save current file opened by powerpoint application into a path.",
 			param_model=SaveFileAction,
+			effect="input",
 		)
 		async def save_file(params: SaveFileAction, context: PowerPointContext):
 			try:
@@ -214,6 +221,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Change the color of the index slide of the input file and save it in the output. before executing this action, one must first save and close the current file",
 			param_model=ChangeSlideBackgroundColorAction,
+			gui_bound=False,
 		)
 		async def change_slide_background_color(params: ChangeSlideBackgroundColorAction, context: PowerPointContext):
 			
@@ -230,6 +238,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Delete a specific item (textbox,image,or table) in a specific slide. before executing this action, one must first save and close the current file",
 			param_model=DeleteSlideItemAction,
+			gui_bound=False,
 		)
 		async def delete_slide_item(params: DeleteSlideItemAction, context: PowerPointContext):
 			
@@ -250,6 +259,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Change the text format of the input file and save it in the output. before executing this action, one must first save and close the current file",
 			param_model=ModifyTextRangeStyleAction,
+			gui_bound=False,
 		)
 		async def modify_text_range_style(params: ModifyTextRangeStyleAction, context: PowerPointContext):
 			try:
@@ -265,6 +275,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Generate pyautogui codes to compelete a subgoal , this includes all possible actions. Use this one other actions failed to achieve the expected goals.",
 			param_model=ComputerUseAction,
+			effect="layout",
 		)
 		async def computer_use(params: ComputerUseAction,context:PowerPointContext):
 			
@@ -276,7 +287,7 @@ class Controller(Generic[Context]):
 			# 		api_version=os.environ.get("OPENAI_API_VERSION"),
 			# 		max_completion_tokens=256,
 			# 	)
-   			client = create_smol_llm_client()
+			client = create_smol_llm_client(tier="vision")
 			SYSTEM_PROMPT = """You are an AI agent designed to automate GUI tasks. Your goal is to accomplish the task.
 				You will be given a task instruction, interactive elements, the clean screenshot, and screenshot with highlighted elements. You are provided with screenshots of the app, not the entire desktop. The current offset of the app is x:""" +  f""" {context.state.offset[0]}, y: {context.state.offset[1]}.""" + """ Please take these offsets into account when generating positions.
 				Please output the next action and wait for the next observation. 
@@ -314,14 +325,13 @@ class Controller(Generic[Context]):
 				In order to improve the success rate of interaction, the position should be in the middle of bounding box, not on the edge.
 				NOTE that, this is the Mac operating system. The hot key for 'paste' is 'command v' instead of 'ctrl v'. The hot key for 'save' is 'command s' instead of 'ctrl s'. 
 			"""
-			def encode_image(image_path):
-				with open(image_path, "rb") as image_file:
-					return base64.b64encode(image_file.read()).decode("utf-8")
+			# The positions are read off the screenshots, so they keep their size; only their encoding follows the policy.
+			image_policy = ImagePolicy.from_env('powerpoint_agent')
 			try:
-				context.state.screenshots[-1].save('./temp_screenshots.png')
-				context.state.screenshots_som[-1].save('./temp_screenshots_som.png')
+				screenshot = image_policy.encode(context.state.screenshots[-1], resize=False)
+				screenshot_som = image_policy.encode(context.state.screenshots_som[-1], resize=False)
 			except:
-				return ActionResult(is_done=False, success=False, extracted_content="save image failed", include_in_memory=True)
+				return ActionResult(is_done=False, success=False, extracted_content="encode image failed", include_in_memory=True)
 			try:
 				messages = [
 				{"role": "system", "content": SYSTEM_PROMPT},
@@ -329,11 +339,11 @@ class Controller(Generic[Context]):
 					{"type": "text", "text": params.goal_description},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots.png')}"}
+						{"url": screenshot.data_url}
 					},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots_som.png')}"}
+						{"url": screenshot_som.data_url}
 					},
 				]},
 	
@@ -371,6 +381,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert a textbox in the input file and save it in the output. before executing this action, one must first save and close the current file",
 			param_model=InsertTextAction,
+			gui_bound=False,
 		)
 		async def insert_text_box(params: InsertTextAction, context: PowerPointContext):
 			try:
@@ -383,6 +394,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert an image in the input file and save it in the output. before executing this action, one must first save and close the current file",
 			param_model=InsertImageAction,
+			gui_bound=False,
 		)
 		async def insert_image(params: InsertImageAction, context: PowerPointContext):
 			try:
@@ -394,6 +406,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert a table in the input file and save it in the output. before executing this action, one must first save and close the current file",
 			param_model=InsertTableAction,
+			gui_bound=False,
 		)
 		async def insert_table(params: InsertTableAction, context: PowerPointContext):
 			try:
@@ -11,6 +11,8 @@ from PIL import Image, ImageDraw
 
 from macosagent.agents.powerpoint_agent.powerpoint.powerpoint import PowerPoint
 from macosagent.agents.powerpoint_agent.powerpoint.utils import BoxDrawer, parse_axvalue_bounds
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +44,9 @@ class PowerPointContext:
 
 
 	def get_state(self):
-		windows, screenshots = self.powerpoint.get_app_windows()
+		# Only the capture itself needs the desktop; drawing the boxes does not.
+		with gui_session('powerpoint_agent', getattr(self.powerpoint, 'powerpoint_app', None)):
+			windows, screenshots = self.powerpoint.get_app_windows()
 		self.state.accessibility_tree = windows
 		self.state.screenshots = screenshots
 		frame = parse_axvalue_bounds(windows[0]["attributes"]["AXFrame"])
@@ -57,7 +61,8 @@ class PowerPointContext:
 		draw = ImageDraw.Draw(background)
 		# Process the tree and draw bounding boxes
 		som_drawer = BoxDrawer()
-		boxes = som_drawer.process_tree(draw, windows, offset)
+		with profile_phase("box_drawer"):
+			boxes = som_drawer.process_tree(draw, windows, offset)
 		self.state.screenshots_som = [background]
 		self.state.accessibility_tree_json = boxes
 		return self.state
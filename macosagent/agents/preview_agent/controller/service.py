@@ -15,6 +15,7 @@ from PIL import Image
 from pydantic import BaseModel
 from PyPDF2 import PdfReader
 
+from macosagent.agents.batching import settle
 from macosagent.agents.preview_agent.agent.views import ActionModel, ActionResult
 from macosagent.agents.preview_agent.controller.registry.service import Registry
 from macosagent.agents.preview_agent.controller.views import (
@@ -51,6 +52,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=ExtendedOutputModel,
+                gui_bound=False,
             )
             async def done(params: ExtendedOutputModel):
                 # Exclude success from the output JSON since it's an internal parameter
@@ -67,6 +69,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
                 param_model=DoneAction,
+                gui_bound=False,
             )
             async def done(params: DoneAction):
                 return ActionResult(is_done=True, success=params.success, extracted_content=params.text)
@@ -100,6 +103,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Input text into the element",
             param_model=InputTextAction,
+            effect="input",
         )
         async def input_text(params: InputTextAction, context: PreviewContext):
             index = params.index
@@ -127,6 +131,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Open mac preview application with file path.",
             param_model=OpenPreviewAction,
+            effect="layout",
         )
         async def open_preview(params: OpenPreviewAction, context: PreviewContext):
             context.preview.open_preview(params.file_path)
@@ -145,6 +150,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Save current file opened by Preview application into a path.",
             param_model=SaveFileAction,
+            effect="input",
         )
         async def save_file(params: SaveFileAction, context: PreviewContext):
             try:
@@ -160,6 +166,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Extract text from the given pages of the file.",
             param_model=ExtractTextAction,
+            gui_bound=False,
         )
         async def extract_text(params: ExtractTextAction, context: PreviewContext):
             text = read_pdf(params.file_path, params.pages)
@@ -168,6 +175,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Search keyword from pdf file and return the content of the page that contains the keyword.",
             param_model=SearchKeywordAction,
+            gui_bound=False,
         )
         async def search_keyword(params: SearchKeywordAction, context: PreviewContext):
             text = read_pdf_with_keyword(params.file_path, params.keyword)
@@ -200,6 +208,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Press hot key combination. Key are separated by space",
             param_model=PressHotKeyAction,
+            effect="input",
         )
         async def press_hot_key(params: PressHotKeyAction, context: PreviewContext):
             logger.info(f"Pressing hot key combination: {params.keys}")
@@ -343,8 +352,8 @@ def simulate_key_combination(keys):
             up_event = Quartz.CGEventCreateKeyboardEvent(None, key, False)
             Quartz.CGEventPost(Quartz.kCGHIDEventTap, up_event)
 
-        # Give events some processing time
-        time.sleep(0.1)
+        # Give events some processing time, once per burst of key presses
+        settle(0.1)
 
     except Exception as e:
         print(f"Error simulating keypress: {e}")
@@ -13,6 +13,8 @@ from macosagent.agents.preview_agent.preview.utils import (
     BoxDrawer,
     parse_axvalue_bounds,
 )
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +46,9 @@ class PreviewContext:
 
 
     def get_state(self):
-        windows, screenshots = self.preview.get_app_windows()
+        # Only the capture itself needs the desktop; drawing the boxes does not.
+        with gui_session('preview_agent', getattr(self.preview, 'preview_app', None)):
+            windows, screenshots = self.preview.get_app_windows()
         self.state.accessibility_tree = windows
         self.state.screenshots = screenshots
         frame = parse_axvalue_bounds(windows[0]["attributes"]["AXFrame"])
@@ -59,7 +63,8 @@ class PreviewContext:
         draw = ImageDraw.Draw(background)
         # Process the tree and draw bounding boxes
         som_drawer = BoxDrawer()
-        boxes = som_drawer.process_tree(draw, windows, offset)
+        with profile_phase("box_drawer"):
+            boxes = som_drawer.process_tree(draw, windows, offset)
         self.state.screenshots_som = [background]
         self.state.accessibility_tree_json = boxes
         return self.state
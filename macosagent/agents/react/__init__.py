@@ -0,0 +1,13 @@
+"""ReAct step engine shared by the app agents.
+
+:class:`ReactAppAgent` runs the capture, prompt, LLM and act loop of every
+ReAct app agent (calendar, excel, player, powerpoint, preview, wechat and
+word), so that prompt caching, pipelining, budgets and profiling are done
+once. An app agent is a subclass with an :class:`AppAdapter`: how to open
+the app and get its state, its controller, prompt and output model.
+"""
+
+from macosagent.agents.react.adapter import DEFAULT_TOOL_CALL_EXAMPLE, AppAdapter
+from macosagent.agents.react.engine import ReactAppAgent, log_response, write_messages_to_file
+
+__all__ = ["DEFAULT_TOOL_CALL_EXAMPLE", "AppAdapter", "ReactAppAgent", "log_response", "write_messages_to_file"]
@@ -0,0 +1,49 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic import BaseModel
+
+# Example tool call shown to the model before the task history.
+DEFAULT_TOOL_CALL_EXAMPLE: list[dict[str, Any]] = [
+    {
+        'name': 'AgentOutput',
+        'args': {
+            'current_state': {
+                'evaluation_previous_goal': 'Success - I opend the calender',
+                'memory': 'Starting with the new task. I have completed 1/10 steps',
+                'next_goal': 'Left single click on the date',
+            },
+            'action': [{'left_single_click': {'index': 0}}],
+        },
+        'id': str(1),
+        'type': 'tool_call',
+    }
+]
+
+
+@dataclass(frozen=True)
+class AppAdapter:
+    """What a ReAct app agent needs to know about its app.
+
+    Args:
+        name: Agent name, e.g. ``"excel_agent"``; keys the per-agent settings and the artifact directories.
+        system_prompt: Default system prompt.
+        agent_output: ``AgentOutput`` model of the app's ``views``.
+        create_context: Opens the app and returns its context, the state provider passed to the controller.
+        create_controller: Builds the default controller of the app.
+        tool_call_example: Example tool call of the prompt.
+        screenshot_in_state: Send the screenshot inside the current state message instead of before it.
+        activate: Called with the context before the first step of a run, e.g. to bring the app to the front.
+        max_iterations: Default maximum number of steps of a run.
+    """
+
+    name: str
+    system_prompt: str
+    agent_output: type[BaseModel]
+    create_context: Callable[[], Any]
+    create_controller: Callable[[], Any]
+    tool_call_example: list[dict[str, Any]] = field(default_factory=lambda: DEFAULT_TOOL_CALL_EXAMPLE)
+    screenshot_in_state: bool = False
+    activate: Callable[[Any], None] | None = None
+    max_iterations: int = 6
@@ -0,0 +1,411 @@
+import base64
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime
+from typing import Any, ClassVar
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from PIL import Image
+from smolagents import AgentError, MessageRole, ToolCallingAgent
+
+from macosagent.agents.batching import ActionBatch
+from macosagent.agents.history import StepHistory, TokenCounter, history_budget
+from macosagent.agents.imaging import ImagePolicy, ScreenDiffer
+from macosagent.agents.pipeline import StepLoop
+from macosagent.agents.react.adapter import AppAdapter
+from macosagent.agents.step_models import StepModelCache
+from macosagent.artifacts import NO_ARTIFACTS, get_artifact_writer
+from macosagent.deadlines import Deadline, PhaseTimeout, Timeouts, deadline_scope, find_timeout
+from macosagent.llm import create_llm_engine
+from macosagent.llm.streaming import STREAM_ACTIONS, stream_agent_output, stream_step
+from macosagent.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+def log_response(response: Any) -> None:
+    """Utility function to log the model's response."""
+
+    if 'Success' in response.current_state.evaluation_previous_goal:
+        emoji = '👍'
+    elif 'Failed' in response.current_state.evaluation_previous_goal:
+        emoji = '⚠'
+    else:
+        emoji = '🤷'
+
+    logger.info(f'{emoji} Eval: {response.current_state.evaluation_previous_goal}')
+    logger.info(f'🧠 Memory: {response.current_state.memory}')
+    logger.info(f'🎯 Next goal: {response.current_state.next_goal}')
+    for i, action in enumerate(response.action):
+        logger.info(f'🛠️  Action {i + 1}/{len(response.action)}: {action.model_dump_json(exclude_unset=True)}')
+
+class ReactAppAgent(ToolCallingAgent):
+    """
+    This agent that solves the given task step by step, using the ReAct framework:
+    While the objective is not reached, the agent will perform a cycle of thinking and acting.
+    The tool calls will be formulated by the LLM in JSON format, then parsed and executed.
+
+    The app specific parts come from the :class:`AppAdapter` of the subclass.
+    """
+
+    adapter: ClassVar[AppAdapter]
+    # Shadows the read-only property of recent smolagents versions.
+    system_prompt: str | None = None
+
+    def __init__(
+        self,
+        llm: BaseChatModel | None = None,
+        system_prompt: str | None = None,
+        controller=None,
+        max_iterations: int | None = None,
+        history_tokens: int | None = None,
+        **kwargs,
+    ):
+        adapter = self.adapter
+        self.llm = llm
+        self.controller = controller if controller is not None else adapter.create_controller()
+        self.system_prompt = system_prompt if system_prompt is not None else adapter.system_prompt
+        self.context = adapter.create_context()
+
+        self.history = StepHistory(
+            history_tokens if history_tokens is not None else history_budget(adapter.name),
+            counter=TokenCounter(getattr(llm, "model_name", None)),
+        )
+        self.tool_call_method = "function_calling"
+        self.artifacts = NO_ARTIFACTS
+        self.llm_engine = create_llm_engine("fast")
+        self.planning_interval = None
+        self.plan_type = None
+        self.max_iterations = max_iterations if max_iterations is not None else adapter.max_iterations
+        self.stream_actions = STREAM_ACTIONS
+        self.step_loop: StepLoop | None = None
+        self.step_models = StepModelCache(self.controller.registry, adapter.agent_output)
+        self.image_policy = ImagePolicy.from_env(adapter.name)
+        self.screen_diff = ScreenDiffer.from_env(adapter.name, self.image_policy)
+        self.timeouts = Timeouts.from_env(adapter.name)
+        self.deadline: Deadline | None = None
+        # Timeouts of the current run, with the iteration they happened at.
+        self.timed_out: list[dict[str, Any]] = []
+        self.batch: ActionBatch | None = None
+        # Screenshot and elements of the last capture, reused while the actions leave the screen alone.
+        self.observation: tuple[Image.Image, str, list[dict]] | None = None
+
+    def _get_model_name(self):
+        if hasattr(self.llm, "model_name"):
+            return self.llm.model_name
+        elif hasattr(self.llm, 'model'):
+            return self.llm.model
+        else:
+            return self.llm.model_id
+
+    async def get_prompt(self, task: str, image: Image.Image | None = None, interactive_elements_prompt: str | None = None, interactive_elements: list[dict] | None = None, max_steps: int = 100, current_step: int = 0):
+        # The screenshot is encoded on a worker thread while the rest of the prompt is assembled.
+        encoding = self.step_loop.submit("encode", self.screen_diff.prepare, image) if image is not None else None
+        context = "\n\nAvailable actions:\n" + self.step_models.get().prompt_description
+        messages = [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content='Context for the task' + context),
+            HumanMessage(content=[{"type": "text", "text": "Task: " + task}]),
+            HumanMessage(content="Example output:"),
+            AIMessage(content="", tool_calls=self.adapter.tool_call_example),
+            ToolMessage(content="Click success!", tool_call_id="1"),
+            HumanMessage(content="[Your task history memory starts here]"),
+
+        ]
+
+        # The last steps verbatim, older ones summarized to keep the history within its token budget.
+        messages.extend(self.history.messages())
+        if interactive_elements_prompt is None:
+            interactive_elements_prompt = "No interactive elements found, since the app is not open yet."
+        state = [
+            {"type": "text", "text": "[Task history ends here]"},
+            {"type": "text", "text": f"[Current state starts here]\nThe following is one-time information - if you need to remember it write it to memory:\nInteractive elements from top layer of the current page inside the viewport:\n{interactive_elements_prompt}\nCurrent step: {current_step}/{max_steps}\nCurrent date and time: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"},
+        ]
+        screenshot = None
+        if encoding is not None:
+            frame = await encoding
+            screenshot = frame.image if frame.image is not None else frame.reference
+            if self.adapter.screenshot_in_state:
+                state.extend(frame.content())
+            else:
+                messages.append(HumanMessage(content=frame.content()))
+        messages.append(HumanMessage(content=state))
+        # Rendered and written by the artifact writer thread.
+        self.artifacts.write_step(lambda f: write_messages_to_file(f, messages), screenshot, interactive_elements)
+
+        return messages
+
+    def step(self, log_entry: dict[str, Any]):
+        """
+        Perform one step in the ReAct framework: the agent thinks, acts, and observes the result.
+        The errors are raised here, they are caught and logged in the run() method.
+        """
+        try:
+            return self.step_loop.run(self.astep(log_entry))
+        finally:
+            log_entry["timeline"] = self.step_loop.timeline.to_dict()
+
+    async def astep(self, log_entry: dict[str, Any]):
+        previous, self.batch = self.batch, self._new_batch()
+        if previous is None or previous.touched_screen:
+            self.observation = None
+        if self.stream_actions:
+            # Actions start executing while the model is still generating the next ones.
+            with self.step_loop.phase("act"):
+                response, results = await stream_step(
+                    lambda on_action: self.get_next_action(log_entry, on_action),
+                    self.multi_act,
+                )
+            logger.info(f'Response: {response}')
+        else:
+            response = await self.get_next_action(log_entry)
+            logger.info(f'Response: {response}')
+            results = []
+            if response["parsed"] is not None:
+                with self.step_loop.phase("act"):
+                    results = await self.multi_act(response["parsed"].action)
+        parsing_error = None
+        if response["parsed"] is not None:
+            log_response(response["parsed"])
+        else:
+            # Actions streamed before the output turned out to be invalid have already run.
+            parsing_error = response["parsing_error"]
+            logger.error(f'Invalid model output: {parsing_error}')
+            log_entry["parsing_error"] = str(parsing_error)
+        logger.info(f'Results: {results}')
+        log_entry["batch"] = self.batch.summary()
+        for timed_out in self.batch.timed_out:
+            self.timed_out.append({"iteration": log_entry.get("iteration"), **timed_out})
+        self._make_history(response["raw"], results, parsing_error)
+        return results
+
+    async def get_next_action(
+        self,
+        log_entry: dict[str, Any],
+        on_action: Callable[[Any], None] | None = None,
+    ) -> dict[str, Any]:
+        task = log_entry.get("task", "")
+        if len(task) == 0:
+            task = self.task
+
+        max_steps = log_entry.get("max_steps", 100)
+        current_step = log_entry.get("current_step", 0)
+        if self.observation is not None:
+            logger.info('The last actions did not touch the screen, reusing its captured state')
+            image, interactive_elements_prompt, interactive_elements = self.observation
+        else:
+            try:
+                state = await self.step_loop.call("capture", self.context.get_state, timeout=self.timeouts.capture)
+                image = state.screenshots_som[0]
+                interactive_elements_prompt, interactive_elements = self.context.get_accessibility_tree_prompt()
+                self.observation = image, interactive_elements_prompt, interactive_elements
+            except Exception as e:
+                logger.error(f'Error getting state: {e}')
+                timeout = find_timeout(e)
+                if timeout is not None:
+                    self._record_timeout(timeout, log_entry)
+                image = None
+                interactive_elements_prompt = None
+                interactive_elements = None
+        with self.step_loop.phase("prompt"):
+            prompt = await self.get_prompt(task, image, interactive_elements_prompt, interactive_elements, max_steps, current_step)
+        models = self.step_models.get()
+        if on_action is not None:
+            return await self.step_loop.call(
+                "llm", stream_agent_output, self.llm, prompt, models.agent_output, models.action_model, on_action, timeout=self.timeouts.llm
+            )
+        structured_llm = self.step_models.structured_llm(self.llm, self.tool_call_method)
+        response = await self.step_loop.call("llm", structured_llm.invoke, prompt, timeout=self.timeouts.llm)
+        return response
+
+    def _record_timeout(self, timeout: PhaseTimeout, log_entry: dict[str, Any]) -> None:
+        get_metrics().record_timeout(timeout.phase)
+        log_entry.setdefault("timeouts", []).append(timeout.to_dict())
+        self.timed_out.append({"iteration": log_entry.get("iteration"), **timeout.to_dict()})
+
+    def image_to_base64(self, image):
+        return base64.b64encode(self.image_policy.encode(image).data).decode()
+
+    def _new_batch(self) -> ActionBatch:
+        registry = self.controller.registry
+        session = getattr(registry, "session", None)
+        return ActionBatch(
+            getattr(registry, "action_effects", {}),
+            session=(lambda: session(self.context)) if session is not None else None,
+            timeout=self.timeouts.action,
+        )
+
+    async def multi_act(self, actions: list[Any] | AsyncIterator[Any]) -> list[Any]:
+        if self.batch is None:
+            self.batch = self._new_batch()
+        return await self.batch.run(actions, lambda action: self.controller.act(action, self.context))
+
+    def _make_history(self, raw_response: AIMessage, results: list[Any], parsing_error: Exception | None = None):
+        history_item = {
+            "tool_calls": raw_response.tool_calls,
+        }
+        if not raw_response.tool_calls:
+            history_item["content"] = raw_response.content
+        observation = []
+        for result in results:
+            if result.include_in_memory:
+                if result.extracted_content:
+                    observation.append("Action result: " + str(result.extracted_content))
+
+                if result.error:
+                    observation.append("Action error: " + result.error)
+
+        if parsing_error is not None:
+            observation.append("Output error: " + str(parsing_error))
+
+        history_item["observation"] = observation
+        self.history.append(history_item)
+
+    def direct_run(self, task: str):
+        """
+        Runs the agent in direct mode, returning outputs only at the end: should be launched only in the `run` method.
+        """
+        iteration = 0
+        if self.adapter.activate is not None:
+            self.adapter.activate(self.context)
+        while iteration < self.max_iterations:
+            if self.deadline is not None and self.deadline.expired():
+                logger.warning(f'Stopping at iteration {iteration}: {self.deadline.timeout()}')
+                break
+            logger.info(f'Iteration {iteration} / {self.max_iterations}')
+            step_start_time = time.time()
+            step_log_entry = {"iteration": iteration, "start_time": step_start_time}
+            try:
+                if self.planning_interval is not None and iteration % self.planning_interval == 0:
+                    self.planning_step(task, is_first_step=(iteration == 0), iteration=iteration)
+                results = self.step(step_log_entry)
+                is_done = False
+                for result in results:
+                    is_done = result.is_done
+                    if is_done:
+                        break
+
+                if is_done:
+                    break
+
+            except AgentError as e:
+                self.logger.error(e, exc_info=1)
+                step_log_entry["error"] = e
+            except PhaseTimeout as e:
+                logger.error(f'Step {iteration}: {e}')
+                step_log_entry["error"] = e
+                self._record_timeout(e, step_log_entry)
+            finally:
+                step_end_time = time.time()
+                step_log_entry["step_end_time"] = step_end_time
+                step_log_entry["step_duration"] = step_end_time - step_start_time
+                get_metrics().record_step(step_log_entry["step_duration"], error="error" in step_log_entry)
+                iteration += 1
+
+        # Past the run deadline, the answer is produced from the history of the steps done so far.
+        if self.deadline is not None and self.deadline.expired():
+            if not any(timed_out["phase"] == "run" for timed_out in self.timed_out):
+                self._record_timeout(self.deadline.timeout(), {"iteration": iteration})
+            return self.provide_final_answer(task, success=False)
+        return self.provide_final_answer(task)
+
+    def run(self, task: str, stream: bool = False, reset: bool = True, **kwargs):
+        """
+        Runs the agent for the given task.
+
+        Args:
+            task (`str`): The task to perform
+        """
+        self.task = task
+        # The model has not seen any screenshot of this run yet.
+        self.screen_diff.reset()
+        self.batch = None
+        self.observation = None
+        self.timed_out = []
+        # One event loop and set of worker threads for all the steps of the run, and its artifact directory.
+        with (
+            deadline_scope("run", self.timeouts.run) as self.deadline,
+            StepLoop() as self.step_loop,
+            get_artifact_writer().open_run(self.adapter.name) as self.artifacts,
+        ):
+            return self.direct_run(task)
+
+    def provide_final_answer(self, task, success: bool = True) -> str:
+        """
+        This method provides a final answer to the task, based on the logs of the agent's interactions.
+        """
+        if not success:
+            self.prompt = [
+                {
+                    "role": MessageRole.SYSTEM,
+                    "content": "An agent tried to answer an user query but it got stuck and failed to do so. You are tasked with providing an answer instead. Here is the agent's memory:",
+                }
+            ]
+        else:
+            self.prompt = [
+                {
+                    "role": MessageRole.SYSTEM,
+                    "content": "An agent tried to answer an user query and finished successfully. Here is the agent's memory:",
+                }
+            ]
+        for h in self.history:
+            self.prompt.append(
+                {
+                    "role": MessageRole.USER,
+                    "content": "Agent is using the following tool calls:" + json.dumps(h["tool_calls"], indent=4, ensure_ascii=False)
+                }
+            )
+            obs = ""
+            for obs in h["observation"]:
+                obs += obs + "\n"
+            self.prompt.append(
+                    {
+                        "role": MessageRole.ASSISTANT,
+                        "content": "Observation:\n" + obs
+                    }
+                )
+
+        self.prompt += [
+            {
+                "role": MessageRole.USER,
+                "content": f"Based on the above, please provide an answer to the following user request:\n{task}",
+            }
+        ]
+
+        logger.info("Curent Prompt: %s" % self.prompt)
+        try:
+            return self.llm_engine(self.prompt)
+        except Exception as e:
+            return f"Error in generating final llm output: {e}."
+
+def write_messages_to_file(f: Any, messages: list[BaseMessage]) -> None:
+    """Write messages to conversation file"""
+    for message in messages:
+        f.write(f' {message.__class__.__name__} \n')
+
+        if isinstance(message.content, list):
+            for item in message.content:
+                if isinstance(item, dict) and item.get('type') == 'text':
+                    f.write(item['text'].strip() + '\n')
+        elif isinstance(message.content, str):
+            if len(message.content) > 0:
+                try:
+                    content = json.loads(message.content)
+                    f.write(json.dumps(content, indent=2) + '\n')
+                except json.JSONDecodeError:
+                    f.write(message.content.strip() + '\n')
+            if hasattr(message, 'tool_calls') and message.tool_calls is not None and len(message.tool_calls) > 0:
+                tool_calls = message.tool_calls
+                f.write(json.dumps(tool_calls, indent=2) + '\n')
+            if hasattr(message, 'tool_call_id') and message.tool_call_id is not None and len(message.tool_call_id) > 0:
+                f.write(f'Tool call id: {message.tool_call_id}\n')
+
+        f.write('\n')
@@ -0,0 +1,216 @@
+"""Lazy registry of the app agents exposed to the orchestrator.
+
+Each app agent is described by lightweight metadata (name, description, inputs)
+so that the orchestrator prompt can be rendered without importing the agent
+packages. The real tool is imported and built on its first ``forward()`` call.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from smolagents import Tool
+
+logger = logging.getLogger(__name__)
+
+INSTRUCTION_INPUT = {
+    "instruction": {
+        "description": "A clear and concise task instruction for this agent to address.",
+        "type": "string",
+    },
+}
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """Metadata describing an app agent without importing it.
+
+    Attributes:
+        key: Registry key, e.g. ``"finder_agent"``.
+        name: Tool name shown to the orchestrator; must match the real tool.
+        description: Tool description shown to the orchestrator.
+        target: Import path of the real tool, as ``"package.module:ClassName"``.
+        inputs: Tool inputs schema, in smolagents format.
+        output_type: Tool output type, in smolagents format.
+        gui_bound: Whether the agent drives the desktop GUI (focus, mouse, keyboard).
+        locks_per_action: Whether the agent takes the GUI lock itself around each
+            GUI-bound action; otherwise a GUI-bound agent holds it for its whole run.
+    """
+
+    key: str
+    name: str
+    description: str
+    target: str
+    inputs: dict[str, dict[str, str]] = field(default_factory=lambda: dict(INSTRUCTION_INPUT))
+    output_type: str = "string"
+    gui_bound: bool = True
+    locks_per_action: bool = False
+
+    def load(self) -> Tool:
+        """Import the target module and build the real tool."""
+        module_name, class_name = self.target.split(":")
+        module = importlib.import_module(module_name)
+        return getattr(module, class_name)()
+
+
+AGENT_SPECS: list[AgentSpec] = [
+    AgentSpec(
+        key="browser_agent",
+        name="browser_use",
+        description="A agent that can operate the browser to answer questions",
+        target="macosagent.agents.browser_agent:BrowserAgent",
+        inputs={
+            "instruction": {
+                "description": "an instruction of a brower use agent",
+                "type": "string",
+            },
+        },
+        gui_bound=False,
+    ),
+    AgentSpec(
+        key="calendar_agent",
+        name="calendar_agent",
+        description="An agent that can address tasks about calendar.",
+        target="macosagent.agents.calendar_agent:CalendarAgent",
+        locks_per_action=True,
+    ),
+    AgentSpec(
+        key="preview_agent",
+        name="preview_agent",
+        description="An agent that can address tasks using Mac Preview App.",
+        target="macosagent.agents.preview_agent:PreviewAgent",
+        locks_per_action=True,
+    ),
+    AgentSpec(
+        key="player_agent",
+        name="player_agent",
+        description="An agent that can address tasks using QuickTime Player.",
+        target="macosagent.agents.player_agent:PlayerAgent",
+        locks_per_action=True,
+    ),
+    AgentSpec(
+        key="wechat_agent",
+        name="wechat_agent",
+        description="""Wechat-Agent is an intelligent agent capable of controlling WeChat to perform the following tasks:
+- Search for contacts
+- Edit and send messages or emojis
+- View historical messages
+- Extract and summarize information from historical messages""",
+        target="macosagent.agents.wechat_agent:WechatAgent",
+        locks_per_action=True,
+        inputs={
+            "instruction": {"description": "An instruction for a Wechat app agent", "type": "string"},
+        },
+    ),
+    AgentSpec(
+        key="finder_agent",
+        name="finderagent",
+        description="A tool can solve GUI tasks about the Finder application in the Mac operating system.",
+        target="macosagent.agents.finder_agent:FinderAgent",
+        inputs={"task": {"description": "instruction of a GUI task", "type": "string"}},
+    ),
+    AgentSpec(
+        key="textedit_agent",
+        name="texteditagent",
+        description="A tool can solve GUI tasks about the TextEdit application in the Mac operating system.",
+        target="macosagent.agents.textedit_agent:TextEditAgent",
+        inputs={"task": {"description": "instruction of a GUI task", "type": "string"}},
+    ),
+    AgentSpec(
+        key="word_agent",
+        name="word_agent",
+        description="The Word-Agent is designed to perform a variety of tasks related to Microsoft Word documents. It can handle basic operations such as opening, saving, and closing documents, as well as more complex tasks like inserting images, tables, and text, and modifying document styles. Additionally, it can delete content and interact with elements using PyAutoGUI.",
+        target="macosagent.agents.word_agent:WordAgent",
+        locks_per_action=True,
+        inputs={
+            "instruction": {
+                "description": "an instruction of a calendar app agent",
+                "type": "string",
+            },
+        },
+    ),
+    AgentSpec(
+        key="excel_agent",
+        name="excel_agent",
+        description="The Excel-Agent is designed to perform a variety of tasks related to Microsoft Excel worksheets. It can handle basic operations such as opening, saving, and closing worksheets, as well as more complex tasks like inserting values into cells. Additionally, it can delete content and interact with elements using PyAutoGUI. ",
+        target="macosagent.agents.excel_agent:ExcelAgent",
+        locks_per_action=True,
+        inputs={
+            "instruction": {
+                "description": "an instruction of a calendar app agent",
+                "type": "string",
+            },
+        },
+    ),
+    AgentSpec(
+        key="powerpoint_agent",
+        name="powerpoint_agent",
+        description="The PowerPoint-Agent is designed to perform a variety of tasks related to Microsoft PowerPoint presentations. It can handle basic operations such as opening, saving, and closing presentations, as well as more complex tasks like inserting images, tables, text, text boxes, and modifying styles (background color, text format). Additionally, it can delete content and interact with elements using PyAutoGUI. ",
+        target="macosagent.agents.powerpoint_agent:PowerPointAgent",
+        locks_per_action=True,
+        inputs={
+            "instruction": {"description": "an instruction of a calendar app agent", "type": "string"},
+        },
+    ),
+]
+
+
+class LazyAgentTool(Tool):
+    """A tool proxy that imports and builds the real app agent on first use."""
+
+    skip_forward_signature_validation = True
+
+    def __init__(self, spec: AgentSpec):
+        self.spec = spec
+        self.name = spec.name
+        self.description = spec.description
+        self.inputs = spec.inputs
+        self.output_type = spec.output_type
+        self.load_duration: float | None = None
+        self._tool: Tool | None = None
+        self._lock = threading.Lock()
+        super().__init__()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._tool is not None
+
+    def setup(self):
+        with self._lock:
+            if self._tool is None:
+                start_time = time.perf_counter()
+                self._tool = self.spec.load()
+                self.load_duration = time.perf_counter() - start_time
+                logger.info(f"Loaded {self.name} from {self.spec.target} in {self.load_duration:.2f}s")
+        self.is_initialized = True
+
+    def forward(self, *args: Any, **kwargs: Any) -> Any:
+        if self._tool is None:
+            self.setup()
+        from macosagent.metrics import metric_context
+
+        with metric_context(agent=self.spec.key):
+            if not self.spec.gui_bound or self.spec.locks_per_action:
+                return self._tool(*args, **kwargs)
+            # Only one agent may drive the desktop at a time. This runs on the orchestrator's
+            # thread or the GUI worker, before the agent starts its own event loop, so it may block.
+            from macosagent.scheduler import gui_session
+
+            with gui_session(self.spec.key):
+                return self._tool(*args, **kwargs)
+
+
+def get_agent_spec(key_or_name: str) -> AgentSpec | None:
+    """Look up an agent spec by registry key or tool name."""
+    for spec in AGENT_SPECS:
+        if key_or_name in (spec.key, spec.name):
+            return spec
+    return None
+
+
+def create_agent_box() -> dict[str, LazyAgentTool]:
+    """Create a fresh set of lazy app agent tools, keyed by registry key."""
+    return {spec.key: LazyAgentTool(spec) for spec in AGENT_SPECS}
@@ -0,0 +1,73 @@
+"""Output models of the ReAct app agent steps, built once per action set.
+
+The ``ActionModel`` union of the registered actions, the ``AgentOutput`` type
+wrapping it, the structured-output runnable of the LLM and the action
+descriptions of the prompt only depend on the actions registered on a
+controller. Building them means creating pydantic models and JSON schemas,
+which used to happen at every step; :class:`StepModelCache` keeps them until
+an action is registered, replaced or removed.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class StepModels:
+    action_model: type
+    agent_output: type
+    prompt_description: str
+
+
+class StepModelCache:
+    """Step models of one controller registry.
+
+    Args:
+        registry: The controller ``Registry``; its registered actions are the cache key.
+        agent_output: The ``AgentOutput`` class of the agent, extended with the actions.
+    """
+
+    def __init__(self, registry: Any, agent_output: type):
+        self.registry = registry
+        self.agent_output = agent_output
+        self.builds = 0
+        self._key: tuple | None = None
+        self._models: StepModels | None = None
+        self._structured: dict[tuple[int, str], tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _action_set(self) -> tuple:
+        # Registering an action replaces its RegisteredAction; excluded actions are never registered.
+        return tuple(self.registry.registry.actions.items())
+
+    def get(self) -> StepModels:
+        key = self._action_set()
+        models = self._models
+        if models is not None and key == self._key:
+            return models
+        with self._lock:
+            if self._models is None or key != self._key:
+                action_model = self.registry.create_action_model()
+                self._models = StepModels(
+                    action_model=action_model,
+                    agent_output=self.agent_output.type_with_custom_actions(action_model),
+                    prompt_description=self.registry.get_prompt_description(),
+                )
+                self._key = key
+                self._structured.clear()
+                self.builds += 1
+            return self._models
+
+    def structured_llm(self, llm: Any, method: str) -> Any:
+        """``llm.with_structured_output`` for the current ``AgentOutput`` type."""
+        models = self.get()
+        cache_key = (id(llm), method)
+        with self._lock:
+            entry = self._structured.get(cache_key)
+            # Keep the llm in the entry, so that its id cannot be reused by another object.
+            if entry is None or entry[0] is not llm or self._models is not models:
+                entry = (llm, llm.with_structured_output(models.agent_output, include_raw=True, method=method))
+                if self._models is models:
+                    self._structured[cache_key] = entry
+            return entry[1]
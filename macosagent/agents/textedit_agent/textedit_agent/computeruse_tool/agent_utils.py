@@ -3,7 +3,6 @@ import base64
 import logging
 import math
 import re
-import backoff
 import openai
 import random
 
@@ -46,7 +46,7 @@ class ComputerControl(Tool):
     # else:
     #     raise ValueError("Invalid API server type. Please check your .env file and ensure API_SERVER_TYPE is set to either 'AZURE' or 'OPENAI'.")
 
-    model = create_smol_llm_client()
+    model = create_smol_llm_client(tier="vision")
 
 
 
@@ -46,6 +46,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet completly finished (success=False), because last step is reached',
                 param_model=ExtendedOutputModel,
+                gui_bound=False,
             )
             async def done(params: ExtendedOutputModel):
                 output_dict = params.data.model_dump()
@@ -59,6 +60,7 @@ class Controller(Generic[Context]):
             @self.registry.action(
                 'Complete task - with return text and if the task is finished (success=True) or not yet completly finished (success=False), because last step is reached',
                 param_model=DoneAction,
+                gui_bound=False,
             )
             async def done(params: DoneAction):
                 return ActionResult(is_done=True, success=params.success, extracted_content=params.text)
@@ -106,6 +108,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Input into the element",
             param_model=InputAction,
+            effect="input",
         )
         async def inputs(params: InputAction, context: WechatContext):
             index = params.index
@@ -201,6 +204,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Paste clipboard text",
             param_model=PasteAction,
+            effect="input",
         )
         async def paste(params: PasteAction, context: WechatContext):
             index = params.index
@@ -225,6 +229,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Select text and copy",
             param_model=CopyAction,
+            effect="input",
         )
         async def copy_text(params: CopyAction, context: WechatContext):
             try:
@@ -280,6 +285,7 @@ class Controller(Generic[Context]):
         @self.registry.action(
             "Extract content",
             param_model=ExtractContent,
+            gui_bound=False,
         )
         async def extract_content(params: ExtractContent, context: WechatContext):
             try:
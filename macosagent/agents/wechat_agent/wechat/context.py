@@ -10,6 +10,8 @@ from PIL import Image, ImageDraw
 
 from macosagent.agents.wechat_agent.wechat.wechat import Wechat
 from macosagent.agents.wechat_agent.wechat.utils import BoxDrawer, parse_axvalue_bounds, parse_rect_bounds
+from macosagent.profiling import profile_phase
+from macosagent.scheduler import gui_session
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +42,9 @@ class WechatContext:
         self.state = state or WechatContextState()
 
     def get_state(self):
-        windows, screenshots = self.wechat.get_app_windows()
+        # Only the capture itself needs the desktop; drawing the boxes does not.
+        with gui_session('wechat_agent', getattr(self.wechat, 'wechat_app', None)):
+            windows, screenshots = self.wechat.get_app_windows()
         self.state.accessibility_tree = windows
         self.state.screenshots = screenshots
         
@@ -57,7 +61,8 @@ class WechatContext:
 
         # Process the tree and draw bounding boxes
         som_drawer = BoxDrawer()
-        boxes = som_drawer.process_tree(draw, windows, offset)
+        with profile_phase("box_drawer"):
+            boxes = som_drawer.process_tree(draw, windows, offset)
         
         self.state.screenshots_som = [background]
         self.state.accessibility_tree_json = boxes
@@ -1,6 +1,5 @@
 import logging
 import os
-import subprocess
 import tempfile
 import time
 from dataclasses import dataclass, field
@@ -10,7 +9,9 @@ from Quartz import CGWindowListCopyWindowInfo, kCGWindowListOptionOnScreenOnly,
 import Quartz
 from PIL import Image
 
+from macosagent.agents.pipeline import capture_windows
 from macosagent.agents.wechat_agent.wechat.utils import parse_axvalue_bounds
+from macosagent.deadlines import run_command
 
 logger = logging.getLogger(__name__)
 @dataclass
@@ -188,6 +189,13 @@ class Wechat:
 			print(f"{indent}---")
 			self.print_tree(child, indent + "  ")
 
+	def get_window_frame(self, window):
+		"""Frame (x, y, w, h) of a window"""
+		err, frame = ApplicationServices.AXUIElementCopyAttributeValue(window, "AXFrame", None)
+		if err != 0:
+			return None
+		return parse_axvalue_bounds(str(frame))
+
 	def capture_window_screenshot(self, frame_info):
 		temp_file = tempfile.mktemp('.png')
 		temp_file_name = temp_file.split("/")[-1]
@@ -198,7 +206,7 @@ class Wechat:
 			cmd.append(f"-R{frame_info[0]},{frame_info[1]},{frame_info[2]},{frame_info[3]}")
 			cmd.append(temp_file)
 			# print("cmd", cmd)
-			subprocess.run(cmd, check=True)
+			run_command(cmd, check=True)
 
 			if os.path.exists(temp_file):
 				return Image.open(temp_file)
@@ -223,42 +231,18 @@ class Wechat:
 			# print(windows, err)
 			if err == 0 and windows:
 				logger.info(f"\nFound {len(windows)} windows")
-				window_trees = []
-				screenshots = []
 
 				window_list = CGWindowListCopyWindowInfo(kCGWindowListOptionOnScreenOnly, kCGNullWindowID)
 				logger.info(f"window_list: {len(window_list)}")
-				for i, window in enumerate(windows):
-					logger.info(f"\nWindow {i + 1}:")
-					
-					# print("=== Accessibility Tree ===")
-					
-					tree = self.get_accessibility_tree(window)
-					window_trees.append(tree)
-					# # self.print_tree(tree)
-					# with open (os.path.join("results", f"window_tree_{i}.json"), "w") as f:
-					# 	json.dump(tree, f, indent=4)
-					# 	logger.info(f"Accessibility tree for window {i + 1} saved to results/window_tree_{i}.json")
-					
-					# print("window_list", window_list)
-					for window_info in window_list:
-						if window_info.get(Quartz.kCGWindowOwnerPID) == self.config.process_id:
-							window_id = window_info.get(Quartz.kCGWindowNumber)
-							# print("Trying to get screenshot", window_id)
-							if window_id not in self.config.window_id_list:
-								self.config.window_id_list.append(window_id)
-							# break # only get the first window
-					# pick the larger one to take screenshot
-					frame_infos = []
-					for window_tree in window_trees:
-						frame_info = parse_axvalue_bounds(window_tree["attributes"]["AXFrame"])
-						frame_infos.append(frame_info)
-					logger.info(f"frame_infos: {frame_infos}")
-					frame_info = max(frame_infos, key=lambda x: x[2] * x[3])
-					screenshot = self.capture_window_screenshot(frame_info)
-					screenshots.append(screenshot)
-					
-				return window_trees, screenshots
+				for window_info in window_list:
+					if window_info.get(Quartz.kCGWindowOwnerPID) == self.config.process_id:
+						window_id = window_info.get(Quartz.kCGWindowNumber)
+						if window_id not in self.config.window_id_list:
+							self.config.window_id_list.append(window_id)
+				# The screenshots are taken while the accessibility trees are walked
+				return capture_windows(
+					windows, self.get_window_frame, self.get_accessibility_tree, self.capture_window_screenshot
+				)
 			
 		except Exception as e:
 			# print(f"Error occurred: {e}")
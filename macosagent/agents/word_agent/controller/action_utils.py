@@ -2,8 +2,11 @@ import os
 from pathlib import Path
 
 from docx import Document
-from docx2pdf import convert
-from pdf2docx import Converter
+
+from macosagent.lazy import lazy_import
+
+docx2pdf = lazy_import("docx2pdf")
+pdf2docx = lazy_import("pdf2docx")
 
 
 def convert_file_function(input_path: str, output_path: str) -> None:
@@ -54,14 +57,14 @@ def convert_file_function(input_path: str, output_path: str) -> None:
 def _convert_docx_to_pdf(input_path: Path, output_path: Path) -> None:
     """DOCX转PDF"""
     try:
-        convert(str(input_path), str(output_path))
+        docx2pdf.convert(str(input_path), str(output_path))
     except Exception as e:
         # 备用方案：使用LibreOffice命令行
         os.system(f'soffice --convert-to pdf "{input_path}" --outdir "{output_path.parent}"')
 
 def _convert_pdf_to_docx(input_path: Path, output_path: Path) -> None:
     """PDF转DOCX"""
-    cv = Converter(str(input_path))
+    cv = pdf2docx.Converter(str(input_path))
     cv.convert(str(output_path), start=0, end=None)
     cv.close()
 
@@ -697,7 +700,6 @@ import xml.etree.ElementTree as ET
 from io import BytesIO
 from typing import Dict, List
 
-import backoff
 import numpy as np
 from PIL import Image
 from requests.exceptions import SSLError
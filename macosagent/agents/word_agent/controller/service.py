@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 # from lmnr.sdk.laminar import Laminar
 from pydantic import BaseModel
 import time 
+from macosagent.agents.imaging import ImagePolicy
 from macosagent.agents.word_agent.controller.registry.service import Registry
 from macosagent.agents.word_agent.word.context import WordContext
 from macosagent.agents.word_agent.controller.views import ClickElementAction, InputTextAction, DoneAction, OpenWordAction, SaveFileAction,ConvertFileAction,ModifyRangeStylesAction, DeleteImageAction,DeleteTextRangesAction,DeleteTableAction
@@ -26,6 +27,7 @@ import re
 import shutil
 # from docx import Document
 from macosagent.agents.word_agent.controller.action_utils import *
+from macosagent.deadlines import run_command
 from macosagent.llm.llm import create_smol_llm_client 
 
 logger = logging.getLogger(__name__)
@@ -49,6 +51,7 @@ class Controller(Generic[Context]):
 			@self.registry.action(
 				'Complete task - with return text and if the task is finished (success=True) or not yet  completely finished (success=False), because last step is reached',
 				param_model=ExtendedOutputModel,
+				gui_bound=False,
 			)
 			async def done(params: ExtendedOutputModel):
 				# Exclude success from the output JSON since it's an internal parameter
@@ -60,7 +63,7 @@ class Controller(Generic[Context]):
 						output_dict[key] = value.value
 				def run_applescript(script):
 					"""运行 AppleScript 并返回输出"""
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -88,6 +91,7 @@ class Controller(Generic[Context]):
 			@self.registry.action(
 				'Complete task - with return text and if the task is finished (success=True) or not yet  completly finished (success=False), because last step is reached',
 				param_model=DoneAction,
+				gui_bound=False,
 			)
 			async def done(params: DoneAction):
 				# 关闭所有的word
@@ -124,6 +128,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Input text into the element",
 			param_model=InputTextAction,
+			effect="input",
 		)
 		async def input_text(params: InputTextAction, context: WordContext):
 			# index = params.index
@@ -145,6 +150,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Open mac word application with file path.",
 			param_model=OpenWordAction,
+			effect="layout",
 		)
 		async def open_word(params: OpenWordAction, context: WordContext):
 			context.word.open_word(params.file_path)
@@ -154,12 +160,13 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save the current file opened by word and close the word",
 			param_model=SaveAndCloseAction,
+			effect="layout",
 		)
 		async def save_and_close(params: SaveAndCloseAction,context:WordContext):
 			try:
 				def run_applescript(script):  # noqa: W191
 					"""运行 AppleScript 并返回输出"""  # noqa: W191
-					process = subprocess.run(
+					process = run_command(
 						["osascript", "-e", script],
 						text=True,
 						capture_output=True
@@ -194,6 +201,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Generate pyautogui codes to compelete a subgoal , this includes all possible actions. Use this one other actions failed to achieve the expected goals.",
 			param_model=ComputerUseAction,
+			effect="layout",
 		)
 		async def computer_use(params: ComputerUseAction,context:WordContext):
 			
@@ -207,7 +215,7 @@ class Controller(Generic[Context]):
 			# 		max_completion_tokens=256,
 			# 	)
 
-			client = create_smol_llm_client()
+			client = create_smol_llm_client(tier="vision")
 			SYSTEM_PROMPT = """You are an AI agent designed to automate GUI tasks. Your goal is to accomplish the task.
 				You will be given a task instruction, interactive elements, the clean screenshot, and screenshot with highlighted elements. You are provided with screenshots of the app, not the entire desktop. The current offset of the app is x:""" +  f""" {context.state.offset[0]}, y: {context.state.offset[1]}.""" + """ Please take these offsets into account when generating positions.
 				Please output the next action and wait for the next observation. 
@@ -245,14 +253,13 @@ class Controller(Generic[Context]):
 				In order to improve the success rate of interaction, the position should be in the middle of bounding box, not on the edge.
 				NOTE that, this is the Mac operating system. The hot key for 'paste' is 'command v' instead of 'ctrl v'. The hot key for 'save' is 'command s' instead of 'ctrl s'. 
 			"""
-			def encode_image(image_path):
-				with open(image_path, "rb") as image_file:
-					return base64.b64encode(image_file.read()).decode("utf-8")
+			# The positions are read off the screenshots, so they keep their size; only their encoding follows the policy.
+			image_policy = ImagePolicy.from_env('word_agent')
 			try:
-				context.state.screenshots[-1].save('./temp_screenshots.png')
-				context.state.screenshots_som[-1].save('./temp_screenshots_som.png')
+				screenshot = image_policy.encode(context.state.screenshots[-1], resize=False)
+				screenshot_som = image_policy.encode(context.state.screenshots_som[-1], resize=False)
 			except:
-				return ActionResult(is_done=False, success=False, extracted_content=f"save image failed", include_in_memory=True)
+				return ActionResult(is_done=False, success=False, extracted_content="encode image failed", include_in_memory=True)
 			try:
 				messages = [
 				{"role": "system", "content": SYSTEM_PROMPT},
@@ -260,11 +267,11 @@ class Controller(Generic[Context]):
 					{"type": "text", "text": params.goal_description},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots.png')}"}
+						{"url": screenshot.data_url}
 					},
 					{"type": "image_url",
 					"image_url": 
-						{"url": f"data:image/jpeg;base64,{encode_image('./temp_screenshots_som.png')}"}
+						{"url": screenshot_som.data_url}
 					},
 	# base64.b64encode(content.state.screenshots[-1]).decode("utf-8")
 					# {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(content.state.screenshots_som[-1]).decode("utf-8")}"}}
@@ -315,6 +322,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Save current file opened by word into the into another format in file path. Support word to txt and word to pdf.",
 			param_model=ConvertFileAction,
+			effect="layout",
 		)
 		async def convert_file(params: ConvertFileAction,context:WordContext):
 			
@@ -332,6 +340,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"modify the range of docs into another styles. before executing this action, one must first save and close the current file.  ",
 			param_model=ModifyRangeStylesAction,
+			gui_bound=False,
 		) 
 		async def modify_ranges_styles(params: ModifyRangeStylesAction,context:WordContext):
 			try:
@@ -377,6 +386,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"Convert the current file opened by word application into a path.",
 			param_model=SaveFileAction,
+			effect="input",
 		)
 		async def save_file(params: SaveFileAction, context: WordContext):
 			
@@ -396,6 +406,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"delete the index-th image in the word. before executing this action, one must first save and close the current file.    ",
 			param_model=DeleteImageAction,
+			gui_bound=False,
 		) 
 		async def delete_image(params: DeleteImageAction,context:WordContext):
 			try:
@@ -412,6 +423,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"delete the the text range in the word.  before executing this action, one must first save and close the current file.  ",
 			param_model=DeleteTextRangesAction,
+			gui_bound=False,
 		) 
 		async def delete_text_ranges(params: DeleteTextRangesAction,context:WordContext):
 			try:
@@ -429,6 +441,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"delete the index-th table in the word. before executing this action, one must first save and close the current file.   ",
 			param_model=DeleteTableAction,
+			gui_bound=False,
 		) 
 		async def delete_table(params: DeleteTableAction,context:WordContext):
 			try:
@@ -443,6 +456,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert image to the file before executing this action, one must first save and close the current file.  ",
 			param_model= InsertImageAction,
+			gui_bound=False,
 		) 
 		async def  insert_image(params:  InsertImageAction,context:WordContext):
 			try:
@@ -460,6 +474,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"insert table to the file before executing this action, one must first save and close the current file.  ",
 			param_model= InsertTableAction,
+			gui_bound=False,
 		) 
 		async def insert_table(params: InsertTableAction ,context:WordContext):
 			try:
@@ -480,6 +495,7 @@ class Controller(Generic[Context]):
 		@self.registry.action(
 			"create an empty docx",
 			param_model= CreateDocxAction,
+			gui_bound=False,
 		) 
 		async def create_docx(params: CreateDocxAction ,context:WordContext):
 			try:
@@ -6,13 +6,14 @@ import Quartz
 import numpy as np
 from PIL import Image
 import time
-import subprocess
 import tempfile
 import json
 import ctypes
 import os
 
+from macosagent.agents.pipeline import capture_windows
 from macosagent.agents.word_agent.word.utils import parse_axvalue_bounds
+from macosagent.deadlines import run_command
 # from utils import parse_axvalue_bounds
 logger = logging.getLogger(__name__)
 @dataclass
@@ -87,12 +88,10 @@ def open_word(file_path=None):
 			# Create AppleScript command
 			abs_path = os.path.abspath(file_path)
 			# print(abs_path)
-			os.system(f'open -a "Microsoft Word" "{abs_path}"')
+			run_command(['open', '-a', 'Microsoft Word', abs_path])
 				
 				# 使用AppleScript将Microsoft Word窗口置顶显示
-			os.system('''
-			osascript -e 'tell app "Microsoft Word" to activate'
-			''')
+			run_command(['osascript', '-e', 'tell app "Microsoft Word" to activate'])
 			# exit()
 			
 			# Execute AppleScript
@@ -213,6 +212,13 @@ class Word:
 			print(f"{indent}---")
 			self.print_tree(child, indent + "  ")
 
+	def get_window_frame(self, window):
+		"""获取窗口的位置和大小 (x, y, w, h)"""
+		err, frame = ApplicationServices.AXUIElementCopyAttributeValue(window, "AXFrame", None)
+		if err != 0:
+			return None
+		return parse_axvalue_bounds(str(frame))
+
 	def capture_window_screenshot(self, frame_info):
 		"""捕获窗口截图"""
 		temp_file = tempfile.mktemp('.png')
@@ -225,7 +231,7 @@ class Word:
 			cmd.append(temp_file)
 			# print("cmd", cmd)
 			# 使用 screencapture 命令行工具捕获窗口
-			subprocess.run(cmd, check=True)
+			run_command(cmd, check=True)
 			# 读取图片
 			if os.path.exists(temp_file):
 				return Image.open(temp_file)
@@ -246,41 +252,18 @@ class Word:
 			# print(windows, err)
 			if err == 0 and windows:
 				logger.info(f"\n找到 {len(windows)} 个窗口")
-				window_trees = []  # 存储所有窗口的树形结构
-				screenshots = []
 				# 获取窗口信息
 				window_list = CGWindowListCopyWindowInfo(kCGWindowListOptionOnScreenOnly, kCGNullWindowID)
 				logger.info(f"window_list: {len(window_list)}")
-				for i, window in enumerate(windows):
-					logger.info(f"\n窗口 {i + 1}:")
-					# print("=== Accessibility Tree ===")
-					try:
-						tree = self.get_accessibility_tree(window)
-						window_trees.append(tree)
-						# self.print_tree(tree)  # 打印树形结构
-					except Exception as e:
-						print(f"获取accessibility tree时发生错误：{e}")
-					
-					# 查找对应的窗口ID并截图
-					# print("window_list", window_list)
-					for window_info in window_list:
-						if window_info.get(Quartz.kCGWindowOwnerPID) == self.word_app.processIdentifier():
-							window_id = window_info.get(Quartz.kCGWindowNumber)
-							# print("Try get screenshot", window_id)
-							if window_id not in self.config.window_id_list:
-								self.config.window_id_list.append(window_id)
-							# break # only get the first window
-					# pick the larger one to take screenshot
-					frame_infos = []
-					for window_tree in window_trees:
-						frame_info = parse_axvalue_bounds(window_tree["attributes"]["AXFrame"])
-						frame_infos.append(frame_info)
-					logger.info(f"frame_infos: {frame_infos}")
-					frame_info = max(frame_infos, key=lambda x: x[2] * x[3])
-					screenshot = self.capture_window_screenshot(frame_info)
-					screenshots.append(screenshot)
-					
-				return window_trees, screenshots  # 返回所有窗口的树形结构
+				for window_info in window_list:
+					if window_info.get(Quartz.kCGWindowOwnerPID) == self.word_app.processIdentifier():
+						window_id = window_info.get(Quartz.kCGWindowNumber)
+						if window_id not in self.config.window_id_list:
+							self.config.window_id_list.append(window_id)
+				# 遍历accessibility tree的同时截图
+				return capture_windows(
+					windows, self.get_window_frame, self.get_accessibility_tree, self.capture_window_screenshot
+				)
 			
 		except Exception as e:
 			print(f"发生错误：{e}")
@@ -0,0 +1,332 @@
+"""Per-run artifact store of the app agents, written in the background.
+
+Every step of an app agent logs its prompt, its screenshot and its
+accessibility tree. They are stored by run and step index, below
+``MACOSAGENT_ARTIFACTS_DIR`` (default ``./results``)::
+
+    <run id>/
+        images/<sha256>.jpg        screenshots, stored once per content
+        excel_agent_1/             one directory per agent run
+            steps.jsonl            one line per step, pointing to its files
+            conversations/0001.txt
+            trees/0001.jsonl       one accessibility element per line
+
+The run id is the one of the CLI run or daemon task (see
+:func:`macosagent.metrics.current_run_id`), so concurrent runs and steps in
+the same second never share a file.
+
+Artifacts are rendered and written by one background thread, fed by a
+bounded queue, so that a step only pays for queueing them:
+
+* ``MACOSAGENT_LOG_ARTIFACTS`` (or ``--log-artifacts``): ``full`` (default)
+  writes everything, ``light`` only the conversations, ``none`` nothing;
+* ``MACOSAGENT_ARTIFACTS_QUEUE`` (default 64) steps may wait to be written.
+  When the queue is full, new steps are dropped and counted
+  (``MACOSAGENT_ARTIFACTS_POLICY=drop``, the default) or the step waits for
+  room (``block``);
+* ``MACOSAGENT_ARTIFACTS_COMPRESS=true`` gzips the conversations and trees;
+* ``MACOSAGENT_ARTIFACTS_MAX_RUNS`` (default 50) and
+  ``MACOSAGENT_ARTIFACTS_MAX_BYTES`` (default 0, no limit): the run
+  directories last written longest ago are deleted beyond them. Only
+  directories with the layout above are considered, and never those of runs
+  still open in this process.
+"""
+
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
+
+from macosagent.metrics import current_run_id
+from macosagent.profiling import profile_phase
+
+if TYPE_CHECKING:
+    from macosagent.agents.imaging import EncodedImage
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("none", "light", "full")
+POLICIES = ("drop", "block")
+STEP_INDEX = "steps.jsonl"
+
+_STOP = object()
+
+
+@dataclass
+class ArtifactStats:
+    steps: int = 0
+    dropped: int = 0
+    errors: int = 0
+    files_written: int = 0
+    bytes_written: int = 0
+    images_deduplicated: int = 0
+    write_seconds: float = 0.0
+    runs_deleted: int = 0
+
+
+class ArtifactRun:
+    """Artifacts of one agent run, written below ``directory``; steps are numbered from 1."""
+
+    def __init__(self, writer: "ArtifactWriter | None", directory: Path | None):
+        self.writer = writer
+        self.directory = directory
+        self.step = 0
+
+    def write_step(
+        self,
+        conversation: Callable[[IO[str]], Any],
+        screenshot: "EncodedImage | None" = None,
+        elements: list[dict] | None = None,
+    ) -> None:
+        """Queue the artifacts of the next step; ``conversation`` renders the prompt, on the writer thread."""
+        if self.writer is None:
+            return
+        self.step += 1
+        if self.writer.level == "light":
+            screenshot, elements = None, None
+        step = self.step
+        self.writer.submit(lambda: self.writer._write_step(self.directory, step, conversation, screenshot, elements))
+
+
+# Run of the artifacts that are not logged.
+NO_ARTIFACTS = ArtifactRun(None, None)
+
+
+class ArtifactWriter:
+    def __init__(
+        self,
+        root: str | Path = "results",
+        level: str = "full",
+        max_queue: int = 64,
+        policy: str = "drop",
+        compress: bool = False,
+        max_runs: int = 50,
+        max_bytes: int = 0,
+    ):
+        self.root = Path(root)
+        self.level = level
+        self.policy = policy
+        self.compress = compress
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.stats = ArtifactStats()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # Agent runs opened per (run id, agent), to number their directories.
+        self._agent_runs: dict[tuple[str, str], int] = {}
+        # Agent runs in progress per run id, whose directories must not be pruned.
+        self._open_runs: Counter[str] = Counter()
+        # Run id of the agent runs started outside of a CLI run or daemon task.
+        self._local_run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="macosagent-artifacts", daemon=True)
+                self._thread.start()
+
+    @contextmanager
+    def open_run(self, agent: str) -> Iterator[ArtifactRun]:
+        """Directory of the artifacts of one run of ``agent``; old runs are pruned when it ends."""
+        if self.level == "none":
+            yield NO_ARTIFACTS
+            return
+        self._start()
+        run_id = current_run_id() or self._local_run_id
+        with self._lock:
+            number = self._agent_runs.get((run_id, agent), 0) + 1
+            self._agent_runs[(run_id, agent)] = number
+            self._open_runs[run_id] += 1
+        try:
+            yield ArtifactRun(self, self.root / run_id / f"{agent}_{number}")
+        finally:
+            with self._lock:
+                self._open_runs[run_id] -= 1
+                if not self._open_runs[run_id]:
+                    del self._open_runs[run_id]
+            self.submit(self._prune, force=True)
+
+    def submit(self, job: Callable[[], Any], force: bool = False) -> bool:
+        """Queue ``job`` for the writer thread; False if it was dropped because the queue is full."""
+        if self.policy == "block" or force:
+            self._queue.put(job)
+            return True
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.stats.dropped += 1
+            logger.debug("Artifact queue full, dropped a step")
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                job()
+            except Exception as e:  # noqa: BLE001
+                self.stats.errors += 1
+                logger.warning(f"Could not write artifacts: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_file(self, path: Path, data: bytes) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.stats.files_written += 1
+        self.stats.bytes_written += len(data)
+        return len(data)
+
+    def _write_text(self, directory: Path, name: str, text: str) -> str:
+        data = text.encode("utf-8")
+        if self.compress:
+            data = gzip.compress(data, compresslevel=6)
+            name += ".gz"
+        self._write_file(directory / name, data)
+        return name
+
+    @profile_phase("artifact_write")
+    def _write_step(
+        self,
+        directory: Path,
+        step: int,
+        conversation: Callable[[IO[str]], Any],
+        screenshot: "EncodedImage | None",
+        elements: list[dict] | None,
+    ) -> None:
+        start = time.perf_counter()
+        entry: dict[str, Any] = {"step": step, "time": datetime.now().isoformat(timespec="milliseconds")}
+        buffer = io.StringIO()
+        conversation(buffer)
+        entry["conversation"] = self._write_text(directory, f"conversations/{step:04d}.txt", buffer.getvalue())
+        if screenshot is not None:
+            digest = hashlib.sha256(screenshot.data).hexdigest()
+            path = directory.parent / "images" / f"{digest}.{screenshot.extension}"
+            if path.exists():
+                self.stats.images_deduplicated += 1
+            else:
+                self._write_file(path, screenshot.data)
+            entry["screenshot"] = f"../images/{path.name}"
+        if elements is not None:
+            lines = "".join(json.dumps(element, ensure_ascii=False, separators=(",", ":")) + "\n" for element in elements)
+            entry["tree"] = self._write_text(directory, f"trees/{step:04d}.jsonl", lines)
+            entry["elements"] = len(elements)
+        entry["write_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with open(directory / STEP_INDEX, "a", encoding="utf-8") as f:
+            f.write(line)
+        self.stats.steps += 1
+        self.stats.bytes_written += len(line)
+        self.stats.write_seconds += time.perf_counter() - start
+
+    @staticmethod
+    def _is_run(path: Path) -> bool:
+        """Whether ``path`` is a run directory: one with agent runs that have a step index."""
+        return path.is_dir() and any((child / STEP_INDEX).is_file() for child in path.iterdir())
+
+    @staticmethod
+    def _last_write(run: Path) -> float:
+        """Time the run was last written to; its own mtime only changes when an agent run starts."""
+        return max([run.stat().st_mtime, *(path.stat().st_mtime for path in run.rglob("*"))])
+
+    def _prune(self) -> None:
+        """Delete the run directories written longest ago beyond the run and byte limits.
+
+        The most recent run and the runs still open in this process are kept.
+        """
+        if not self.root.is_dir():
+            return
+        with self._lock:
+            open_runs = set(self._open_runs)
+        runs = sorted((path for path in self.root.iterdir() if self._is_run(path)), key=self._last_write)
+        sizes = {run: sum(f.stat().st_size for f in run.rglob("*") if f.is_file()) for run in runs} if self.max_bytes else {}
+        count, total = len(runs), sum(sizes.values())
+        for run in runs[:-1]:
+            if not ((self.max_runs and count > self.max_runs) or (self.max_bytes and total > self.max_bytes)):
+                break
+            if run.name in open_runs:
+                continue
+            shutil.rmtree(run, ignore_errors=True)
+            count -= 1
+            total -= sizes.get(run, 0)
+            self.stats.runs_deleted += 1
+
+    def flush(self) -> None:
+        """Wait until the queued artifacts are written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def info(self) -> dict[str, Any]:
+        return {"level": self.level, "pending": self._queue.qsize(), **asdict(self.stats)}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={os.getenv(name)!r}")
+        return default
+
+
+def create_artifact_writer() -> ArtifactWriter:
+    level = os.getenv("MACOSAGENT_LOG_ARTIFACTS", "full").lower()
+    if level not in LEVELS:
+        logger.warning(f"Unknown MACOSAGENT_LOG_ARTIFACTS={level!r}, using full")
+        level = "full"
+    policy = os.getenv("MACOSAGENT_ARTIFACTS_POLICY", "drop").lower()
+    if policy not in POLICIES:
+        logger.warning(f"Unknown MACOSAGENT_ARTIFACTS_POLICY={policy!r}, using drop")
+        policy = "drop"
+    return ArtifactWriter(
+        root=os.getenv("MACOSAGENT_ARTIFACTS_DIR", "results"),
+        level=level,
+        max_queue=_env_int("MACOSAGENT_ARTIFACTS_QUEUE", 64),
+        policy=policy,
+        compress=os.getenv("MACOSAGENT_ARTIFACTS_COMPRESS", "false").lower() == "true",
+        max_runs=_env_int("MACOSAGENT_ARTIFACTS_MAX_RUNS", 50),
+        max_bytes=_env_int("MACOSAGENT_ARTIFACTS_MAX_BYTES", 0),
+    )
+
+
+_writer: ArtifactWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    """Return the process-wide artifact writer, created from the environment on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = create_artifact_writer()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def configure_artifacts(level: str | None) -> None:
+    """Set the artifact level, e.g. from ``--log-artifacts``, before the writer is first used."""
+    if level:
+        os.environ["MACOSAGENT_LOG_ARTIFACTS"] = level
@@ -0,0 +1,248 @@
+"""Batch task execution for ``macosagent execute-batch``.
+
+Tasks come from a directory of task files (``examples/tasks/``) or a JSONL file
+with one task object per line. Besides ``task``, an entry may set ``id``,
+``gui`` (whether the task drives the desktop) or ``agents`` (registry keys or
+tool names of the app agents it needs); tasks are assumed to drive the GUI
+unless stated otherwise.
+
+Non-GUI tasks run concurrently on a worker pool while GUI tasks run one at a
+time on a dedicated worker. Every finished task is appended to a JSONL results
+file, and tasks already completed there are skipped on reruns.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from macosagent.agents.registry import get_agent_spec
+from macosagent.llm.tracing import trace_with_metadata
+from macosagent.metrics import get_metrics, metric_context
+from macosagent.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchTask:
+    id: str
+    task: str
+    gui: bool = True
+
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    wall_time: float = 0.0
+    gui_lock_wait: float = 0.0
+    durations: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Tasks finished per hour over the wall time of this run."""
+        finished = self.completed + self.failed
+        return finished / self.wall_time * 3600 if self.wall_time > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wall_time": self.wall_time,
+            "tasks_per_hour": self.throughput,
+            "gui_lock_wait": self.gui_lock_wait,
+            "latency_p50": percentile(self.durations, 50),
+            "latency_p95": percentile(self.durations, 95),
+        }
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _is_gui_task(entry: dict[str, Any]) -> bool:
+    if "gui" in entry:
+        return bool(entry["gui"])
+    if "agents" in entry:
+        specs = [get_agent_spec(name) for name in entry["agents"]]
+        return any(spec is None or spec.gui_bound for spec in specs)
+    return True
+
+
+def load_tasks(source: str | Path) -> list[BatchTask]:
+    """Load tasks from a directory of task files or from a JSONL file."""
+    source = Path(source)
+    entries: list[tuple[str, dict[str, Any]]] = []
+    if source.is_dir():
+        for path in sorted(source.glob("*.json")):
+            with open(path, encoding="utf-8") as f:
+                entries.append((path.stem, json.load(f)))
+    else:
+        with open(source, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    entries.append((f"{source.stem}:{line_number}", json.loads(line)))
+
+    tasks = []
+    for default_id, entry in entries:
+        tasks.append(BatchTask(
+            id=str(entry.get("id", default_id)),
+            task=entry["task"],
+            gui=_is_gui_task(entry),
+        ))
+    return tasks
+
+
+def load_completed_ids(results_path: str | Path) -> set[str]:
+    """Ids of tasks that already completed successfully in ``results_path``."""
+    results_path = Path(results_path)
+    completed = set()
+    if not results_path.exists():
+        return completed
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run.
+                continue
+            if record.get("status") == "ok":
+                completed.add(record["id"])
+    return completed
+
+
+def _end_partial_line(results_path: Path) -> None:
+    """Terminate a partially written last line so the next record starts on a line of its own."""
+    if not results_path.exists() or not results_path.stat().st_size:
+        return
+    with open(results_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _run_with_orchestrator(task: str) -> Any:
+    from macosagent.macosagent import create_agent
+
+    return create_agent().run(task)
+
+
+class BatchRunner:
+    """Runs a list of tasks and appends one result record per task."""
+
+    def __init__(
+        self,
+        results_path: str | Path,
+        concurrency: int = 4,
+        run_task: Callable[[str], Any] = _run_with_orchestrator,
+        metrics_dir: str | Path | None = None,
+    ):
+        self.results_path = Path(results_path)
+        self.metrics_dir = metrics_dir
+        self.concurrency = max(1, concurrency)
+        self.run_task = run_task
+        self._write_lock = threading.Lock()
+
+    def _append(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._write_lock, open(self.results_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+
+    def _execute(self, batch_task: BatchTask) -> dict[str, Any]:
+        run_id = str(uuid.uuid4())
+        record: dict[str, Any] = {"id": batch_task.id, "run_id": run_id, "task": batch_task.task, "gui": batch_task.gui}
+        record["started_at"] = time.time()
+        start_time = time.perf_counter()
+        logger.info(f"Starting batch task {batch_task.id} ({run_id})")
+
+        @trace_with_metadata(custom_id=run_id, name="macosagent")
+        def run_agent(task):
+            return self.run_task(task)
+
+        with metric_context(run_id=run_id):
+            try:
+                record["result"] = run_agent(batch_task.task)
+                record["status"] = "ok"
+            except Exception as e:  # noqa: BLE001
+                logger.exception(f"Batch task {batch_task.id} failed")
+                record["status"] = "error"
+                record["error"] = f"{type(e).__name__}: {e}"
+        try:
+            record["usage"] = get_metrics().run_summary(run_id)["total"]
+            if self.metrics_dir is not None:
+                get_metrics().export(self.metrics_dir, run_id)
+        except Exception:  # noqa: BLE001
+            # The task itself finished; still record it so reruns skip it.
+            logger.exception(f"Could not record the metrics of batch task {batch_task.id}")
+        record["duration"] = time.perf_counter() - start_time
+        record["finished_at"] = time.time()
+        self._append(record)
+        logger.info(f"Batch task {batch_task.id} finished with status {record['status']} in {record['duration']:.2f}s")
+        return record
+
+    def run(self, tasks: list[BatchTask]) -> BatchSummary:
+        summary = BatchSummary(total=len(tasks))
+        self.results_path.parent.mkdir(parents=True, exist_ok=True)
+        done_ids = load_completed_ids(self.results_path)
+        _end_partial_line(self.results_path)
+        pending = [t for t in tasks if t.id not in done_ids]
+        summary.skipped = len(tasks) - len(pending)
+        if summary.skipped:
+            logger.info(f"Skipping {summary.skipped} tasks already completed in {self.results_path}")
+
+        start_time = time.perf_counter()
+        lock_stats = get_scheduler().gui_lock.stats
+        lock_wait_before = lock_stats.wait_total
+        # GUI tasks share the desktop, so they get a single dedicated worker.
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch") as pool, \
+                ThreadPoolExecutor(1, thread_name_prefix="batch-gui") as gui_pool:
+            futures = {
+                (gui_pool if t.gui else pool).submit(self._execute, t): t
+                for t in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception:  # noqa: BLE001
+                    # Writing the result failed; count the task and keep the batch going.
+                    logger.exception(f"Could not record batch task {futures[future].id}")
+                    summary.failed += 1
+                    continue
+                summary.durations.append(record["duration"])
+                if record["status"] == "ok":
+                    summary.completed += 1
+                else:
+                    summary.failed += 1
+        summary.wall_time = time.perf_counter() - start_time
+        summary.gui_lock_wait = lock_stats.wait_total - lock_wait_before
+        return summary
+
+
+def format_summary(summary: BatchSummary) -> str:
+    data = summary.to_dict()
+    p50 = f"{data['latency_p50']:.2f}s" if data["latency_p50"] is not None else "n/a"
+    p95 = f"{data['latency_p95']:.2f}s" if data["latency_p95"] is not None else "n/a"
+    return (
+        f"tasks: {data['total']} (skipped {data['skipped']}, completed {data['completed']}, failed {data['failed']})\n"
+        f"wall time: {data['wall_time']:.2f}s, throughput: {data['tasks_per_hour']:.1f} tasks/hour\n"
+        f"latency p50: {p50}, p95: {p95}, time spent waiting for the GUI lock: {data['gui_lock_wait']:.2f}s"
+    )
@@ -0,0 +1,152 @@
+"""Agent loop overhead benchmark against the offline stub LLM server.
+
+Runs an app agent (or the orchestrator) end to end against
+:mod:`macosagent.benchmarks.stub_server` and subtracts the latency the stub
+simulated from the step durations recorded by :mod:`macosagent.metrics`. What
+remains per step is the time the agent itself spends on state capture,
+prompt building, HTTP, parsing and executing actions.
+"""
+
+import os
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+from macosagent.benchmarks.stub_server import StubLLM, StubServer, client_environment
+from macosagent.metrics import ORCHESTRATOR, get_metrics, metric_context
+
+# Stub request kind answering the steps of each agent.
+STEP_KINDS = {ORCHESTRATOR: "code"}
+
+
+@dataclass
+class OverheadReport:
+    agent: str
+    steps: list[int] = field(default_factory=list)
+    wall_time: list[float] = field(default_factory=list)
+    step_time: list[float] = field(default_factory=list)
+    simulated_step_latency: list[float] = field(default_factory=list)
+    llm_calls: list[int] = field(default_factory=list)
+    llm_latency: list[float] = field(default_factory=list)
+    simulated_latency: list[float] = field(default_factory=list)
+    stub: dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: str | None = None
+
+    def overhead_per_step(self) -> list[float]:
+        """Step time not spent waiting for the simulated model, per step of each run."""
+        return [
+            (step_time - simulated) / steps
+            for steps, step_time, simulated in zip(self.steps, self.step_time, self.simulated_step_latency)
+            if steps
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        overhead = self.overhead_per_step()
+        transport = [
+            (latency - simulated) / calls
+            for calls, latency, simulated in zip(self.llm_calls, self.llm_latency, self.simulated_latency)
+            if calls
+        ]
+        return {
+            "agent": self.agent,
+            "runs": len(self.wall_time),
+            "steps_per_run": self.steps,
+            "wall_time_s": _summary(self.wall_time),
+            "step_overhead_s": _summary(overhead),
+            "llm_client_overhead_s": _summary(transport),
+            "stub": self.stub,
+            "result": None if self.result is None else str(self.result),
+            "error": self.error,
+        }
+
+
+def _summary(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def _run_once(agent: str, task: str) -> Any:
+    if agent == ORCHESTRATOR:
+        from macosagent.macosagent import create_agent
+
+        return create_agent().run(task)
+    from macosagent.agents.registry import create_agent_box
+
+    return create_agent_box()[agent].forward(task)
+
+
+def run_overhead_benchmark(
+    agent: str,
+    task: str,
+    stub: StubLLM,
+    repeat: int = 3,
+    warmup: int = 1,
+    stream: bool = False,
+) -> OverheadReport:
+    """Run ``agent`` on ``task`` ``repeat`` times against ``stub`` and report its overhead.
+
+    The first ``warmup`` runs, which pay for imports and connections, are not reported.
+    """
+    server = StubServer(stub).start()
+    os.environ.update(client_environment(server.base_url))
+    # Always talk to the stub, never to recorded responses.
+    os.environ["MACOSAGENT_LLM_CACHE"] = "off"
+    if stream:
+        os.environ["MACOSAGENT_STREAM_ACTIONS"] = "true"
+
+    report = OverheadReport(agent=agent)
+    step_kind = STEP_KINDS.get(agent, "agent_output")
+    metrics = get_metrics()
+    try:
+        for run in range(warmup + repeat):
+            run_id = f"bench-{uuid.uuid4()}"
+            before = stub.stats.to_dict()["simulated_latency"]
+            start_time = time.perf_counter()
+            with metric_context(run_id=run_id):
+                try:
+                    report.result = _run_once(agent, task)
+                except Exception as e:  # noqa: BLE001
+                    report.error = f"{type(e).__name__}: {e}"
+                    break
+            wall_time = time.perf_counter() - start_time
+            if run < warmup:
+                continue
+            report.wall_time.append(wall_time)
+            after = stub.stats.to_dict()["simulated_latency"]
+            simulated = {kind: after[kind] - before.get(kind, 0.0) for kind in after}
+            summary = metrics.run_summary(run_id)
+            usage = summary["agents"].get(agent, {})
+            total = summary["total"]
+            report.steps.append(usage.get("steps", 0))
+            report.step_time.append(usage.get("step_duration_total", 0.0))
+            report.simulated_step_latency.append(simulated.get(step_kind, 0.0))
+            report.llm_calls.append(total["llm_calls"])
+            report.llm_latency.append(total["llm_latency_total"])
+            report.simulated_latency.append(sum(simulated.values()))
+    finally:
+        server.shutdown()
+        server.server_close()
+    report.stub = stub.stats.to_dict()
+    return report
+
+
+def format_report(report: OverheadReport) -> str:
+    data = report.to_dict()
+    lines = [f"agent: {data['agent']}, runs: {data['runs']}, steps per run: {data['steps_per_run']}"]
+    for key in ("wall_time_s", "step_overhead_s", "llm_client_overhead_s"):
+        value = data[key]
+        if value is not None:
+            lines.append(f"{key:<22} median={value['median']:.4f}s min={value['min']:.4f}s max={value['max']:.4f}s")
+    stub = data["stub"]
+    lines.append(f"stub requests: {stub.get('requests')}, injected errors: {stub.get('injected_errors')}")
+    if data["error"]:
+        lines.append(f"run failed: {data['error']}")
+    return "\n".join(lines)
@@ -0,0 +1,144 @@
+"""Startup benchmark for ``macosagent run``.
+
+Measures, in fresh interpreters, the cold-start time up to a ready orchestrator
+(``create_agent()`` returned) and breaks the import time down per top-level
+package using ``python -X importtime``.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+PROBE = """
+import json
+import time
+
+start = time.perf_counter()
+import dotenv
+from macosagent.cli import cli
+imported = time.perf_counter()
+dotenv.load_dotenv()
+result = {"import_cli": imported - start}
+try:
+    from macosagent.macosagent import create_agent
+    create_agent()
+    result["create_agent"] = time.perf_counter() - imported
+except Exception as e:
+    result["error"] = f"{type(e).__name__}: {e}"
+print(json.dumps(result))
+"""
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int
+    cumulative_us: int
+
+
+@dataclass
+class StartupReport:
+    cold_start: list[float] = field(default_factory=list)
+    import_cli: list[float] = field(default_factory=list)
+    create_agent: list[float] = field(default_factory=list)
+    packages: dict[str, int] = field(default_factory=dict)
+    loaded_modules: int = 0
+    error: str | None = None
+
+    def to_dict(self, top: int = 15) -> dict:
+        return {
+            "cold_start_s": _summary(self.cold_start),
+            "import_cli_s": _summary(self.import_cli),
+            "create_agent_s": _summary(self.create_agent),
+            "loaded_modules": self.loaded_modules,
+            "top_packages_ms": {
+                name: round(us / 1000, 1)
+                for name, us in sorted(self.packages.items(), key=lambda x: -x[1])[:top]
+            },
+            "error": self.error,
+        }
+
+
+def _summary(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def parse_importtime(stderr: str) -> list[ImportRecord]:
+    """Parse the ``-X importtime`` table written to stderr."""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        records.append(ImportRecord(
+            name=parts[2].strip(),
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+        ))
+    return records
+
+
+def group_by_package(records: list[ImportRecord]) -> dict[str, int]:
+    """Sum the self import time of every module per top-level package."""
+    packages: dict[str, int] = defaultdict(int)
+    for record in records:
+        packages[record.name.split(".")[0]] += record.self_us
+    return dict(packages)
+
+
+def _run_probe(importtime: bool) -> tuple[float, dict, str]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", PROBE]
+    start = time.perf_counter()
+    process = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr else "probe failed")
+    return elapsed, json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def run_startup_benchmark(repeat: int = 3) -> StartupReport:
+    """Run the startup probe ``repeat`` times plus once with ``-X importtime``."""
+    report = StartupReport()
+    for _ in range(repeat):
+        elapsed, result, _ = _run_probe(importtime=False)
+        report.cold_start.append(elapsed)
+        report.import_cli.append(result["import_cli"])
+        if "create_agent" in result:
+            report.create_agent.append(result["create_agent"])
+        report.error = result.get("error")
+    _, _, stderr = _run_probe(importtime=True)
+    records = parse_importtime(stderr)
+    report.loaded_modules = len(records)
+    report.packages = group_by_package(records)
+    return report
+
+
+def format_report(report: StartupReport, top: int = 15) -> str:
+    data = report.to_dict(top=top)
+    lines = []
+    for key in ("cold_start_s", "import_cli_s", "create_agent_s"):
+        value = data[key]
+        if value is not None:
+            lines.append(f"{key:<16} median={value['median']:.3f}s min={value['min']:.3f}s max={value['max']:.3f}s")
+    if data["error"]:
+        lines.append(f"create_agent failed: {data['error']}")
+    lines.append(f"modules imported: {data['loaded_modules']}")
+    lines.append("import time by package (self, ms):")
+    for name, ms in data["top_packages_ms"].items():
+        lines.append(f"  {name:<32} {ms:>9.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+"""Per-step cost of building the step output models of an app agent.
+
+Times what ``get_next_action`` and ``get_prompt`` used to rebuild at every
+step (the ``ActionModel`` union of the registered actions, the ``AgentOutput``
+type, the structured-output runnable of the LLM and the action descriptions of
+the prompt) against :class:`macosagent.agents.step_models.StepModelCache`.
+The LLM client is only constructed, never called.
+"""
+
+import importlib
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from macosagent.agents.step_models import StepModelCache
+
+# App agents built on the ReAct step loop, by registry key.
+REACT_AGENTS = (
+    "calendar_agent",
+    "excel_agent",
+    "player_agent",
+    "powerpoint_agent",
+    "preview_agent",
+    "wechat_agent",
+    "word_agent",
+)
+
+TOOL_CALL_METHOD = "function_calling"
+
+
+@dataclass
+class StepModelsReport:
+    agent: str
+    steps: int
+    actions: int = 0
+    rebuild_s: float | None = None
+    cached_s: float | None = None
+    builds: int = 0
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        saved = None if self.rebuild_s is None or self.cached_s is None else self.rebuild_s - self.cached_s
+        return {
+            "agent": self.agent,
+            "steps": self.steps,
+            "actions": self.actions,
+            "rebuild_ms_per_step": None if self.rebuild_s is None else round(self.rebuild_s * 1000, 3),
+            "cached_ms_per_step": None if self.cached_s is None else round(self.cached_s * 1000, 3),
+            "saved_ms_per_step": None if saved is None else round(saved * 1000, 3),
+            "cache_builds": self.builds,
+            "error": self.error,
+        }
+
+
+def _time_steps(step: Any, steps: int, repeat: int) -> float:
+    """Best time per step in seconds over ``repeat`` runs of ``steps`` steps."""
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(steps):
+            step()
+        best = min(best, (time.perf_counter() - start_time) / steps)
+    return best
+
+
+def run_step_models_benchmark(agent: str = "excel_agent", steps: int = 20, repeat: int = 3) -> StepModelsReport:
+    report = StepModelsReport(agent=agent, steps=steps)
+    try:
+        from langchain_openai import ChatOpenAI
+
+        registry = importlib.import_module(f"macosagent.agents.{agent}.controller").Controller().registry
+        agent_output = importlib.import_module(f"macosagent.agents.{agent}.agent.views").AgentOutput
+    except Exception as e:  # noqa: BLE001
+        report.error = f"{type(e).__name__}: {e}"
+        return report
+    llm = ChatOpenAI(model="gpt-4o", api_key="benchmark")
+    report.actions = len(registry.registry.actions)
+
+    def rebuild() -> None:
+        action_model = registry.create_action_model()
+        output_model = agent_output.type_with_custom_actions(action_model)
+        llm.with_structured_output(output_model, include_raw=True, method=TOOL_CALL_METHOD)
+        registry.get_prompt_description()
+
+    cache = StepModelCache(registry, agent_output)
+
+    def cached() -> None:
+        cache.get().prompt_description
+        cache.structured_llm(llm, TOOL_CALL_METHOD)
+
+    report.rebuild_s = _time_steps(rebuild, steps, repeat)
+    report.cached_s = _time_steps(cached, steps, repeat)
+    report.builds = cache.builds
+    return report
+
+
+def format_report(report: StepModelsReport) -> str:
+    data = report.to_dict()
+    if data["error"]:
+        return f"agent: {data['agent']}, benchmark failed: {data['error']}"
+    return "\n".join([
+        f"agent: {data['agent']}, {data['actions']} actions, {data['steps']} steps per run, best of the runs",
+        f"rebuilt every step  {data['rebuild_ms_per_step']:>9.3f} ms/step",
+        f"cached              {data['cached_ms_per_step']:>9.3f} ms/step ({data['cache_builds']} build)",
+        f"saved               {data['saved_ms_per_step']:>9.3f} ms/step",
+    ])
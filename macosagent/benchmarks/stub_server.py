@@ -0,0 +1,352 @@
+"""Offline OpenAI-compatible chat completions server for benchmarking the agent loop.
+
+The stub answers ``POST .../chat/completions`` from a script instead of a model:
+
+* requests with ``tools`` (the ``AgentOutput`` structured output of the app
+  agents) get a tool call whose arguments are the next entry of
+  ``agent_outputs``;
+* requests with an ``Observation:`` stop sequence (the smolagents orchestrator)
+  get the next entry of ``code``;
+* any other request (e.g. ``provide_final_answer``) gets ``text``.
+
+"Next" is the number of assistant turns in the request beyond the first request
+of the same conversation, so each run starts over at the first entry; past the
+end of a list the last entry is repeated. Latency is drawn from a configurable
+distribution, responses can be streamed (``"stream": true``) and a share of the
+requests can fail with e.g. 429.
+
+Point the LLM clients at it with ``API_SERVER_TYPE=OPENAI``, ``API_BASE`` and
+``OPENAI_ENDPOINT`` set to ``http://127.0.0.1:<port>/v1``.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+STUB_MODEL = "stub-model"
+DEFAULT_TEXT = "The task has been completed."
+
+
+@dataclass
+class LatencyModel:
+    """Distribution of the simulated model latency, parsed from ``kind[:a[:b]]``.
+
+    ``fixed:s``, ``uniform:low:high``, ``normal:mean:std`` (clipped at 0) and
+    ``lognormal:mu:sigma`` (of the underlying normal), all in seconds.
+    """
+
+    kind: str = "fixed"
+    params: tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, *values = spec.split(":")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid latency '{spec}'. Use fixed:s, uniform:low:high, normal:mean:std or lognormal:mu:sigma")
+        return cls(kind, tuple(float(value) for value in values))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        return rng.lognormvariate(*self.params)
+
+
+def default_script(steps: int = 1, text: str = DEFAULT_TEXT) -> dict[str, Any]:
+    """Script taking ``steps`` app agent steps: empty ones, then ``done``; the orchestrator answers at once."""
+    def agent_output(step: int, action: list[dict[str, Any]]) -> dict[str, Any]:
+        return {
+            "current_state": {
+                "evaluation_previous_goal": "Success",
+                "memory": f"Benchmark step {step}/{steps}",
+                "next_goal": "Continue" if action == [] else "Finish",
+            },
+            "action": action,
+        }
+
+    outputs = [agent_output(step, []) for step in range(1, steps)]
+    outputs.append(agent_output(steps, [{"done": {"text": text, "success": True}}]))
+    return {
+        "agent_outputs": outputs,
+        "code": [f"Thought: The task is done.\nCode:\n```py\nfinal_answer({text!r})\n```<end_code>"],
+        "text": text,
+    }
+
+
+def load_script(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    return {**default_script(), **script}
+
+
+@dataclass
+class StubStats:
+    requests: dict[str, int] = field(default_factory=dict)
+    injected_errors: int = 0
+    simulated_latency: dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "injected_errors": self.injected_errors,
+            "simulated_latency": dict(self.simulated_latency),
+        }
+
+
+class StubLLM:
+    """Scripted responses, latency and failures of the stub server."""
+
+    def __init__(
+        self,
+        script: dict[str, Any] | None = None,
+        latency: LatencyModel | None = None,
+        chunk_delay: float = 0.0,
+        chunks: int = 8,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: float = 0.1,
+        seed: int | None = None,
+    ):
+        self.script = script or default_script()
+        self.latency = latency or LatencyModel()
+        self.chunk_delay = chunk_delay
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.stats = StubStats()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # conversation key -> assistant turns in its first request
+        self._conversations: dict[str, int] = {}
+
+    @staticmethod
+    def kind(request: dict[str, Any]) -> str:
+        if request.get("tools"):
+            return "agent_output"
+        stop = request.get("stop") or []
+        if "Observation:" in (stop if isinstance(stop, list) else [stop]):
+            return "code"
+        return "text"
+
+    def _turn(self, kind: str, messages: list[dict[str, Any]]) -> int:
+        # A conversation is identified by the messages before its first assistant turn.
+        prefix = []
+        for message in messages:
+            if message.get("role") == "assistant":
+                break
+            prefix.append(message)
+        head = json.dumps([kind] + prefix, sort_keys=True, default=str)
+        key = hashlib.sha256(head.encode()).hexdigest()
+        turns = sum(1 for message in messages if message.get("role") == "assistant")
+        with self._lock:
+            first = self._conversations.get(key)
+            if first is None or turns <= first:
+                self._conversations[key] = first = turns
+        return turns - first
+
+    def sample(self, kind: str) -> tuple[float, bool]:
+        """Simulated latency of a request and whether it fails."""
+        with self._lock:
+            latency = self.latency.sample(self._rng)
+            fail = self._rng.random() < self.error_rate
+            self.stats.requests[kind] = self.stats.requests.get(kind, 0) + 1
+            self.stats.simulated_latency[kind] = self.stats.simulated_latency.get(kind, 0.0) + latency
+            self.stats.injected_errors += fail
+        return latency, fail
+
+    def respond(self, request: dict[str, Any]) -> tuple[str, dict[str, Any] | str]:
+        """Kind of the request and its scripted output: tool call arguments or message content."""
+        kind = self.kind(request)
+        if kind == "text":
+            return kind, self.script["text"]
+        entries = self.script["agent_outputs" if kind == "agent_output" else "code"]
+        turn = self._turn(kind, request.get("messages", []))
+        return kind, entries[min(turn, len(entries) - 1)]
+
+
+def _tool_name(request: dict[str, Any]) -> str:
+    tool_choice = request.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        return tool_choice["function"]["name"]
+    return request["tools"][0]["function"]["name"]
+
+
+def _usage(request_body: bytes, output: str) -> dict[str, int]:
+    prompt_tokens = len(request_body) // 4
+    completion_tokens = max(1, len(output) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("content-length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": STUB_MODEL, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            request = json.loads(body)
+            stub = self.server.stub
+            kind, output = stub.respond(request)
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            self._send_json(400, {"error": {"message": f"Invalid request: {e}", "type": "invalid_request_error"}})
+            return
+        latency, fail = stub.sample(kind)
+        time.sleep(latency)
+        if fail:
+            self._send_json(
+                stub.error_status,
+                {"error": {"message": "Injected failure", "type": "stub_error"}},
+                headers={"retry-after-ms": str(int(stub.retry_after * 1000))},
+            )
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if isinstance(output, dict):
+            arguments = json.dumps(output)
+            tool_call = {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": _tool_name(request), "arguments": arguments},
+            }
+            message: dict[str, Any] = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            finish_reason = "tool_calls"
+            text = arguments
+        else:
+            message = {"role": "assistant", "content": output}
+            finish_reason = "stop"
+            text = output
+        usage = _usage(body, text)
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+            self._stream(completion_id, message, finish_reason, usage if include_usage else None)
+            return
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": STUB_MODEL,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, message: dict[str, Any], finish_reason: str, usage: dict | None) -> None:
+        stub = self.server.stub
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: dict[str, Any] | None, finish: str | None = None, **extra: Any) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": STUB_MODEL,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **extra,
+            }
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        tool_calls = message.get("tool_calls")
+        text = tool_calls[0]["function"]["arguments"] if tool_calls else message["content"]
+        size = max(1, -(-len(text) // stub.chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(stub.chunk_delay)
+            if not tool_calls:
+                delta: dict[str, Any] = {"content": piece}
+            elif i == 0:
+                first = {**tool_calls[0], "index": 0, "function": {**tool_calls[0]["function"], "arguments": piece}}
+                delta = {"tool_calls": [first]}
+            else:
+                delta = {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+            if i == 0:
+                delta["role"] = "assistant"
+            event(delta)
+        event({}, finish=finish_reason)
+        if usage is not None:
+            event(None, usage=usage)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, stub: StubLLM, host: str = "127.0.0.1", port: int = 0):
+        self.stub = stub
+        super().__init__((host, port), _StubHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        """Serve in a background thread and return ``self``."""
+        threading.Thread(target=self.serve_forever, name="macosagent-stub-llm", daemon=True).start()
+        return self
+
+
+def client_environment(base_url: str) -> dict[str, str]:
+    """Environment pointing ``create_smol_llm_client``/``create_langchain_llm_client`` at the stub."""
+    return {
+        "API_SERVER_TYPE": "OPENAI",
+        "API_BASE": base_url,
+        "MODEL": STUB_MODEL,
+        "API_KEY": "stub",
+        "OPENAI_ENDPOINT": base_url,
+        "OPENAI_MODEL": STUB_MODEL,
+        "OPENAI_API_KEY": "stub",
+    }
@@ -0,0 +1,95 @@
+"""Per-call overhead of traced functions.
+
+Times a trivial function called bare and through :func:`trace_function` with
+tracing disabled, inside an unsampled run and inside a sampled run. Sampled
+spans go through the usual buffer and background exporter thread, into an
+in-memory sink, so the measurement includes buffering but no I/O.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from macosagent.llm.tracing import Span, Tracer, trace_function
+
+MODES = ("bare", "disabled", "unsampled", "sampled")
+
+
+class _CountingExporter:
+    def __init__(self):
+        self.spans = 0
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans += len(spans)
+
+    def shutdown(self) -> None:
+        pass
+
+
+@dataclass
+class TracingReport:
+    calls: int
+    ns_per_call: dict[str, float] = field(default_factory=dict)
+    exported: int = 0
+    dropped: int = 0
+
+    def overhead(self) -> dict[str, float]:
+        """Cost added to each call by tracing, in nanoseconds."""
+        bare = self.ns_per_call["bare"]
+        return {mode: value - bare for mode, value in self.ns_per_call.items() if mode != "bare"}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "ns_per_call": {mode: round(value, 1) for mode, value in self.ns_per_call.items()},
+            "overhead_ns": {mode: round(value, 1) for mode, value in self.overhead().items()},
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
+
+
+def _time_calls(func: Any, calls: int, repeat: int) -> float:
+    """Best time per call in nanoseconds over ``repeat`` loops of ``calls`` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter_ns()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter_ns() - start_time) / calls)
+    return best
+
+
+def run_tracing_benchmark(calls: int = 100_000, repeat: int = 5) -> TracingReport:
+    def work() -> None:
+        return None
+
+    exporter = _CountingExporter()
+    # Never sampled, and sampled, whatever the trace key.
+    unsampled_tracer = Tracer(_CountingExporter(), sample_rate=0.0)
+    sampled_tracer = Tracer(exporter, sample_rate=1.0, flush_interval=0.1, max_buffer=calls * repeat + 1)
+    report = TracingReport(calls=calls)
+    try:
+        report.ns_per_call["bare"] = _time_calls(work, calls, repeat)
+        report.ns_per_call["disabled"] = _time_calls(trace_function(work, None, "work"), calls, repeat)
+        # Agent-level spans, below the root span of a run.
+        for mode, tracer in (("unsampled", unsampled_tracer), ("sampled", sampled_tracer)):
+            traced = trace_function(work, tracer, "work", tags=["benchmark"])
+            with tracer.span("run", trace_name="benchmark"):
+                report.ns_per_call[mode] = _time_calls(traced, calls, repeat)
+    finally:
+        unsampled_tracer.shutdown()
+        sampled_tracer.shutdown()
+    report.exported = exporter.spans
+    report.dropped = sampled_tracer.stats.dropped
+    return report
+
+
+def format_report(report: TracingReport) -> str:
+    data = report.to_dict()
+    lines = [f"{report.calls} calls per loop, best of the loops"]
+    for mode in MODES:
+        overhead = data["overhead_ns"].get(mode)
+        suffix = "" if overhead is None else f" (+{overhead:.1f} ns)"
+        lines.append(f"{mode:<10} {data['ns_per_call'][mode]:>10.1f} ns/call{suffix}")
+    lines.append(f"spans exported: {data['exported']}, dropped: {data['dropped']}")
+    return "\n".join(lines)
@@ -6,8 +6,10 @@ from pathlib import Path
 import click
 import dotenv
 
+from macosagent.artifacts import LEVELS, configure_artifacts
 from macosagent.llm.tracing import trace_with_metadata
-from macosagent.macosagent import create_agent
+from macosagent.metrics import get_metrics, metric_context
+from macosagent.profiling import start_profiling, stop_profiling
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +49,19 @@ def common_options(f):
         help="Set the logging level",
     )(f)
     f = click.option("--log-dir", default="logs")(f)
+    f = click.option("--metrics-dir", default=None, help="Directory for the Prometheus metrics file and per-run JSON summaries (default: <log-dir>/metrics)")(f)
     f = click.option("--run-id", default=str(uuid.uuid4()))(f)
+    f = click.option("--log-artifacts", type=click.Choice(LEVELS), default=None, help="Conversation, screenshot and accessibility tree logs of the app agents: none, light (conversations only) or full (default: $MACOSAGENT_LOG_ARTIFACTS or full)")(f)
     return f
 
 
+def resolve_metrics_dir(log_dir: str | None, metrics_dir: str | None) -> Path:
+    """Directory metrics are exported to, ``<log_dir>/metrics`` unless given."""
+    if metrics_dir:
+        return Path(metrics_dir)
+    return Path(log_dir or "logs") / "metrics"
+
+
 @click.group()
 def cli():
     dotenv.load_dotenv()
@@ -59,20 +70,41 @@ def cli():
 @cli.command("run")
 @common_options
 @click.option("--task", required=True, help="The task to run")
+@click.option("--profile", is_flag=True, help="Time the phases of the app agent steps and write a JSON timeline and collapsed stacks to <log-dir>/profiles/<run-id>")
+@click.option("--profile-sample-ms", default=0.0, show_default=True, help="Also sample the Python stacks of all threads every this many milliseconds (0: off)")
 def start(
     log_level,
     log_dir,
+    metrics_dir,
     run_id,
+    log_artifacts,
     task,
+    profile,
+    profile_sample_ms,
 ):
     setup_logging(log_level, log_dir)
+    configure_artifacts(log_artifacts)
+    if profile:
+        start_profiling(profile_sample_ms / 1000)
     logger.info(f"Starting MacOS Agent {run_id}; {task}")
     @trace_with_metadata(custom_id=run_id, name="macosagent")
     def run_agent(task):
+        from macosagent.macosagent import create_agent
+
         agent = create_agent()
         result = agent.run(task)
         logger.info(f"MacOS Agent {run_id} finished with result: {result}")
-    run_agent(task)
+    with metric_context(run_id=run_id):
+        try:
+            run_agent(task)
+        finally:
+            try:
+                get_metrics().export(resolve_metrics_dir(log_dir, metrics_dir), run_id)
+            finally:
+                profiler = stop_profiling()
+                if profiler is not None:
+                    paths = profiler.write(Path(log_dir or "logs") / "profiles" / run_id)
+                    logger.info(f"Profile of {run_id} ({profiler.format()}) written to {paths['timeline'].parent}")
 
 
 @cli.command("execute")
@@ -82,18 +114,242 @@ def execute(
     file_path,
     log_level,
     log_dir,
+    metrics_dir,
     run_id,
+    log_artifacts,
 ):
     """Execute tasks from a file."""
     setup_logging(log_level, log_dir)
+    configure_artifacts(log_artifacts)
     logger.info(f"Starting MacOS Agent {run_id} with file: {file_path}")
     with open(file_path) as f:
         json_data = json.load(f)
     task = json_data["task"]
     @trace_with_metadata(custom_id=run_id, name="macosagent")
     def run_agent(task):
+        from macosagent.macosagent import create_agent
+
         agent = create_agent()
         result = agent.run(task)
         logger.info(f"MacOS Agent {run_id} finished with result: {result}")
-    run_agent(task)
+    with metric_context(run_id=run_id):
+        try:
+            run_agent(task)
+        finally:
+            get_metrics().export(resolve_metrics_dir(log_dir, metrics_dir), run_id)
+
+
+
+@cli.command("execute-batch")
+@common_options
+@click.argument("source", type=click.Path(exists=True))
+@click.option("--concurrency", default=4, show_default=True, help="Number of non-GUI tasks to run in parallel")
+@click.option("--results", "results_path", default="results/batch_results.jsonl", show_default=True, help="Append-only JSONL file for results; completed tasks in it are skipped")
+def execute_batch(
+    source,
+    log_level,
+    log_dir,
+    metrics_dir,
+    run_id,
+    log_artifacts,
+    concurrency,
+    results_path,
+):
+    """Execute a directory of task files or a JSONL file of tasks.
+
+    A task drives the desktop and runs one at a time unless its entry sets
+    "gui": false or lists only non-GUI app agents in "agents"; other tasks run
+    concurrently.
+    """
+    from macosagent.batch import BatchRunner, format_summary, load_tasks
+
+    setup_logging(log_level, log_dir)
+    configure_artifacts(log_artifacts)
+    tasks = load_tasks(source)
+    logger.info(f"Starting MacOS Agent batch {run_id} with {len(tasks)} tasks from {source}")
+    runner = BatchRunner(results_path, concurrency=concurrency, metrics_dir=resolve_metrics_dir(log_dir, metrics_dir))
+    summary = runner.run(tasks)
+    click.echo(format_summary(summary))
+
+
+@cli.group("bench")
+def bench():
+    """Benchmarks for the agent runtime."""
+
+
+@bench.command("startup")
+@click.option("--repeat", default=3, show_default=True, help="Number of cold starts to time")
+@click.option("--top", default=15, show_default=True, help="Number of packages in the import breakdown")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+def bench_startup(repeat, top, as_json):
+    """Report cold-start time and import-time breakdown for `macosagent run`."""
+    from macosagent.benchmarks.startup import format_report, run_startup_benchmark
+
+    report = run_startup_benchmark(repeat=repeat)
+    if as_json:
+        click.echo(json.dumps(report.to_dict(top=top), indent=2))
+    else:
+        click.echo(format_report(report, top=top))
+
+
+@bench.command("tracing")
+@click.option("--calls", default=100_000, show_default=True, help="Calls per timed loop")
+@click.option("--repeat", default=5, show_default=True, help="Number of timed loops per mode; the best is reported")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+def bench_tracing(calls, repeat, as_json):
+    """Report the per-call overhead of traced functions, with tracing disabled, unsampled and sampled."""
+    from macosagent.benchmarks.tracing import format_report, run_tracing_benchmark
+
+    report = run_tracing_benchmark(calls=calls, repeat=repeat)
+    if as_json:
+        click.echo(json.dumps(report.to_dict(), indent=2))
+    else:
+        click.echo(format_report(report))
+
+
+@bench.command("step-models")
+@click.option("--agent", default="excel_agent", show_default=True, help="Registry key of the app agent")
+@click.option("--steps", default=20, show_default=True, help="Steps per timed run")
+@click.option("--repeat", default=3, show_default=True, help="Number of timed runs; the best is reported")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+def bench_step_models(agent, steps, repeat, as_json):
+    """Report the per-step cost of the action and output models of an app agent, rebuilt and cached."""
+    from macosagent.benchmarks.step_models import REACT_AGENTS, format_report, run_step_models_benchmark
+
+    if agent not in REACT_AGENTS:
+        raise click.BadParameter(f"Choose one of {', '.join(REACT_AGENTS)}", param_hint="--agent")
+    report = run_step_models_benchmark(agent=agent, steps=steps, repeat=repeat)
+    if as_json:
+        click.echo(json.dumps(report.to_dict(), indent=2))
+    else:
+        click.echo(format_report(report))
+
+
+def stub_options(f):
+    """Options of the offline stub LLM server."""
+    f = click.option("--seed", default=None, type=int, help="Random seed of latencies and injected errors")(f)
+    f = click.option("--error-status", default=429, show_default=True, help="HTTP status of injected errors")(f)
+    f = click.option("--error-rate", default=0.0, show_default=True, help="Share of requests failing with --error-status")(f)
+    f = click.option("--chunks", default=8, show_default=True, help="Number of chunks of streamed responses")(f)
+    f = click.option("--chunk-delay", default=0.0, show_default=True, help="Seconds between streamed chunks")(f)
+    f = click.option("--latency", default="fixed:0.5", show_default=True, help="Model latency: fixed:s, uniform:low:high, normal:mean:std or lognormal:mu:sigma")(f)
+    f = click.option("--steps", default=5, show_default=True, help="Steps app agents take with the default script")(f)
+    f = click.option("--script", "script_path", default=None, type=click.Path(exists=True), help="JSON script with agent_outputs, code and text responses")(f)
+    return f
+
+
+def _create_stub(script_path, steps, latency, chunk_delay, chunks, error_rate, error_status, seed):
+    from macosagent.benchmarks.stub_server import LatencyModel, StubLLM, default_script, load_script
+
+    try:
+        latency_model = LatencyModel.parse(latency)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--latency")
+    return StubLLM(
+        script=load_script(script_path) if script_path else default_script(steps),
+        latency=latency_model,
+        chunk_delay=chunk_delay,
+        chunks=chunks,
+        error_rate=error_rate,
+        error_status=error_status,
+        seed=seed,
+    )
+
+
+@bench.command("stub-server")
+@stub_options
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+def bench_stub_server(host, port, **stub_kwargs):
+    """Serve scripted OpenAI-compatible chat completions, e.g. for load tests without a provider."""
+    from macosagent.benchmarks.stub_server import StubServer, client_environment
+
+    with StubServer(_create_stub(**stub_kwargs), host=host, port=port) as server:
+        click.echo(f"Stub LLM server on {server.base_url}; point the agent at it with:")
+        for key, value in client_environment(server.base_url).items():
+            click.echo(f"  {key}={value}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+@bench.command("overhead")
+@stub_options
+@click.option("--agent", default="orchestrator", show_default=True, help="Registry key of the app agent to run, or 'orchestrator'")
+@click.option("--task", default="Benchmark task", show_default=True, help="Task given to the agent")
+@click.option("--repeat", default=3, show_default=True, help="Number of measured runs")
+@click.option("--warmup", default=1, show_default=True, help="Number of unmeasured runs first")
+@click.option("--stream", is_flag=True, help="Stream actions (MACOSAGENT_STREAM_ACTIONS)")
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+def bench_overhead(agent, task, repeat, warmup, stream, as_json, **stub_kwargs):
+    """Run an agent against the stub LLM server and report its non-LLM overhead per step."""
+    from macosagent.agents.registry import get_agent_spec
+    from macosagent.benchmarks.overhead import format_report, run_overhead_benchmark
+
+    if agent != "orchestrator" and get_agent_spec(agent) is None:
+        raise click.BadParameter(f"Unknown agent '{agent}'", param_hint="--agent")
+    if agent != "orchestrator":
+        agent = get_agent_spec(agent).key
+    stub = _create_stub(**stub_kwargs)
+    report = run_overhead_benchmark(agent, task, stub, repeat=repeat, warmup=warmup, stream=stream)
+    if as_json:
+        click.echo(json.dumps(report.to_dict(), indent=2))
+    else:
+        click.echo(format_report(report))
+    if report.error:
+        raise SystemExit(1)
+
+
+@cli.command("serve")
+@common_options
+@click.option("--socket", "socket_path", default=None, help="Unix socket to listen on (default: $MACOSAGENT_SOCKET or /tmp/macosagent.sock)")
+@click.option("--preload", is_flag=True, help="Load every app agent at startup instead of on first use")
+def serve(
+    log_level,
+    log_dir,
+    metrics_dir,
+    run_id,
+    log_artifacts,
+    socket_path,
+    preload,
+):
+    """Run a long-lived daemon that keeps agents warm and accepts tasks over a socket."""
+    from macosagent.server import DEFAULT_SOCKET_PATH
+    from macosagent.server import serve as serve_forever
+
+    setup_logging(log_level, log_dir)
+    configure_artifacts(log_artifacts)
+    serve_forever(
+        socket_path or DEFAULT_SOCKET_PATH,
+        preload=preload,
+        metrics_dir=str(resolve_metrics_dir(log_dir, metrics_dir)),
+    )
+
+
+@cli.command("submit")
+@click.argument("file_path", type=click.Path(exists=True), required=False)
+@click.option("--task", default=None, help="The task to run, instead of a task file")
+@click.option("--socket", "socket_path", default=None, help="Unix socket of the daemon (default: $MACOSAGENT_SOCKET or /tmp/macosagent.sock)")
+@click.option("--status", is_flag=True, help="Print the daemon status instead of submitting a task")
+def submit(file_path, task, socket_path, status):
+    """Submit a task file (same schema as `execute`) to a running `serve` daemon."""
+    from macosagent.server import DEFAULT_SOCKET_PATH
+    from macosagent.server import submit as submit_request
+
+    if status:
+        request = {"command": "status"}
+    elif file_path:
+        with open(file_path) as f:
+            request = json.load(f)
+    elif task:
+        request = {"task": task}
+    else:
+        raise click.UsageError("Provide a task file, --task or --status")
 
+    failed = False
+    for event in submit_request(request, socket_path or DEFAULT_SOCKET_PATH):
+        click.echo(json.dumps(event, ensure_ascii=False))
+        failed = failed or event.get("event") == "error"
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,186 @@
+"""Wall-clock deadlines of app agent runs and of the phases of their steps.
+
+A run of an app agent used to be bounded by its number of iterations only, so
+one hung ``osascript``, ``screencapture`` or LLM call blocked its worker
+forever. Now:
+
+* ``MACOSAGENT_RUN_TIMEOUT`` (seconds, default 0 = no limit) bounds a whole
+  run; when it fires, the run stops after the current step and the final
+  answer is produced from the partial history;
+* ``MACOSAGENT_TIMEOUT_CAPTURE``, ``MACOSAGENT_TIMEOUT_LLM`` and
+  ``MACOSAGENT_TIMEOUT_ACTION`` bound the state capture, the LLM call and each
+  action of a step (0 = no limit, but still within the run deadline).
+
+Every setting can be overridden for one agent with an ``_<AGENT>`` suffix,
+e.g. ``MACOSAGENT_TIMEOUT_ACTION_WORD_AGENT``.
+
+Deadlines are scoped with :func:`deadline_scope` and travel with the context
+variables to the worker threads of a step. A thread cannot be interrupted, so
+the blocking calls that may hang check them instead: subprocesses are started
+with :func:`run_command`, which kills the process once the deadline of the
+calling scope passes or the scope is cancelled, and raises
+:class:`PhaseTimeout`.
+"""
+
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("capture", "llm", "action")
+DEFAULT_PHASE_TIMEOUTS = {"capture": 60.0, "llm": 300.0, "action": 300.0}
+# How often a running subprocess checks for cancellation.
+POLL_INTERVAL = 0.05
+
+
+class PhaseTimeout(TimeoutError):
+    """A phase of a step, or a whole run, went past its deadline."""
+
+    def __init__(self, phase: str, seconds: float | None):
+        self.phase = phase
+        self.seconds = seconds
+        limit = f" after {seconds:g}s" if seconds is not None else ""
+        super().__init__(f"{phase} timed out{limit}")
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"phase": self.phase, "seconds": self.seconds}
+
+
+def find_timeout(error: BaseException | None) -> PhaseTimeout | None:
+    """The :class:`PhaseTimeout` that caused ``error``, e.g. wrapped by an action registry."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, PhaseTimeout):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class Deadline:
+    """Point in time (``time.monotonic()``) a scope must end by, and its cancellation flag.
+
+    ``phase`` names whose limit the deadline is: the scope's own or, when its
+    parent ends first, the parent's.
+    """
+
+    def __init__(self, phase: str, at: float | None, seconds: float | None, parent: "Deadline | None" = None):
+        self.phase = phase
+        self.at = at
+        self.seconds = seconds
+        self.parent = parent
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float | None:
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled())
+
+    def expired(self) -> bool:
+        return self.cancelled() or (self.at is not None and time.monotonic() >= self.at)
+
+    def timeout(self) -> PhaseTimeout:
+        return PhaseTimeout(self.phase, self.seconds)
+
+
+_deadline: ContextVar[Deadline | None] = ContextVar("macosagent_deadline", default=None)
+
+
+def current_deadline() -> Deadline | None:
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_scope(phase: str, seconds: float | None) -> Iterator[Deadline]:
+    """Bound the enclosed block to ``seconds`` (None or 0: no limit of its own) within the current deadline."""
+    parent = _deadline.get()
+    at = time.monotonic() + seconds if seconds else None
+    if parent is not None and parent.at is not None and (at is None or parent.at <= at):
+        deadline = Deadline(parent.phase, parent.at, parent.seconds, parent)
+    else:
+        deadline = Deadline(phase, at, seconds or None, parent)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def _setting(name: str, agent: str | None) -> str | None:
+    value = os.getenv(name)
+    if agent:
+        value = os.getenv(f"{name}_{agent.upper()}", value)
+    return value
+
+
+def _seconds(name: str, agent: str | None, default: float) -> float | None:
+    value = _setting(name, agent)
+    try:
+        seconds = float(value) if value not in (None, "") else default
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        seconds = default
+    return seconds if seconds > 0 else None
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    """Run and phase time limits of one agent, in seconds (None: no limit)."""
+
+    run: float | None = None
+    capture: float | None = DEFAULT_PHASE_TIMEOUTS["capture"]
+    llm: float | None = DEFAULT_PHASE_TIMEOUTS["llm"]
+    action: float | None = DEFAULT_PHASE_TIMEOUTS["action"]
+
+    @classmethod
+    def from_env(cls, agent: str | None = None) -> "Timeouts":
+        return cls(
+            run=_seconds("MACOSAGENT_RUN_TIMEOUT", agent, 0),
+            **{phase: _seconds(f"MACOSAGENT_TIMEOUT_{phase.upper()}", agent, DEFAULT_PHASE_TIMEOUTS[phase]) for phase in PHASES},
+        )
+
+
+def run_command(
+    args: Sequence[str] | str,
+    check: bool = False,
+    capture_output: bool = False,
+    timeout: float | None = None,
+    **kwargs: Any,
+) -> subprocess.CompletedProcess:
+    """Drop-in for :func:`subprocess.run` that kills the process when the current deadline passes.
+
+    Raises:
+        PhaseTimeout: The deadline of the calling scope (or ``timeout``) passed,
+            or the scope was cancelled; the process has been killed.
+    """
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with deadline_scope("subprocess", timeout) as deadline:
+        process = subprocess.Popen(args, **kwargs)
+        while True:
+            remaining = deadline.remaining()
+            try:
+                stdout, stderr = process.communicate(timeout=POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+                break
+            except subprocess.TimeoutExpired:
+                if deadline.expired():
+                    process.kill()
+                    process.communicate()
+                    logger.warning(f"Killed {args if isinstance(args, str) else args[0]!r}: {deadline.timeout()}")
+                    raise deadline.timeout() from None
+    completed = subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+    if check:
+        completed.check_returncode()
+    return completed
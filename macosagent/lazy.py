@@ -0,0 +1,58 @@
+"""Deferred imports for heavy third-party modules.
+
+Modules that are only needed inside a few actions (document converters, video
+tooling, spreadsheet engines) are bound to a :class:`LazyModule` proxy at import
+time and really imported on first attribute access, so a run only pays for the
+modules its sub-agents actually touch.
+"""
+
+import importlib
+import sys
+import threading
+from types import ModuleType
+from typing import Any
+
+_lock = threading.RLock()
+
+
+class LazyModule(ModuleType):
+    """Module proxy that imports ``name`` on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return a proxy for module ``name``; it is imported on first use.
+
+    Args:
+        name: Absolute module name, e.g. ``"pdf2docx"`` or ``"moviepy.editor"``.
+
+    Returns:
+        ModuleType: The module itself if it is already imported, a lazy proxy otherwise.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -1,8 +1,13 @@
 from macosagent.llm.llm import AzureOpenAIServerModelImpl as AzureOpenAIServerModel
 from macosagent.llm.llm import (
+    LLMClientPool,
     LLMEngine,
+    configured_tiers,
     create_langchain_llm_client,
+    create_llm_engine,
     create_smol_llm_client,
+    get_llm_pool,
+    warm_up_llm_connections,
 )
 from macosagent.llm.llm import OpenAIServerModelImpl as OpenAIServerModel
 from macosagent.llm.tracing import trace_with_metadata
@@ -10,8 +15,13 @@ from macosagent.llm.tracing import trace_with_metadata
 __all__ = [
     "AzureOpenAIServerModel",
     "OpenAIServerModel",
+    "configured_tiers",
     "create_langchain_llm_client",
+    "create_llm_engine",
     "LLMEngine",
     "create_smol_llm_client",
-    "trace_with_metadata"
+    "get_llm_pool",
+    "LLMClientPool",
+    "trace_with_metadata",
+    "warm_up_llm_connections",
 ]
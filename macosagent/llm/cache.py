@@ -0,0 +1,284 @@
+"""On-disk record/replay cache for LLM requests.
+
+The cache sits in the HTTP transport shared by every LLM client of the process
+(see :class:`macosagent.llm.llm.LLMClientPool`), so it covers the orchestrator,
+``get_next_action``, ``provide_final_answer`` and ``computer_use`` calls alike.
+Requests are keyed on their normalized JSON body: images embedded as data URLs
+are replaced by a digest of their content and volatile lines such as
+``Current date and time: ...`` are masked, so re-running a task against the
+same screens produces the same keys.
+
+``MACOSAGENT_LLM_CACHE`` selects the mode:
+
+* ``off`` (default): no cache;
+* ``record``: serve hits from the cache, send misses to the server and store
+  their responses;
+* ``replay``: serve from the cache only, so the full agent loop runs offline;
+  a miss fails the LLM call with a (not retried) 404 error naming the key;
+* ``passthrough``: send every request to the server and store nothing, but
+  count would-be hits, to measure the hit rate of a suite before recording it.
+"""
+
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "record", "replay", "passthrough")
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "macosagent", "llm")
+
+# Lines of the prompts that change between otherwise identical runs.
+VOLATILE_PATTERNS = [
+    re.compile(r"(Current date and time:)[^\n]*"),
+]
+# Only responses of these endpoints are cached.
+CACHEABLE_PATHS = ("/chat/completions", "/completions", "/responses")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        if value.startswith("data:") and ";base64," in value:
+            media_type = value[5:value.index(";")]
+            return f"{media_type}:sha256:{hashlib.sha256(value.encode()).hexdigest()}"
+        for pattern in VOLATILE_PATTERNS:
+            value = pattern.sub(r"\1 <masked>", value)
+    return value
+
+
+def request_key(path: str, body: bytes) -> str | None:
+    """Cache key of a request, or ``None`` if the request is not cacheable."""
+    if not path.endswith(CACHEABLE_PATHS):
+        return None
+    try:
+        payload = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    normalized = json.dumps(_normalize(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{path}\n{normalized}".encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """Responses stored as one JSON file per key, evicted least recently used first."""
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_CACHE_DIR,
+        mode: str = "record",
+        max_bytes: int = 512 * 1024 * 1024,
+        max_entries: int = 100_000,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid LLM cache mode '{mode}'. Use one of: {', '.join(CACHE_MODES)}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first.
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        entries = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in entries:
+            size = path.stat().st_size
+            self._index[path.stem] = size
+            self._size += size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            if key not in self._index:
+                self.stats.misses += 1
+                return None
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._size -= self._index.pop(key)
+                self.stats.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.stats.hits += 1
+        # Persist the recency for the next process.
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: dict[str, Any]) -> None:
+        data = json.dumps(entry, ensure_ascii=False)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        with self._lock:
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self.stats.stores += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._index and (self._size > self.max_bytes or len(self._index) > self.max_entries):
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.stats.evictions += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def info(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "directory": str(self.directory),
+                "entries": len(self._index),
+                "bytes": self._size,
+                **self.stats.to_dict(),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._index:
+                self._path(key).unlink(missing_ok=True)
+            self._index.clear()
+            self._size = 0
+
+
+def _to_entry(response: httpx.Response, path: str) -> dict[str, Any]:
+    return {
+        "path": path,
+        "status_code": response.status_code,
+        "content_type": response.headers.get("content-type", "application/json"),
+        "body": base64.b64encode(response.content).decode("ascii"),
+        "recorded_at": time.time(),
+    }
+
+
+def _from_entry(entry: dict[str, Any], request: httpx.Request, cache_status: str) -> httpx.Response:
+    return httpx.Response(
+        entry["status_code"],
+        headers={"content-type": entry["content_type"], "x-macosagent-cache": cache_status},
+        content=base64.b64decode(entry["body"]),
+        request=request,
+    )
+
+
+class CachingTransport(httpx.BaseTransport):
+    """HTTP transport serving LLM requests from an :class:`LLMResponseCache`."""
+
+    def __init__(self, transport: httpx.BaseTransport, cache: LLMResponseCache):
+        self.transport = transport
+        self.cache = cache
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return self.transport.handle_request(request)
+        path = request.url.path
+        key = request_key(path, request.read())
+        if key is None:
+            return self.transport.handle_request(request)
+
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.mode != "passthrough":
+            return _from_entry(entry, request, "hit")
+        if self.cache.mode == "replay":
+            message = f"No recorded LLM response for {path} (key {key}) in {self.cache.directory}"
+            logger.error(message)
+            return httpx.Response(
+                404,
+                headers={"x-should-retry": "false", "x-macosagent-cache": "miss"},
+                json={"error": {"message": message, "type": "cache_miss"}},
+                request=request,
+            )
+
+        response = self.transport.handle_request(request)
+        if self.cache.mode == "passthrough" or response.status_code != 200:
+            return response
+        # Read the whole body so it can be stored; streamed responses are replayed in one go.
+        try:
+            response.read()
+        finally:
+            response.close()
+        entry = _to_entry(response, path)
+        self.cache.put(key, entry)
+        return _from_entry(entry, request, "miss")
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+_cache: LLMResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def _log_stats(cache: LLMResponseCache) -> None:
+    stats = cache.stats
+    if stats.hits or stats.misses:
+        logger.info(
+            f"LLM cache ({cache.mode}): {stats.hits} hits, {stats.misses} misses "
+            f"({stats.hit_rate:.0%} hit rate), {stats.stores} stored, {stats.evictions} evicted"
+        )
+
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """Return the cache configured by ``MACOSAGENT_LLM_CACHE*``, or ``None`` when it is off."""
+    global _cache
+    mode = os.getenv("MACOSAGENT_LLM_CACHE", "off").lower()
+    if mode == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                directory=os.path.expanduser(os.getenv("MACOSAGENT_LLM_CACHE_DIR", DEFAULT_CACHE_DIR)),
+                mode=mode,
+                max_bytes=int(float(os.getenv("MACOSAGENT_LLM_CACHE_MAX_MB", "512")) * 1024 * 1024),
+                max_entries=int(os.getenv("MACOSAGENT_LLM_CACHE_MAX_ENTRIES", "100000")),
+            )
+            atexit.register(_log_stats, _cache)
+        return _cache
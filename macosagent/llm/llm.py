@@ -1,99 +1,373 @@
 from __future__ import annotations
 
+import importlib.util
 import logging
 import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeVar
 
-from langchain_core.messages import (
-    AIMessage,
-    HumanMessage,
-    SystemMessage,
-    ToolMessage,
-)
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
 from smolagents import AzureOpenAIServerModel, OpenAIServerModel
-from transformers.agents.llm_engine import HfEngine
 
-from macosagent.llm.tracing import openai
+from macosagent.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
 logger = logging.getLogger(__name__)
 
+openai = lazy_import("openai")
+
+# Model tiers declared by the call sites: "fast" for text-only summaries and final answers,
+# "vision" for screenshot-driven steps and computer_use, "planner" for CodeAgent planning.
+# MACOSAGENT_LLM_TIER_<TIER> names the model (Azure deployment) of a tier on the configured
+# provider; a tier without a model uses the first configured tier of its fallback chain, and
+# "default" is the provider's own model setting (MODEL, OPENAI_MODEL or AZURE_MODEL).
+TIER_FALLBACKS: dict[str, tuple[str, ...]] = {
+    "default": (),
+    "fast": ("default",),
+    "vision": ("default",),
+    "planner": ("vision", "default"),
+}
+
+T = TypeVar("T")
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    ttfb_total: float = 0.0
+    ttfb_max: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": self.reused_connections / self.requests if self.requests else 0.0,
+            "ttfb_mean": self.ttfb_total / self.requests if self.requests else 0.0,
+            "ttfb_max": self.ttfb_max,
+        }
+
+
+class _RequestTrace:
+    """httpcore ``trace`` callback recording connection reuse and time to first byte of one request."""
+
+    def __init__(self, pool: LLMClientPool):
+        self.pool = pool
+        self.connected = False
+        self.sent_at: float | None = None
+
+    def __call__(self, event_name: str, info: dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.connected = True
+        elif event_name.endswith(".send_request_headers.started"):
+            self.sent_at = time.perf_counter()
+        elif event_name.endswith(".receive_response_headers.complete") and self.sent_at is not None:
+            self.pool.record(reused=not self.connected, ttfb=time.perf_counter() - self.sent_at)
+
+
+class LLMClientPool:
+    """Process-wide LLM clients sharing one keep-alive HTTP connection pool.
+
+    Clients are built once per provider/model and reused by every agent, so
+    sub-agent calls skip the TCP/TLS handshake. ``max_connections`` caps the
+    number of concurrent requests to the LLM servers; further requests wait for
+    a free connection.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        keepalive_expiry: float = 120.0,
+        http2: bool = False,
+    ):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("MACOSAGENT_LLM_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.stats = ConnectionStats()
+        self._lock = threading.Lock()
+        self._clients: dict[tuple, Any] = {}
+        self._http_client: httpx.Client | None = None
+        self._warmed_up: set[str] = set()
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                import httpx
+
+                from macosagent.llm.cache import CachingTransport, get_llm_cache
+                from macosagent.llm.metering import MeteredTransport
+                from macosagent.llm.ratelimit import RateLimitedTransport, get_rate_limiter
+
+                transport: httpx.BaseTransport = httpx.HTTPTransport(
+                    http2=self.http2,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                )
+                # Cache hits are served before metering and rate limiting: they use no quota and are not counted.
+                transport = RateLimitedTransport(transport, get_rate_limiter(self.max_connections))
+                transport = MeteredTransport(transport)
+                cache = get_llm_cache()
+                if cache is not None:
+                    transport = CachingTransport(transport, cache)
+                self._http_client = httpx.Client(
+                    transport=transport,
+                    timeout=httpx.Timeout(600.0, connect=10.0),
+                    follow_redirects=True,
+                    event_hooks={"request": [self._attach_trace]},
+                )
+            return self._http_client
+
+    def _attach_trace(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = _RequestTrace(self)
+
+    def record(self, reused: bool, ttfb: float) -> None:
+        with self._lock:
+            self.stats.requests += 1
+            if reused:
+                self.stats.reused_connections += 1
+            else:
+                self.stats.new_connections += 1
+            self.stats.ttfb_total += ttfb
+            self.stats.ttfb_max = max(self.stats.ttfb_max, ttfb)
+
+    def get(self, key: tuple, factory: Callable[[httpx.Client], T]) -> T:
+        """Return the client cached under ``key``, building it with ``factory(http_client)`` on first use."""
+        http_client = self.http_client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory(http_client)
+                self._clients[key] = client
+            return client
+
+    def warm_up(self, urls: list[str]) -> None:
+        """Open a connection to each server ahead of the first LLM call."""
+        for url in urls:
+            with self._lock:
+                if url in self._warmed_up:
+                    continue
+                self._warmed_up.add(url)
+            start_time = time.perf_counter()
+            try:
+                self.http_client.head(url)
+            except Exception as e:  # noqa: BLE001
+                logger.debug(f"Warm-up of {url} failed: {e}")
+                continue
+            logger.debug(f"Warmed up connection to {url} in {time.perf_counter() - start_time:.2f}s")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            self._clients.clear()
+
+
+_pool: LLMClientPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """Return the process-wide LLM client pool configured by ``MACOSAGENT_LLM_*``, creating it on first use.
+
+    The settings are read here rather than at import time, so values loaded from
+    ``.env`` by the CLI apply.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMClientPool(
+                max_connections=int(os.getenv("MACOSAGENT_LLM_MAX_CONNECTIONS", "8")),
+                keepalive_expiry=float(os.getenv("MACOSAGENT_LLM_KEEPALIVE_EXPIRY", "120")),
+                http2=os.getenv("MACOSAGENT_LLM_HTTP2", "false").lower() == "true",
+            )
+        return _pool
+
+
+def _configured_endpoints() -> list[str]:
+    endpoints = []
+    if (os.environ.get("API_SERVER_TYPE") or "").lower() == "azure":
+        endpoints.append(os.environ.get("AZURE_ENDPOINT"))
+    else:
+        endpoints.append(os.environ.get("API_BASE"))
+        endpoints.append(os.environ.get("OPENAI_ENDPOINT") or "https://api.openai.com/v1")
+    return list(dict.fromkeys(endpoint for endpoint in endpoints if endpoint))
+
+
+def warm_up_llm_connections(background: bool = True) -> None:
+    """Open connections to the configured LLM servers, in a background thread by default.
+
+    Does nothing when ``MACOSAGENT_LLM_WARMUP`` is false or when replaying recorded responses.
+    """
+    if os.getenv("MACOSAGENT_LLM_WARMUP", "true").lower() != "true" or os.getenv("MACOSAGENT_LLM_CACHE", "off").lower() == "replay":
+        return
+    pool = get_llm_pool()
+    endpoints = _configured_endpoints()
+    if background:
+        threading.Thread(target=pool.warm_up, args=(endpoints,), name="macosagent-llm-warmup", daemon=True).start()
+    else:
+        pool.warm_up(endpoints)
+
+
+def resolve_tier_model(tier: str, default_model: str | None) -> str | None:
+    """Model serving ``tier``, following its fallback chain down to ``default_model``."""
+    if tier not in TIER_FALLBACKS:
+        raise ValueError(f"Unknown LLM tier '{tier}'. Use one of: {', '.join(TIER_FALLBACKS)}")
+    for candidate in (tier, *TIER_FALLBACKS[tier]):
+        if candidate == "default":
+            break
+        model = os.getenv(f"MACOSAGENT_LLM_TIER_{candidate.upper()}")
+        if model:
+            return model
+    return default_model
+
+
+def configured_tiers() -> dict[str, str | None]:
+    """Model of every tier for the configured provider, for status reports."""
+    provider = (os.environ.get("API_SERVER_TYPE") or "").lower()
+    default_model = os.environ.get("AZURE_MODEL" if provider == "azure" else "OPENAI_MODEL") or os.environ.get("MODEL")
+    return {tier: resolve_tier_model(tier, default_model) for tier in TIER_FALLBACKS}
+
+
 class AzureOpenAIServerModelImpl(AzureOpenAIServerModel):
-    """Azure OpenAI Server Model with Langfuse integration."""
+    """Azure OpenAI server model building its client from the lazily imported OpenAI SDK.
+
+    Calls are traced by :mod:`macosagent.llm.tracing`, not by the model.
+    """
 
     def create_client(self):
         return openai.AzureOpenAI(**self.client_kwargs)
 
 
 class OpenAIServerModelImpl(OpenAIServerModel):
-    """OpenAI Server Model with Langfuse integration."""
+    """OpenAI server model building its client from the lazily imported OpenAI SDK.
+
+    Calls are traced by :mod:`macosagent.llm.tracing`, not by the model.
+    """
 
     def create_client(self):
         return openai.OpenAI(**self.client_kwargs)
 
 
-def create_smol_llm_client() -> AzureOpenAIServerModel | OpenAIServerModel:
+def create_smol_llm_client(tier: str = "default") -> AzureOpenAIServerModel | OpenAIServerModel:
     """
     Create a Smol agent client for either OpenAI or Azure OpenAI.
+
+    The client is shared by the whole process, see :class:`LLMClientPool`.
+
+    Args:
+        tier: Model tier of the call site, see ``TIER_FALLBACKS``.
     """
+    pool = get_llm_pool()
     if os.environ.get("API_SERVER_TYPE") == "AZURE":
-        llm_engine = AzureOpenAIServerModelImpl(
-            model_id=os.environ.get("AZURE_MODEL"),
-            azure_endpoint=os.environ.get("AZURE_ENDPOINT"),
-            api_key=os.environ.get("AZURE_API_KEY"),
-            api_version=os.environ.get("AZURE_API_VERSION"),
+        model_id = resolve_tier_model(tier, os.environ.get("AZURE_MODEL"))
+        endpoint = os.environ.get("AZURE_ENDPOINT")
+        return pool.get(
+            ("smol", "azure", model_id, endpoint),
+            lambda http_client: AzureOpenAIServerModelImpl(
+                model_id=model_id,
+                azure_endpoint=endpoint,
+                api_key=os.environ.get("AZURE_API_KEY"),
+                api_version=os.environ.get("AZURE_API_VERSION"),
+                # Retries are done by the shared rate limiter, see macosagent.llm.ratelimit.
+                client_kwargs={"http_client": http_client, "max_retries": 0},
+            ),
         )
     elif os.environ.get("API_SERVER_TYPE") == "OPENAI":
-        llm_engine = OpenAIServerModelImpl(
-            model_id=os.environ.get("MODEL"),
-            api_base=os.environ.get("API_BASE"),
-            api_key=os.environ.get("API_KEY"),
+        model_id = resolve_tier_model(tier, os.environ.get("MODEL"))
+        api_base = os.environ.get("API_BASE")
+        return pool.get(
+            ("smol", "openai", model_id, api_base),
+            lambda http_client: OpenAIServerModelImpl(
+                model_id=model_id,
+                api_base=api_base,
+                api_key=os.environ.get("API_KEY"),
+                # Retries are done by the shared rate limiter, see macosagent.llm.ratelimit.
+                client_kwargs={"http_client": http_client, "max_retries": 0},
+            ),
         )
     else:
         raise ValueError(
             "Invalid API server type. Please check your .env file and ensure "
             "API_SERVER_TYPE is set to either 'AZURE' or 'OPENAI'."
         )
-    return llm_engine
 
 
-def create_langchain_llm_client() -> AzureChatOpenAI | ChatOpenAI:
+def create_langchain_llm_client(tier: str = "default") -> AzureChatOpenAI | ChatOpenAI:
     """
     Create a LangChain client for either OpenAI or Azure OpenAI.
 
+    The client is shared by the whole process, see :class:`LLMClientPool`.
+
+    Args:
+        tier: Model tier of the call site, see ``TIER_FALLBACKS``.
+
     Returns:
         BaseChatOpenAI: A LangChain chat model instance
 
     Raises:
         ValueError: If provider is not supported or required parameters are missing
     """
+    # langchain_openai is only needed once a sub-agent runs, keep it off the CLI hot path.
+    from langchain_openai import AzureChatOpenAI, ChatOpenAI
+
+    pool = get_llm_pool()
     provider = os.environ.get("API_SERVER_TYPE")
     if provider.lower() == "azure":
         endpoint = os.environ.get("AZURE_ENDPOINT")
-        model = os.environ.get("AZURE_MODEL")
+        model = resolve_tier_model(tier, os.environ.get("AZURE_MODEL"))
         if not endpoint:
             raise ValueError("Azure endpoint is required")
-        return AzureChatOpenAI(
-            model=model,
-            temperature=1.0,
-            api_key=os.getenv("AZURE_API_KEY"),
-            azure_endpoint=endpoint,
-            max_completion_tokens=256,
-            api_version="2024-02-01",
+        return pool.get(
+            ("langchain", "azure", model, endpoint),
+            lambda http_client: AzureChatOpenAI(
+                model=model,
+                temperature=1.0,
+                api_key=os.getenv("AZURE_API_KEY"),
+                azure_endpoint=endpoint,
+                max_completion_tokens=256,
+                api_version="2024-02-01",
+                http_client=http_client,
+                max_retries=0,
+            ),
         )
     elif provider.lower() == "openai":
         endpoint = os.environ.get("OPENAI_ENDPOINT")
-        model = os.environ.get("OPENAI_MODEL")
-        return ChatOpenAI(
-            model=model,
-            temperature=1.0,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=endpoint if endpoint else None,
+        model = resolve_tier_model(tier, os.environ.get("OPENAI_MODEL"))
+        return pool.get(
+            ("langchain", "openai", model, endpoint),
+            lambda http_client: ChatOpenAI(
+                model=model,
+                temperature=1.0,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=endpoint if endpoint else None,
+                http_client=http_client,
+                # Report token usage of streamed responses too, see macosagent.llm.metering.
+                stream_usage=True,
+                max_retries=0,
+            ),
         )
     else:
         raise ValueError(f"Provider {provider} not supported. Use 'openai' or 'azure'")
 
 
-class LLMEngine(HfEngine):
+class LLMEngine:
+    """Callable engine turning role/content dicts into a LangChain chat call."""
+
     def __init__(self, client: AzureChatOpenAI | ChatOpenAI, model_id: str):
         self.client = client
         self.model_id = model_id
@@ -104,6 +378,13 @@ class LLMEngine(HfEngine):
         stop_sequences: list[str] | None = None,
         grammar: str | None = None,
     ) -> str:
+        from langchain_core.messages import (
+            AIMessage,
+            HumanMessage,
+            SystemMessage,
+            ToolMessage,
+        )
+
         input_messages = []
         for message in messages:
             if message["role"].value == "user":
@@ -115,3 +396,9 @@ class LLMEngine(HfEngine):
             elif message["role"].value == "system":
                 input_messages.append(SystemMessage(content=message["content"]))
         return self.client.invoke(input_messages).content
+
+
+def create_llm_engine(tier: str = "fast") -> LLMEngine:
+    """Create an :class:`LLMEngine` on the LangChain client of ``tier``, e.g. for final answers."""
+    client = create_langchain_llm_client(tier)
+    return LLMEngine(client, getattr(client, "model_name", None) or getattr(client, "deployment_name", None))
@@ -0,0 +1,139 @@
+"""Token, image and latency accounting of LLM requests.
+
+:class:`MeteredTransport` wraps the HTTP transport shared by every LLM client
+and reports each chat completion request to :mod:`macosagent.metrics`, with
+the token usage returned by the server, and to the tracer of
+:mod:`macosagent.llm.tracing` as a generation of the current trace. Streamed responses only carry usage if
+the client asks for it (``stream_usage`` / ``stream_options.include_usage``).
+"""
+
+import contextvars
+import json
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import httpx
+
+from macosagent.llm.tracing import get_tracer
+from macosagent.metrics import get_metrics
+
+METERED_PATHS = ("/chat/completions", "/completions", "/responses")
+
+
+def count_images(body: bytes) -> int:
+    """Number of images embedded as data URLs in a request body."""
+    return body.count(b'"data:image/')
+
+
+def _usage(payload: dict[str, Any]) -> tuple[int, int]:
+    usage = payload.get("usage") or {}
+    prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+    completion_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+    return prompt_tokens, completion_tokens
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    """Server-sent events stream recording the call once it is closed, with the usage of its last chunk."""
+
+    def __init__(self, stream: httpx.SyncByteStream, record: Any):
+        self.stream = stream
+        self._record = record
+        self._recorded = False
+        self._buffer = b""
+        self.model: str | None = None
+        self.usage = (0, 0)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.stream:
+            self._scan(chunk)
+            yield chunk
+
+    def _scan(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            if not line.startswith(b"data:") or (b'"usage"' not in line and self.model is not None):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(event, dict):
+                self.model = self.model or event.get("model")
+                if event.get("usage"):
+                    self.usage = _usage(event)
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self._recorded:
+                self._recorded = True
+                self._record(self.model, *self.usage)
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """HTTP transport recording LLM calls in the process-wide metrics registry."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or not request.url.path.endswith(METERED_PATHS):
+            return self.transport.handle_request(request)
+        metrics = get_metrics()
+        tracer = get_tracer()
+        # Streams may be closed in another context; the generation belongs to the span of the request.
+        trace_context = contextvars.copy_context() if tracer is not None else None
+        images = count_images(request.read())
+        wall_start_time = time.time()
+        start_time = time.perf_counter()
+
+        def record_call(model: str | None, status: int, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+            latency = time.perf_counter() - start_time
+            metrics.record_llm_call(
+                model,
+                latency,
+                status=status,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                images=images,
+            )
+            if tracer is not None:
+                trace_context.run(
+                    tracer.record_generation,
+                    model,
+                    wall_start_time,
+                    wall_start_time + latency,
+                    status,
+                    prompt_tokens,
+                    completion_tokens,
+                )
+
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            record_call(None, status=0)
+            raise
+
+        def record(model: str | None, prompt_tokens: int, completion_tokens: int) -> None:
+            record_call(model, response.status_code, prompt_tokens, completion_tokens)
+
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            # Recorded when the consumer closes the stream, i.e. with the full generation time.
+            response.stream = _MeteredStream(response.stream, record)
+            return response
+        response.read()
+        try:
+            payload = json.loads(response.content)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            payload = None
+        if isinstance(payload, dict):
+            record(payload.get("model"), *_usage(payload))
+        else:
+            record(None, 0, 0)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
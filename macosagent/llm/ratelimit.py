@@ -0,0 +1,352 @@
+"""Client-side rate limiting and retries for all LLM requests of the process.
+
+:class:`RateLimitedTransport` sits in the HTTP transport shared by every LLM
+client (see :class:`macosagent.llm.llm.LLMClientPool`). Before a request is
+sent it takes one request and its estimated tokens from the RPM/TPM token
+buckets and a slot from an AIMD concurrency limit: the limit grows by one slot
+per window of successful requests and is halved on a 429 (or when latency goes
+over ``MACOSAGENT_LLM_LATENCY_TARGET``). Throttled, overloaded and failed
+connections (not requests that timed out waiting for the response) are retried with jittered exponential backoff, honouring
+``Retry-After``, so a batch run can saturate its quota without failing steps.
+"""
+
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Transport errors raised before the server got the request, or (RemoteProtocolError) before it
+# sent any response, e.g. on a stale keep-alive connection. Others, such as a ReadTimeout while
+# the model is still generating, are not retried: the prompt would run and be billed twice.
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+# Rough prompt cost of an image, in tokens (a high detail 1024x1024 image for GPT-4o).
+IMAGE_TOKENS = 765
+
+
+class TokenBucket:
+    """Bucket refilled at ``per_minute / 60`` units per second, holding at most ``per_minute`` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float) -> float:
+        """Block until ``amount`` units are available and take them; return the time waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """Take (or give back, if negative) ``amount`` units without waiting, e.g. to correct an estimate."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adapted by additive increase, multiplicative decrease (AIMD)."""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_target: float = 0.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        start_time = time.perf_counter()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.perf_counter() - start_time
+
+    def release(self, throttled: bool = False, latency: float | None = None) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            congested = throttled or (self.latency_target > 0 and latency is not None and latency > self.latency_target)
+            now = time.monotonic()
+            if congested:
+                # One decrease per second, a burst of 429s from the same window only counts once.
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+                    logger.info(f"LLM concurrency limit decreased to {int(self.limit)}")
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failed: int = 0
+    wait_total: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "wait_total": self.wait_total,
+        }
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Estimate the tokens a chat completion request counts against the TPM limit."""
+    try:
+        payload = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return len(body) // 4
+    text_chars = 0
+    images = 0
+
+    def visit(value: Any) -> None:
+        nonlocal text_chars, images
+        if isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item)
+        elif isinstance(value, str):
+            if value.startswith("data:image/") or (value.startswith("http") and value.endswith((".png", ".jpg", ".jpeg"))):
+                images += 1
+            else:
+                text_chars += len(value)
+
+    visit(payload.get("messages", payload))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or 0
+    return text_chars // 4 + images * IMAGE_TOKENS + completion
+
+
+def retry_delay(attempt: int, response: httpx.Response | None, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff, or the server's ``Retry-After`` if it asks for longer."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if response is not None:
+        retry_after = None
+        if "retry-after-ms" in response.headers:
+            try:
+                retry_after = float(response.headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        elif "retry-after" in response.headers:
+            value = response.headers["retry-after"]
+            try:
+                retry_after = float(value)
+            except ValueError:
+                parsed = email.utils.parsedate_to_datetime(value) if value else None
+                if parsed is not None:
+                    retry_after = parsed.timestamp() - time.time()
+        if retry_after is not None and retry_after > delay:
+            delay = min(retry_after, cap)
+    return delay
+
+
+class RateLimiter:
+    """Request and token buckets, adaptive concurrency and the retry policy shared by all LLM calls."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 8,
+        latency_target: float = 0.0,
+        max_retries: int = 6,
+        retry_base: float = 1.0,
+        retry_max: float = 60.0,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency, latency_target=latency_target)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.stats = RateLimitStats()
+        self._stats_lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        waited = 0.0
+        if self.request_bucket is not None:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            waited += self.token_bucket.acquire(tokens)
+        waited += self.concurrency.acquire()
+        with self._stats_lock:
+            self.stats.requests += 1
+            self.stats.wait_total += waited
+        if waited > 1.0:
+            logger.info(f"LLM request waited {waited:.1f}s for the rate limiter")
+
+    def record_usage(self, estimated: int, used: int | None) -> None:
+        if self.token_bucket is not None and used is not None:
+            self.token_bucket.adjust(used - estimated)
+
+    def count(self, field: str) -> None:
+        with self._stats_lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def info(self) -> dict[str, Any]:
+        return {
+            **self.stats.to_dict(),
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response stream releasing the concurrency slot once the body is consumed or closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+def _usage_tokens(content: bytes) -> int | None:
+    try:
+        usage = json.loads(content).get("usage") or {}
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        return None
+    return usage.get("total_tokens")
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """HTTP transport applying a :class:`RateLimiter` and its retry policy to POST requests."""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return self.transport.handle_request(request)
+        tokens = estimate_tokens(request.read())
+        limiter = self.limiter
+        attempt = 0
+        while True:
+            limiter.acquire(tokens)
+            start_time = time.perf_counter()
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                limiter.concurrency.release()
+                if not isinstance(e, RETRY_EXCEPTIONS) or attempt >= limiter.max_retries:
+                    limiter.count("failed")
+                    raise
+                delay = retry_delay(attempt, None, limiter.retry_base, limiter.retry_max)
+                logger.warning(f"LLM request failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+            else:
+                should_retry = (
+                    response.status_code in RETRY_STATUS_CODES
+                    and response.headers.get("x-should-retry") != "false"
+                    and attempt < limiter.max_retries
+                )
+                if response.status_code == 429:
+                    limiter.count("throttled")
+                if not should_retry:
+                    return self._finish(request, response, tokens, start_time)
+                response.read()
+                response.close()
+                limiter.concurrency.release(throttled=response.status_code == 429)
+                delay = retry_delay(attempt, response, limiter.retry_base, limiter.retry_max)
+                logger.warning(f"LLM request got HTTP {response.status_code}, retrying in {delay:.1f}s")
+            limiter.count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _finish(
+        self, request: httpx.Request, response: httpx.Response, tokens: int, start_time: float
+    ) -> httpx.Response:
+        limiter = self.limiter
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            # Streamed responses hold their slot until the body has been consumed.
+            response.stream = _ReleasingStream(
+                response.stream,
+                lambda: limiter.concurrency.release(latency=time.perf_counter() - start_time),
+            )
+            return response
+        try:
+            response.read()
+        finally:
+            response.close()
+            limiter.concurrency.release(latency=time.perf_counter() - start_time)
+        limiter.record_usage(tokens, _usage_tokens(response.content))
+        headers = {
+            key: value for key, value in response.headers.items()
+            if key.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=response.content,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(max_concurrency: int = 8) -> RateLimiter:
+    """Return the process-wide limiter configured by ``MACOSAGENT_LLM_*``, creating it on first use."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                requests_per_minute=float(os.getenv("MACOSAGENT_LLM_RPM", "0")),
+                tokens_per_minute=float(os.getenv("MACOSAGENT_LLM_TPM", "0")),
+                max_concurrency=max_concurrency,
+                latency_target=float(os.getenv("MACOSAGENT_LLM_LATENCY_TARGET", "0")),
+                max_retries=int(os.getenv("MACOSAGENT_LLM_MAX_RETRIES", "6")),
+                retry_base=float(os.getenv("MACOSAGENT_LLM_RETRY_BASE", "1.0")),
+                retry_max=float(os.getenv("MACOSAGENT_LLM_RETRY_MAX", "60")),
+            )
+        return _limiter
@@ -0,0 +1,203 @@
+"""Streaming structured output for the ReAct app agents.
+
+``get_next_action`` normally waits for the whole ``AgentOutput`` tool call
+before the first action runs. In streaming mode (``MACOSAGENT_STREAM_ACTIONS``)
+the tool call is streamed instead: :class:`ActionArrayParser` scans the
+argument deltas and every element of ``action`` is validated against the
+dynamic ``ActionModel`` and handed to ``multi_act`` as soon as it is closed, so
+actions execute while the model is still generating the next ones.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from typing import Any
+
+from macosagent.deadlines import current_deadline
+
+logger = logging.getLogger(__name__)
+
+STREAM_ACTIONS = os.getenv("MACOSAGENT_STREAM_ACTIONS", "false").lower() == "true"
+
+
+class ActionArrayParser:
+    """Incremental scanner over the JSON arguments of an ``AgentOutput`` tool call.
+
+    ``feed()`` takes the next fragment of the arguments and returns the elements
+    of the top-level ``key`` array completed by it, decoded.
+    """
+
+    def __init__(self, key: str = "action"):
+        self.key = key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: str | None = None
+        self._in_array = False
+        self._element_start: int | None = None
+
+    def feed(self, fragment: str) -> list[Any]:
+        self._text += fragment
+        completed = []
+        for i in range(self._pos, len(self._text)):
+            char = self._text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = self._text[self._string_start + 1:i]
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if self._in_array and self._depth == 2 and self._element_start is None:
+                    self._element_start = i
+                elif char == "[" and self._depth == 1 and self._last_string == self.key:
+                    self._in_array = True
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._in_array and self._depth == 2 and self._element_start is not None:
+                    completed.append(json.loads(self._text[self._element_start:i + 1]))
+                    self._element_start = None
+                elif self._in_array and self._depth == 1:
+                    self._in_array = False
+        self._pos = len(self._text)
+        return completed
+
+
+def stream_agent_output(
+    llm: Any,
+    prompt: list[Any],
+    agent_output_model: type,
+    action_model: type,
+    on_action: Callable[[Any], None],
+) -> dict[str, Any]:
+    """Stream an ``AgentOutput`` tool call, passing each action to ``on_action`` as soon as it is complete.
+
+    Returns the same ``{"raw", "parsed", "parsing_error"}`` dict as
+    ``llm.with_structured_output(..., include_raw=True)``. Actions are only
+    dispatched early up to the first one that fails validation; the caller
+    gets the rest from ``parsed``. The stream is abandoned once the current
+    deadline (see :mod:`macosagent.deadlines`) passes.
+    """
+    from langchain_core.messages import message_chunk_to_message
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    tool_name = convert_to_openai_tool(agent_output_model)["function"]["name"]
+    tool_llm = llm.bind_tools([agent_output_model], tool_choice=tool_name, parallel_tool_calls=False)
+    parser = ActionArrayParser()
+    dispatching = True
+    message = None
+    deadline = current_deadline()
+    for chunk in tool_llm.stream(prompt):
+        if deadline is not None and deadline.expired():
+            # Closing the stream aborts the request of a call that timed out.
+            raise deadline.timeout()
+        message = chunk if message is None else message + chunk
+        for tool_call_chunk in chunk.tool_call_chunks:
+            if tool_call_chunk.get("index", 0) not in (0, None) or not tool_call_chunk.get("args"):
+                continue
+            for element in parser.feed(tool_call_chunk["args"]):
+                if not dispatching:
+                    continue
+                try:
+                    action = action_model.model_validate(element)
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"Streamed action {element} is invalid, waiting for the full output: {e}")
+                    dispatching = False
+                    continue
+                on_action(action)
+
+    if message is None:
+        raise ValueError("The model returned an empty stream")
+    raw = message_chunk_to_message(message)
+    try:
+        if not raw.tool_calls:
+            raise ValueError(f"The model did not call {tool_name}: {raw.content}")
+        parsed = agent_output_model.model_validate(raw.tool_calls[0]["args"])
+    except Exception as e:  # noqa: BLE001
+        return {"raw": raw, "parsed": None, "parsing_error": e}
+    return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+
+class ActionStream:
+    """Actions produced by a streaming thread, consumed with ``async for`` on the event loop."""
+
+    _END = object()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.dispatched = 0
+
+    def put(self, action: Any) -> None:
+        """Thread-safe; called from the streaming thread."""
+        self.dispatched += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, action)
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, self._END)
+
+    def ready(self) -> bool:
+        """Whether the next action (or the end of the stream) has already arrived."""
+        return not self._queue.empty()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            action = await self._queue.get()
+            if action is self._END:
+                return
+            yield action
+
+
+async def iterate_actions(actions: Iterable[Any] | AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Iterate over a list of actions or an :class:`ActionStream` alike."""
+    if hasattr(actions, "__aiter__"):
+        async for action in actions:
+            yield action
+    else:
+        for action in actions:
+            yield action
+
+
+async def stream_step(
+    get_next_action: Callable[[Callable[[Any], None]], Awaitable[dict[str, Any]]],
+    multi_act: Callable[[Any], Awaitable[list[Any]]],
+) -> tuple[dict[str, Any], list[Any]]:
+    """Run ``get_next_action`` while ``multi_act`` executes the actions it streams.
+
+    Args:
+        get_next_action: Produces the structured response, calling its argument with each
+            complete action; the callback may be called from any thread.
+        multi_act: Executes the actions of an :class:`ActionStream` or list.
+
+    Returns:
+        The structured response and the results of all its actions.
+    """
+    stream = ActionStream(asyncio.get_running_loop())
+
+    async def produce():
+        try:
+            return await get_next_action(stream.put)
+        finally:
+            stream.close()
+
+    producer = asyncio.ensure_future(produce())
+    results = await multi_act(stream)
+    response = await producer
+    parsed = response.get("parsed")
+    if parsed is not None and len(parsed.action) > stream.dispatched:
+        # Actions that could not be dispatched early, e.g. after an invalid partial element.
+        results += await multi_act(parsed.action[stream.dispatched:])
+    return response, results
@@ -1,26 +1,410 @@
+"""Tracing of agent runs.
+
+Runs (``run``/``execute``, batch tasks, daemon tasks) are traced as a tree of
+spans: the orchestrator run at the root, app agent calls below it, and every
+LLM request as a generation, recorded by the metering transport (see
+:mod:`macosagent.llm.metering`) with its model, token usage and latency.
+
+Tracing is configured once, from the environment, on first use:
+
+* ``ENABLE_TRACING=true`` turns it on. When it is off, functions decorated with
+  :func:`trace_with_metadata` only read a cached flag before running.
+* ``MACOSAGENT_TRACE_SAMPLE_RATE`` (default 1) is the share of runs traced.
+  The decision is taken once per run, at its root span, from a hash of the run
+  id, and inherited by everything below it; spans of unsampled runs only cost
+  a context variable lookup.
+* Finished spans are appended to an in-memory buffer and exported in batches
+  by a background thread, every ``MACOSAGENT_TRACE_FLUSH_INTERVAL`` seconds
+  (default 5), to Langfuse (``LANGFUSE_*`` keys) or, if
+  ``MACOSAGENT_TRACE_FILE`` is set, to a JSON lines file. At most
+  ``MACOSAGENT_TRACE_BUFFER`` spans (default 10000) are buffered; more are
+  dropped and counted.
+"""
+
+import atexit
+import contextvars
 import functools
+import itertools
+import json
 import logging
 import os
-from collections.abc import Callable
-from typing import Any
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timezone
+from typing import Any, Protocol
 
 logger = logging.getLogger(__name__)
 
-ENABLE_TRACING = os.getenv("ENABLE_TRACING", "false").lower() == "true"
-logger.warning(f"ENABLE_TRACING: {ENABLE_TRACING}")
-if ENABLE_TRACING:
-    from langfuse.callback import CallbackHandler
 
-    langfuse_handler = CallbackHandler(
-        secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-        public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-        host=os.getenv("LANGFUSE_HOST"),
+@dataclass(slots=True)
+class Span:
+    """A traced operation. Span ids are numbers, unique within a trace; the root span is 0."""
+
+    trace_id: str
+    span_id: int
+    parent_id: int | None
+    name: str
+    start_time: float
+    end_time: float | None = None
+    kind: str = "span"
+    metadata: dict[str, Any] | None = None
+    tags: list[str] | None = None
+    error: str | None = None
+    root: "Span | None" = field(default=None, repr=False, compare=False)
+
+    @property
+    def observation_id(self) -> str:
+        return f"{self.trace_id}-{self.span_id:x}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "root"}
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+    def shutdown(self) -> None: ...
+
+
+class LangfuseExporter:
+    """Sends spans to Langfuse as traces, spans and generations."""
+
+    def __init__(self):
+        from langfuse import Langfuse
+
+        self.client = Langfuse(
+            public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+            secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+            host=os.getenv("LANGFUSE_HOST"),
+        )
+
+    def export(self, spans: list[Span]) -> None:
+        for span in spans:
+            start_time = datetime.fromtimestamp(span.start_time, timezone.utc)
+            end_time = datetime.fromtimestamp(span.end_time or span.start_time, timezone.utc)
+            if span.kind == "trace":
+                self.client.trace(
+                    id=span.trace_id,
+                    name=span.name,
+                    metadata=span.metadata,
+                    tags=span.tags,
+                    timestamp=start_time,
+                )
+                continue
+            parent_id = None if not span.parent_id else f"{span.trace_id}-{span.parent_id:x}"
+            common = {
+                "id": span.observation_id,
+                "trace_id": span.trace_id,
+                "parent_observation_id": parent_id,
+                "name": span.name,
+                "start_time": start_time,
+                "end_time": end_time,
+                "level": "ERROR" if span.error else None,
+                "status_message": span.error,
+            }
+            if span.kind == "generation":
+                metadata = dict(span.metadata or {})
+                model = metadata.pop("model", None)
+                usage = {"input": metadata.pop("prompt_tokens", 0), "output": metadata.pop("completion_tokens", 0)}
+                self.client.generation(**common, model=model, usage_details=usage, metadata=metadata)
+            else:
+                self.client.span(**common, metadata=span.metadata)
+
+    def shutdown(self) -> None:
+        self.client.flush()
+
+
+class JsonlExporter:
+    """Appends spans to a JSON lines file, one span per line."""
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def export(self, spans: list[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+# Span ids; they only need to be unique within a trace, and counting is much cheaper than uuid4.
+_span_ids = itertools.count(1)
+
+
+# Current span; _UNSAMPLED below the root span of a run that is not traced.
+_UNSAMPLED = Span("", 0, None, "", 0.0)
+_current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("macosagent_span", default=None)
+
+
+@dataclass
+class TracerStats:
+    traces: int = 0
+    unsampled: int = 0
+    spans: int = 0
+    exported: int = 0
+    dropped: int = 0
+    export_errors: int = 0
+
+
+class Tracer:
+    """Head-sampled tracer buffering finished spans for a background exporter thread."""
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        sample_rate: float = 1.0,
+        flush_interval: float = 5.0,
+        max_buffer: int = 10000,
+        batch_size: int = 200,
+    ):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.stats = TracerStats()
+        self._buffer: deque[Span] = deque()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._export_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="macosagent-tracing", daemon=True)
+        self._thread.start()
+
+    def is_sampled(self, trace_key: str | None = None) -> bool:
+        """Sampling decision of a new trace, stable for a given key (e.g. the run id)."""
+        if self.sample_rate >= 1:
+            return True
+        if trace_key is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(trace_key.encode()) % 10_000 < self.sample_rate * 10_000
+
+    def start_span(
+        self,
+        name: str,
+        trace_name: str | None = None,
+        trace_key: str | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> tuple[Span | None, contextvars.Token | None]:
+        """Make a new span current, starting a new trace if there is no current span.
+
+        Returns the span, None if the trace is not sampled, and the token to pass to :meth:`end_span`.
+        """
+        parent = _current.get()
+        if parent is _UNSAMPLED:
+            return None, None
+        if parent is None:
+            if not self.is_sampled(trace_key):
+                self.stats.unsampled += 1
+                return None, _current.set(_UNSAMPLED)
+            trace_id = str(uuid.uuid4())
+            span = Span(trace_id, 0, None, trace_name or name, time.time(), kind="trace")
+            self.stats.traces += 1
+        else:
+            span = Span(parent.trace_id, next(_span_ids), parent.span_id, name, time.time(), root=parent.root or parent)
+        if metadata:
+            span.metadata = dict(metadata)
+        if tags:
+            span.tags = list(tags)
+            if span.root is not None:
+                # Tags are searchable on traces only; the root span is exported last.
+                root_tags = span.root.tags = span.root.tags or []
+                root_tags.extend(tag for tag in tags if tag not in root_tags)
+        return span, _current.set(span)
+
+    def end_span(self, span: Span | None, token: contextvars.Token | None, error: BaseException | None = None) -> None:
+        if token is not None:
+            _current.reset(token)
+        if span is not None:
+            span.end_time = time.time()
+            if error is not None:
+                span.error = f"{type(error).__name__}: {error}"
+            self._finish(span)
+
+    @contextmanager
+    def span(self, name: str, **kwargs: Any) -> Iterator[Span | None]:
+        """Trace the enclosed block; yields the span, or None if the trace is not sampled.
+
+        Takes the arguments of :meth:`start_span`.
+        """
+        span, token = self.start_span(name, **kwargs)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, token, e)
+            raise
+        self.end_span(span, token)
+
+    def record_generation(
+        self,
+        model: str | None,
+        start_time: float,
+        end_time: float,
+        status: int,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+    ) -> None:
+        """Record an LLM request of the current trace, if it is sampled."""
+        parent = _current.get()
+        if parent is None or parent is _UNSAMPLED:
+            return
+        span = Span(
+            parent.trace_id,
+            next(_span_ids),
+            parent.span_id,
+            "llm",
+            start_time,
+            end_time,
+            kind="generation",
+            metadata={"model": model, "status": status, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+            error=f"HTTP {status}" if status == 0 or status >= 400 else None,
+        )
+        self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.stats.dropped += 1
+            return
+        self._buffer.append(span)
+        self.stats.spans += 1
+        if len(self._buffer) >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export the buffered spans now."""
+        with self._export_lock:
+            while self._buffer:
+                batch = []
+                while self._buffer and len(batch) < self.batch_size:
+                    batch.append(self._buffer.popleft())
+                try:
+                    self.exporter.export(batch)
+                    self.stats.exported += len(batch)
+                except Exception as e:  # noqa: BLE001
+                    self.stats.export_errors += 1
+                    logger.warning(f"Could not export {len(batch)} spans: {e}")
+
+    def shutdown(self) -> None:
+        """Stop the exporter thread and export what is left."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        try:
+            self.exporter.shutdown()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Could not shut down the span exporter: {e}")
+
+    def info(self) -> dict[str, Any]:
+        return {"sample_rate": self.sample_rate, "buffered": len(self._buffer), **asdict(self.stats)}
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={os.getenv(name)!r}")
+        return default
+
+
+def create_tracer() -> Tracer | None:
+    """Tracer configured from the environment, or None if tracing is disabled."""
+    if os.getenv("ENABLE_TRACING", "false").lower() != "true":
+        return None
+    sample_rate = _float_env("MACOSAGENT_TRACE_SAMPLE_RATE", 1.0)
+    if sample_rate <= 0:
+        return None
+    path = os.getenv("MACOSAGENT_TRACE_FILE")
+    try:
+        exporter = JsonlExporter(path) if path else LangfuseExporter()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Tracing disabled, could not create the span exporter: {e}")
+        return None
+    tracer = Tracer(
+        exporter,
+        sample_rate=sample_rate,
+        flush_interval=_float_env("MACOSAGENT_TRACE_FLUSH_INTERVAL", 5.0),
+        max_buffer=int(_float_env("MACOSAGENT_TRACE_BUFFER", 10000)),
     )
-    from langfuse.openai import openai
+    atexit.register(tracer.shutdown)
+    logger.info(f"Tracing enabled, sample rate {sample_rate:g}, exporting to {path or 'Langfuse'}")
+    return tracer
+
+
+_tracer: Tracer | None = None
+_configured = False
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer | None:
+    """Return the process-wide tracer, or None if tracing is disabled."""
+    global _tracer, _configured
+    if not _configured:
+        with _tracer_lock:
+            if not _configured:
+                _tracer = create_tracer()
+                _configured = True
+    return _tracer
+
+
+def trace_function(
+    func: Callable,
+    tracer: Tracer | None,
+    name: str,
+    trace_name: str | None = None,
+    trace_key: str | None = None,
+    tags: list[str] | None = None,
+    metadata: dict[str, Any] | None = None,
+) -> Callable:
+    """Wrap ``func`` so that its calls are traced by ``tracer``; ``func`` itself if there is none."""
+    if tracer is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if _current.get() is _UNSAMPLED:
+            return func(*args, **kwargs)
+        return _call_in_span(tracer, func, args, kwargs, name, trace_name, trace_key, tags, metadata)
+
+    return wrapper
+
+
+def _call_in_span(
+    tracer: Tracer,
+    func: Callable,
+    args: tuple,
+    kwargs: dict[str, Any],
+    name: str,
+    trace_name: str | None,
+    trace_key: str | None,
+    tags: list[str] | None,
+    metadata: dict[str, Any] | None,
+) -> Any:
+    span, token = tracer.start_span(name, trace_name, trace_key, tags, metadata)
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        tracer.end_span(span, token, e)
+        raise
+    tracer.end_span(span, token)
+    return result
 
-else:
-    langfuse_handler = None
-    import openai  # noqa: F401
 
 def trace_with_metadata(
         name: str | None = None,
@@ -28,37 +412,28 @@ def trace_with_metadata(
         tags: list[str] | None = None,
         observation_name: str | None = None):
     """
-    A decorator that adds tracing with metadata to a function.
-    If tracing is disabled, the function will execute normally without tracing.
-    
+    A decorator that traces a function as a span, or as a new trace if no trace is active.
+    The tracer is looked up on each call, so functions decorated at import time are traced
+    once tracing is configured; while it is disabled, calls go straight to the function.
+
     Args:
-        name (Optional[str]): The name of the trace
-        custom_id (Optional[str]): A custom identifier to be added to the trace metadata
+        name (Optional[str]): The name of the trace, if the function starts one
+        custom_id (Optional[str]): A custom identifier (e.g. the run id) added to the span metadata,
+            also used for the sampling decision
+        tags (Optional[list[str]]): Tags added to the span and its trace
+        observation_name (Optional[str]): The name of the span
     """
     def decorator(func: Callable) -> Callable:
+        span_name = observation_name or name or func.__name__
+        metadata = {"custom_id": custom_id} if custom_id else None
+
         @functools.wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            if not ENABLE_TRACING:
+            # Once configured, the cached tracer is read without taking the lock.
+            tracer = _tracer if _configured else get_tracer()
+            if tracer is None or _current.get() is _UNSAMPLED:
                 return func(*args, **kwargs)
-
-            # Create metadata with custom_id if provided
-            metadata = {"custom_id": custom_id} if custom_id else {}
-
-            # Use the observe decorator from langfuse with metadata
-            from langfuse.decorators import langfuse_context, observe
-            @observe
-            def traced_func(*args: Any, **kwargs: Any) -> Any:
-                if len(metadata) > 0:
-                    langfuse_context.update_current_trace(metadata=metadata)
-                if name:
-                    langfuse_context.update_current_trace(name=name)
-                if tags is not None and len(tags) > 0:
-                    langfuse_context.update_current_trace(tags=tags)
-                if observation_name:
-                    langfuse_context.update_current_observation(name=observation_name)
-                return func(*args, **kwargs)
-
-            return traced_func(*args, **kwargs)
+            return _call_in_span(tracer, func, args, kwargs, span_name, name, custom_id, tags, metadata)
 
         return wrapper
     return decorator
@@ -66,30 +441,9 @@ def trace_with_metadata(
 
 def span_with_metadata(custom_id: str | None = None):
     """
-    A decorator that adds span with metadata to a function.
-    If tracing is disabled, the function will execute normally without tracing.
-    
+    A decorator that traces a function as a span with metadata, see :func:`trace_with_metadata`.
+
     Args:
-        custom_id (Optional[str]): A custom identifier to be added to the trace metadata
+        custom_id (Optional[str]): A custom identifier to be added to the span metadata
     """
-    def decorator(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:
-            if not ENABLE_TRACING:
-                return func(*args, **kwargs)
-
-            # Create metadata with custom_id if provided
-            metadata = {"custom_id": custom_id} if custom_id else {}
-
-            # Use the observe decorator from langfuse with metadata
-            from langfuse.decorators import langfuse_context, observe
-            @observe
-            def traced_func(*args: Any, **kwargs: Any) -> Any:
-                langfuse_context.update_current_trace(metadata=metadata)
-                return func(*args, **kwargs)
-
-            return traced_func(*args, **kwargs)
-
-        return wrapper
-    return decorator
-
+    return trace_with_metadata(custom_id=custom_id)
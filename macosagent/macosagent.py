@@ -7,7 +7,9 @@ import yaml
 from smolagents import CodeAgent
 
 from macosagent.agents import agent_box
-from macosagent.llm import create_smol_llm_client
+from macosagent.llm import create_smol_llm_client, warm_up_llm_connections
+from macosagent.metrics import get_metrics
+from macosagent.scheduler import create_dispatch_tools
 
 
 def create_agent() -> CodeAgent:
@@ -17,19 +19,23 @@ def create_agent() -> CodeAgent:
         CodeAgent: An initialized MacOS agent instance with configured model and tools.
     """
     # Initialize the agent with the model and tools
-    llm_engine = create_smol_llm_client()
-    app_agent_box = []
-    for _, v in agent_box.items():
-        app_agent_box.append(v)
+    llm_engine = create_smol_llm_client(tier="planner")
+    # Open the LLM connections while the prompt and tools are being set up.
+    warm_up_llm_connections()
+    # App agents are lazy proxies; each one is imported on its first call.
+    app_agent_box = list(agent_box.values())
+    # submit_agent_task/gather_agent_results let generated code overlap independent subtasks.
+    dispatch_tools = create_dispatch_tools(app_agent_box)
     with open(
         str(files("macosagent").joinpath("prompt.yaml")),
         encoding="utf-8") as file:
         prompt: dict[str, Any] = yaml.safe_load(file)
 
     macos_agent = CodeAgent(
-        tools=app_agent_box,
+        tools=app_agent_box + dispatch_tools,
         model=llm_engine,
         prompt_templates=prompt,
+        step_callbacks=[get_metrics().step_callback],
     )
 
     return macos_agent
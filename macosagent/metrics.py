@@ -0,0 +1,353 @@
+"""In-process metrics of LLM calls and agent steps.
+
+Every LLM request sent through the shared HTTP transport (see
+:mod:`macosagent.llm.metering`) and every agent step is recorded with the
+agent running it and the task it belongs to. Both labels come from context
+variables: ``run_id`` is set by ``run``/``execute``, the batch runner and the
+daemon, ``agent`` by :class:`macosagent.agents.registry.LazyAgentTool` (the
+orchestrator's own calls are labeled ``orchestrator``).
+
+Counters and histograms are aggregated over runs and exported in the
+Prometheus text format (``macosagent.prom``, e.g. for the node_exporter
+textfile collector); the usage of each run is exported as a JSON summary
+(``run_<run_id>.json``), broken down by agent.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR = "orchestrator"
+
+_agent: contextvars.ContextVar[str] = contextvars.ContextVar("macosagent_agent", default=ORCHESTRATOR)
+_run_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("macosagent_run_id", default=None)
+
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+STEP_DURATION_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+PHASE_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+# name -> (type, help)
+METRICS: dict[str, tuple[str, str]] = {
+    "macosagent_llm_requests_total": ("counter", "LLM requests, by HTTP status."),
+    "macosagent_llm_prompt_tokens_total": ("counter", "Prompt tokens reported by the LLM server."),
+    "macosagent_llm_completion_tokens_total": ("counter", "Completion tokens reported by the LLM server."),
+    "macosagent_llm_images_total": ("counter", "Images sent in LLM prompts."),
+    "macosagent_llm_cost_usd_total": ("counter", "Estimated LLM cost in US dollars."),
+    "macosagent_llm_latency_seconds": ("histogram", "LLM request latency, including rate limiting and retries."),
+    "macosagent_steps_total": ("counter", "Agent steps, by outcome."),
+    "macosagent_step_duration_seconds": ("histogram", "Agent step duration."),
+    "macosagent_step_phase_seconds": ("histogram", "Duration of the phases of app agent steps (capture, encode, llm, ...)."),
+    "macosagent_screenshots_total": ("counter", "App agent step screenshots, by what was sent (full, crop, unchanged)."),
+    "macosagent_timeouts_total": ("counter", "App agent timeouts, by phase (capture, llm, action, run)."),
+}
+
+# USD per million prompt/completion tokens, matched on the longest model name prefix.
+# Override or extend with MACOSAGENT_LLM_PRICES='{"model": [prompt, completion]}'.
+DEFAULT_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "o4-mini": (1.10, 4.40),
+}
+
+
+def _load_prices() -> dict[str, tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    overrides = os.getenv("MACOSAGENT_LLM_PRICES")
+    if overrides:
+        try:
+            prices.update({model: tuple(price) for model, price in json.loads(overrides).items()})
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring invalid MACOSAGENT_LLM_PRICES: {e}")
+    return prices
+
+
+def estimate_cost(model: str | None, prompt_tokens: int, completion_tokens: int, prices: dict | None = None) -> float:
+    """Estimated cost in US dollars of a call to ``model``, 0 for unknown models."""
+    if not model:
+        return 0.0
+    prices = prices if prices is not None else DEFAULT_PRICES
+    matches = [name for name in prices if model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = prices[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+@contextmanager
+def metric_context(agent: str | None = None, run_id: str | None = None) -> Iterator[None]:
+    """Label the metrics recorded in this context (and in threads started with a copy of it)."""
+    tokens = []
+    if agent is not None:
+        tokens.append((_agent, _agent.set(agent)))
+    if run_id is not None:
+        tokens.append((_run_id, _run_id.set(run_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_agent() -> str:
+    return _agent.get()
+
+
+def current_run_id() -> str | None:
+    return _run_id.get()
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+@dataclass
+class AgentUsage:
+    """Usage of one agent within a run."""
+
+    llm_calls: int = 0
+    llm_errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    images: int = 0
+    cost_usd: float = 0.0
+    llm_latency_total: float = 0.0
+    llm_latency_max: float = 0.0
+    steps: int = 0
+    step_errors: int = 0
+    step_duration_total: float = 0.0
+    timeouts: int = 0
+
+    def add(self, other: "AgentUsage") -> None:
+        for name, value in asdict(other).items():
+            if name == "llm_latency_max":
+                self.llm_latency_max = max(self.llm_latency_max, value)
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """Counters and histograms aggregated over runs, plus the usage of each run by agent."""
+
+    def __init__(self):
+        self.prices = _load_prices()
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._runs: dict[str, dict[str, AgentUsage]] = {}
+
+    def _inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def _observe(self, name: str, labels: Labels, value: float, buckets: tuple[float, ...]) -> None:
+        histogram = self._histograms.get((name, labels))
+        if histogram is None:
+            histogram = self._histograms[(name, labels)] = Histogram(buckets)
+        histogram.observe(value)
+
+    def _usage(self) -> AgentUsage | None:
+        run_id = _run_id.get()
+        if run_id is None:
+            return None
+        agents = self._runs.setdefault(run_id, {})
+        return agents.setdefault(_agent.get(), AgentUsage())
+
+    def record_llm_call(
+        self,
+        model: str | None,
+        latency: float,
+        status: int,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        images: int = 0,
+    ) -> None:
+        agent = _agent.get()
+        model = model or "unknown"
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, self.prices)
+        labels: Labels = (("agent", agent), ("model", model))
+        with self._lock:
+            self._inc("macosagent_llm_requests_total", labels + (("status", str(status)),))
+            self._inc("macosagent_llm_prompt_tokens_total", labels, prompt_tokens)
+            self._inc("macosagent_llm_completion_tokens_total", labels, completion_tokens)
+            self._inc("macosagent_llm_images_total", labels, images)
+            self._inc("macosagent_llm_cost_usd_total", labels, cost)
+            self._observe("macosagent_llm_latency_seconds", (("agent", agent),), latency, LLM_LATENCY_BUCKETS)
+            usage = self._usage()
+            if usage is not None:
+                usage.llm_calls += 1
+                usage.llm_errors += status >= 400
+                usage.prompt_tokens += prompt_tokens
+                usage.completion_tokens += completion_tokens
+                usage.images += images
+                usage.cost_usd += cost
+                usage.llm_latency_total += latency
+                usage.llm_latency_max = max(usage.llm_latency_max, latency)
+
+    def record_step(self, duration: float, error: bool = False) -> None:
+        agent = _agent.get()
+        with self._lock:
+            self._inc("macosagent_steps_total", (("agent", agent), ("status", "error" if error else "ok")))
+            self._observe("macosagent_step_duration_seconds", (("agent", agent),), duration, STEP_DURATION_BUCKETS)
+            usage = self._usage()
+            if usage is not None:
+                usage.steps += 1
+                usage.step_errors += error
+                usage.step_duration_total += duration
+
+    def record_phase(self, phase: str, duration: float) -> None:
+        with self._lock:
+            self._observe(
+                "macosagent_step_phase_seconds",
+                (("agent", _agent.get()), ("phase", phase)),
+                duration,
+                PHASE_DURATION_BUCKETS,
+            )
+
+    def record_screenshot(self, kind: str) -> None:
+        agent = _agent.get()
+        with self._lock:
+            self._inc("macosagent_screenshots_total", (("agent", agent), ("kind", kind)))
+
+    def record_timeout(self, phase: str) -> None:
+        agent = _agent.get()
+        with self._lock:
+            self._inc("macosagent_timeouts_total", (("agent", agent), ("phase", phase)))
+            usage = self._usage()
+            if usage is not None:
+                usage.timeouts += 1
+
+    def step_callback(self, step: Any, agent: Any = None) -> None:
+        """smolagents step callback recording the steps of the orchestrator."""
+        timing = getattr(step, "timing", None)
+        duration = getattr(timing, "duration", None) if timing is not None else getattr(step, "duration", None)
+        if duration is not None:
+            self.record_step(duration, error=getattr(step, "error", None) is not None)
+
+    def to_prometheus(self) -> str:
+        """All counters and histograms, aggregated over runs, in the Prometheus text format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: Histogram(h.buckets, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            if metric_type == "counter":
+                for (sample_name, labels), value in sorted(counters.items()):
+                    if sample_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for (sample_name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+                if sample_name != name:
+                    continue
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def run_summary(self, run_id: str) -> dict[str, Any]:
+        """Usage of ``run_id`` by agent, with totals."""
+        with self._lock:
+            agents = {agent: AgentUsage(**asdict(usage)) for agent, usage in self._runs.get(run_id, {}).items()}
+        total = AgentUsage()
+        for usage in agents.values():
+            total.add(usage)
+        return {
+            "run_id": run_id,
+            "agents": {agent: asdict(usage) for agent, usage in sorted(agents.items())},
+            "total": asdict(total),
+        }
+
+    def write_prometheus(self, directory: str | Path) -> Path:
+        path = Path(directory) / "macosagent.prom"
+        _write_atomic(path, self.to_prometheus())
+        return path
+
+    def write_run_summary(self, directory: str | Path, run_id: str) -> Path:
+        """Write the summary of ``run_id`` and forget its per-run usage."""
+        path = Path(directory) / f"run_{run_id}.json"
+        _write_atomic(path, json.dumps(self.run_summary(run_id), indent=2))
+        with self._lock:
+            self._runs.pop(run_id, None)
+        return path
+
+    def export(self, directory: str | Path, run_id: str | None = None) -> None:
+        """Write the Prometheus text file and, if ``run_id`` is given, the run summary."""
+        try:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            if run_id is not None:
+                summary = self.run_summary(run_id)["total"]
+                self.write_run_summary(directory, run_id)
+                logger.info(
+                    f"Run {run_id}: {summary['llm_calls']} LLM calls, "
+                    f"{summary['prompt_tokens']}+{summary['completion_tokens']} tokens, "
+                    f"${summary['cost_usd']:.4f}, {summary['steps']} steps"
+                )
+            self.write_prometheus(directory)
+        except OSError as e:
+            logger.warning(f"Could not export metrics to {directory}: {e}")
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_suffix(f"{path.suffix}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_metrics: MetricsRegistry | None = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry, creating it on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
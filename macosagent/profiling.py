@@ -0,0 +1,251 @@
+"""Step profiler of the app agents, enabled with ``macosagent run --profile``.
+
+Most of the time of a step that is not spent in the LLM goes to a few named
+phases, timed with :func:`profile_phase` wherever they happen:
+
+* ``ax_walk`` and ``screencapture``: the accessibility tree walk and the
+  screenshots of :func:`macosagent.agents.pipeline.capture_windows`;
+* ``box_drawer``: ``BoxDrawer.process_tree`` drawing the set-of-marks boxes;
+* ``image_encode``: screenshot encoding for the prompt;
+* ``artifact_write``: the step artifacts written to disk;
+* ``settle`` and ``pyautogui_pause``: the waits after GUI events, including
+  the ``pyautogui.PAUSE`` after every pyautogui call;
+* the :class:`~macosagent.agents.pipeline.StepLoop` phases (``capture``,
+  ``llm``, ``act``, ...) and the ``step`` around them.
+
+Phases nest through a context variable, so the phases of worker threads are
+attributed to the step that started them. When no profiler runs,
+:func:`profile_phase` only reads a module global.
+
+A :class:`Profiler` can also sample the Python stacks of all threads at a
+fixed interval. :meth:`Profiler.write` stores, per run:
+
+* ``timeline.json``: every phase with its start and end, and totals per phase;
+* ``phases.folded``: the self time of each phase path in microseconds;
+* ``samples.folded``: the sampled stacks, when sampling was on.
+
+The ``.folded`` files use the collapsed-stack format of ``flamegraph.pl``,
+inferno and speedscope.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from macosagent.metrics import current_agent
+
+logger = logging.getLogger(__name__)
+
+# Deepest stack kept by the sampler, counted from the innermost frame.
+MAX_SAMPLE_DEPTH = 128
+
+
+@dataclass
+class Span:
+    name: str
+    path: tuple[str, ...]
+    agent: str
+    thread: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Profiler:
+    """Phase spans, and optionally sampled stacks, of one run.
+
+    Args:
+        sample_interval: Seconds between two stack samples, 0 to only time phases.
+    """
+
+    def __init__(self, sample_interval: float = 0.0):
+        self.sample_interval = sample_interval
+        self.start_time = time.perf_counter()
+        self.started_at = time.time()
+        self.end_time: float | None = None
+        self.spans: list[Span] = []
+        self.samples: Counter[str] = Counter()
+        self.sample_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def start(self) -> "Profiler":
+        if self.sample_interval > 0:
+            self._sampler = threading.Thread(target=self._sample_loop, name="macosagent-profiler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.end_time = time.perf_counter()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                functions = []
+                while frame is not None and len(functions) < MAX_SAMPLE_DEPTH:
+                    functions.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join([names.get(ident, str(ident)), *reversed(functions)]))
+            with self._lock:
+                self.samples.update(stacks)
+                self.sample_count += 1
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Count, total, mean and max seconds of each phase name."""
+        durations: dict[str, list[float]] = defaultdict(list)
+        with self._lock:
+            for span in self.spans:
+                durations[span.name].append(span.duration)
+        return {
+            name: {
+                "count": len(values),
+                "total": round(sum(values), 6),
+                "mean": round(sum(values) / len(values), 6),
+                "max": round(max(values), 6),
+            }
+            for name, values in sorted(durations.items(), key=lambda item: -sum(item[1]))
+        }
+
+    def timeline(self) -> dict[str, Any]:
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "started_at": self.started_at,
+            "duration": round(end_time - self.start_time, 6),
+            "sample_interval": self.sample_interval,
+            "samples": self.sample_count,
+            "phases": self.summary(),
+            "spans": [
+                {
+                    "name": span.name,
+                    "path": list(span.path),
+                    "agent": span.agent,
+                    "thread": span.thread,
+                    "start": round(span.start - self.start_time, 6),
+                    "end": round(span.end - self.start_time, 6),
+                }
+                for span in spans
+            ],
+        }
+
+    def phase_stacks(self) -> list[str]:
+        """Collapsed stacks of the phase paths, weighted by their self time in microseconds.
+
+        Phases running concurrently on worker threads can add up to more than
+        their parent; the self time of the parent is then counted as 0.
+        """
+        totals: Counter[tuple[str, ...]] = Counter()
+        with self._lock:
+            for span in self.spans:
+                totals[(span.agent, *span.path, span.name)] += span.duration
+        children: Counter[tuple[str, ...]] = Counter()
+        for stack, total in totals.items():
+            children[stack[:-1]] += total
+        lines = []
+        for stack, total in sorted(totals.items()):
+            self_time = int(max(0.0, total - children[stack]) * 1e6)
+            if self_time > 0:
+                lines.append(f"{';'.join(stack)} {self_time}")
+        return lines
+
+    def sample_stacks(self) -> list[str]:
+        with self._lock:
+            return [f"{stack} {count}" for stack, count in sorted(self.samples.items())]
+
+    def write(self, directory: str | Path) -> dict[str, Path]:
+        """Write the timeline and the collapsed stacks to ``directory`` and return their paths."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = {"timeline": directory / "timeline.json", "phases": directory / "phases.folded"}
+        paths["timeline"].write_text(json.dumps(self.timeline(), indent=2))
+        paths["phases"].write_text("\n".join(self.phase_stacks()) + "\n")
+        if self.sample_interval > 0:
+            paths["samples"] = directory / "samples.folded"
+            paths["samples"].write_text("\n".join(self.sample_stacks()) + "\n")
+        return paths
+
+    def format(self, limit: int = 10) -> str:
+        phases = list(self.summary().items())[:limit]
+        return ", ".join(f"{name} {stats['total']:.3f}s/{stats['count']}" for name, stats in phases)
+
+
+_profiler: Profiler | None = None
+_path: ContextVar[tuple[str, ...]] = ContextVar("macosagent_profile_path", default=())
+
+
+def get_profiler() -> Profiler | None:
+    return _profiler
+
+
+def start_profiling(sample_interval: float = 0.0) -> Profiler:
+    """Start profiling the process; phases are recorded until :func:`stop_profiling`."""
+    global _profiler
+    _profiler = Profiler(sample_interval).start()
+    return _profiler
+
+
+def stop_profiling() -> Profiler | None:
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+@contextmanager
+def profile_phase(name: str) -> Iterator[None]:
+    """Time the enclosed block as phase ``name`` of the running profiler, if any."""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    path = _path.get()
+    token = _path.set((*path, name))
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        end_time = time.perf_counter()
+        _path.reset(token)
+        profiler.add(Span(name, path, current_agent(), threading.current_thread().name, start_time, end_time))
+
+
+def instrument_pyautogui() -> None:
+    """Time the pause pyautogui takes after each call, once pyautogui is imported."""
+    pyautogui = sys.modules.get("pyautogui")
+    handle_pause = getattr(pyautogui, "_handlePause", None)
+    if handle_pause is None or getattr(handle_pause, "__profiled__", False):
+        return
+
+    def _handlePause(*args: Any, **kwargs: Any) -> Any:
+        with profile_phase("pyautogui_pause"):
+            return handle_pause(*args, **kwargs)
+
+    _handlePause.__profiled__ = True
+    pyautogui._handlePause = _handlePause
@@ -0,0 +1,366 @@
+"""Scheduling of app agent calls made by the orchestrator.
+
+Calls that only touch files or the browser run concurrently on a thread pool.
+The desktop is arbitrated by the process-wide GUI lock, a fair (FIFO) lock that
+records how long callers waited for it:
+
+* app agents built on an action registry take it around each GUI-bound action
+  (clicks, typing, hot keys, ``computer_use``), across bursts of consecutive
+  keyboard actions and around state capture, so their file-bound actions
+  (openpyxl/docx/pptx/pdf edits) overlap with other agents' GUI work. Their
+  actions run on the event loop of the agent, so they use
+  :func:`async_gui_session`, which waits for the lock on a worker thread;
+* other GUI agents hold it for their whole run, on a single dedicated worker.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Hashable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractAsyncContextManager, asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from smolagents import Tool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LockStats:
+    acquisitions: int = 0
+    contended: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    hold_total: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_total": self.wait_total,
+            "wait_max": self.wait_max,
+            "wait_mean": self.wait_total / self.acquisitions if self.acquisitions else 0.0,
+            "hold_total": self.hold_total,
+        }
+
+
+class FairLock:
+    """Reentrant lock granted in request order, with wait and hold time statistics.
+
+    The lock is owned by the calling thread, or by ``owner`` when given, e.g.
+    an asyncio session whose acquisition runs on a worker thread. Only the
+    outermost acquisition of an owner is queued and counted. ``holder`` names
+    who takes the lock (e.g. an app agent key); the previous holder is kept in
+    ``last_holder`` so callers can tell whether someone else used the desktop
+    in between.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._queue: deque[int] = deque()
+        self._tickets = itertools.count()
+        self._owner: Hashable | None = None
+        self._depth = 0
+        self._acquired_at = 0.0
+        self.holder: str | None = None
+        self.last_holder: str | None = None
+        self.stats = LockStats()
+
+    def acquire(self, holder: str | None = None, owner: Hashable | None = None) -> float:
+        """Block until the lock is granted and return the time waited in seconds."""
+        me = threading.get_ident() if owner is None else owner
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return 0.0
+            start_time = time.perf_counter()
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            contended = self._owner is not None or self._queue[0] != ticket
+            while self._owner is not None or self._queue[0] != ticket:
+                self._cond.wait()
+            self._queue.popleft()
+            waited = time.perf_counter() - start_time
+            self._owner = me
+            self._depth = 1
+            self._acquired_at = time.perf_counter()
+            self.last_holder, self.holder = self.holder, holder
+            self.stats.acquisitions += 1
+            self.stats.contended += contended
+            self.stats.wait_total += waited
+            self.stats.wait_max = max(self.stats.wait_max, waited)
+            return waited
+
+    def release(self, owner: Hashable | None = None) -> None:
+        with self._cond:
+            if self._owner != (threading.get_ident() if owner is None else owner):
+                raise RuntimeError("cannot release un-acquired lock")
+            self._depth -= 1
+            if self._depth == 0:
+                self.stats.hold_total += time.perf_counter() - self._acquired_at
+                self._owner = None
+                self._cond.notify_all()
+
+    def locked(self) -> bool:
+        return self._owner is not None
+
+    def owned_by(self, owner: Hashable | None) -> bool:
+        return owner is not None and self._owner == owner
+
+    def __enter__(self) -> "FairLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+class ToolScheduler:
+    """Runs tool calls on a worker pool, GUI-bound calls one at a time."""
+
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers or int(os.getenv("MACOSAGENT_MAX_PARALLEL_TOOLS", "4"))
+        self.gui_lock = FairLock()
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="macosagent-tool")
+        self._gui_pool = ThreadPoolExecutor(1, thread_name_prefix="macosagent-gui")
+
+    def submit(self, fn: Callable[..., Any], *args: Any, gui_bound: bool = True, **kwargs: Any) -> Future:
+        """Schedule ``fn(*args, **kwargs)`` and return its future."""
+        pool = self._gui_pool if gui_bound else self._pool
+        # Run with the caller's context variables, e.g. the run id metrics are labeled with.
+        return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+        self._gui_pool.shutdown(wait=wait)
+
+
+_scheduler: ToolScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ToolScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ToolScheduler()
+        return _scheduler
+
+
+# Owner of the async GUI session the current task runs in. It travels with the
+# context to child tasks and worker threads, which then re-enter the session
+# instead of waiting for the lock their own session holds.
+_session_owner: ContextVar[object | None] = ContextVar("macosagent_gui_session", default=None)
+
+
+def _session_started(lock: FairLock, holder: str, app: Any, waited: float) -> None:
+    if waited > 0.1:
+        logger.info(f"{holder} waited {waited:.2f}s for the GUI lock")
+    if app is not None and lock.last_holder not in (None, holder):
+        try:
+            app.activateWithOptions_(0)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Could not re-activate the app of {holder}: {e}")
+
+
+@contextmanager
+def gui_session(holder: str, app: Any = None) -> Iterator[float]:
+    """Hold the GUI lock for ``holder`` and yield the time spent waiting for it.
+
+    If another holder used the desktop since ``holder`` last had it, ``app``
+    (the ``NSRunningApplication`` being driven) is brought back to the front
+    first, since the other agent may have changed the focused window.
+
+    Blocks the calling thread; code running on an event loop uses
+    :func:`async_gui_session` instead.
+    """
+    lock = get_scheduler().gui_lock
+    owner = _session_owner.get()
+    if not lock.owned_by(owner):
+        owner = None
+    waited = lock.acquire(holder, owner)
+    try:
+        _session_started(lock, holder, app, waited)
+        yield waited
+    finally:
+        lock.release(owner)
+
+
+async def _acquire_async(lock: FairLock, holder: str, owner: object) -> float:
+    future = asyncio.get_running_loop().run_in_executor(None, lock.acquire, holder, owner)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The worker still gets the lock eventually; give it back right away.
+        future.add_done_callback(lambda done: done.exception() is None and lock.release(owner))
+        raise
+
+
+@asynccontextmanager
+async def async_gui_session(holder: str, app: Any = None) -> AsyncIterator[float]:
+    """:func:`gui_session` for coroutines: the lock is awaited without blocking the event loop.
+
+    Sessions nested in the same task (or in tasks and threads it started
+    within the session) re-enter the lock.
+    """
+    lock = get_scheduler().gui_lock
+    owner = _session_owner.get()
+    if lock.owned_by(owner):
+        waited = lock.acquire(holder, owner)
+    else:
+        owner = object()
+        waited = await _acquire_async(lock, holder, owner)
+    token = _session_owner.set(owner)
+    try:
+        _session_started(lock, holder, app, waited)
+        yield waited
+    finally:
+        _session_owner.reset(token)
+        lock.release(owner)
+
+
+class GuiActionRegistry:
+    """Mixin of the app agents' action registries that holds the GUI lock around GUI-bound actions.
+
+    Subclasses set ``holder``, the agent name the lock is held for, and
+    ``app_name``, the attribute of their context holding the app whose
+    ``<app_name>_app`` is brought back to the front; they call
+    :meth:`init_gui_actions` from ``__init__`` and :meth:`register_gui_action`
+    for each registered action.
+    """
+
+    holder: str
+    app_name: str
+
+    def init_gui_actions(self) -> None:
+        # Actions that drive the desktop and must hold the GUI lock; the others only touch files.
+        self.gui_actions: set[str] = set()
+        # How each action affects the captured screen state, see macosagent.agents.batching.
+        self.action_effects: dict[str, str] = {}
+
+    @staticmethod
+    def action_effect(gui_bound: bool, effect: str | None = None) -> str:
+        """Check ``effect``, which defaults to ``"gui"``, or ``"static"`` for actions that are not GUI-bound."""
+        from macosagent.agents.batching import EFFECTS, default_effect
+
+        effect = effect or default_effect(gui_bound)
+        if effect not in EFFECTS:
+            raise ValueError(f"Unknown action effect {effect!r}, expected one of {EFFECTS}")
+        return effect
+
+    def register_gui_action(self, name: str, gui_bound: bool, effect: str) -> None:
+        if gui_bound:
+            self.gui_actions.add(name)
+        else:
+            self.gui_actions.discard(name)
+        self.action_effects[name] = effect
+
+    def session(self, context: Any) -> AbstractAsyncContextManager[float]:
+        """GUI lock session of the GUI-bound actions of this agent."""
+        app = getattr(context, self.app_name)
+        return async_gui_session(self.holder, getattr(app, f"{self.app_name}_app", None))
+
+    def action_session(self, action_name: str, context: Any) -> AbstractAsyncContextManager:
+        """Session to run ``action_name`` in.
+
+        File-bound actions run without the GUI lock, alongside other agents' GUI work.
+        """
+        if action_name in self.gui_actions:
+            return self.session(context)
+        return nullcontext()
+
+
+def is_gui_bound(tool: Tool) -> bool:
+    """Whether ``tool`` must run on the GUI worker, holding the GUI lock for the whole call."""
+    spec = getattr(tool, "spec", None)
+    if spec is None:
+        return True
+    return spec.gui_bound and not spec.locks_per_action
+
+
+class DispatchSession:
+    """Background app agent calls started by one orchestrator, addressed by handle."""
+
+    def __init__(self, tools: list[Tool], scheduler: ToolScheduler | None = None):
+        self.tools = {tool.name: tool for tool in tools}
+        self.scheduler = scheduler or get_scheduler()
+        self.futures: dict[str, Future] = {}
+        self._counter = itertools.count(1)
+
+    def submit(self, agent_name: str, arguments: dict[str, Any]) -> str:
+        if agent_name not in self.tools:
+            raise ValueError(f"Unknown agent '{agent_name}'. Available agents: {', '.join(self.tools)}")
+        tool = self.tools[agent_name]
+        handle = f"{agent_name}#{next(self._counter)}"
+        self.futures[handle] = self.scheduler.submit(tool, gui_bound=is_gui_bound(tool), **arguments)
+        logger.info(f"Submitted {handle} ({'gui' if is_gui_bound(tool) else 'parallel'}): {arguments}")
+        return handle
+
+    def gather(self, handles: list[str]) -> list[Any]:
+        results = []
+        for handle in handles:
+            future = self.futures.pop(handle, None)
+            if future is None:
+                results.append(f"Error: unknown or already gathered handle '{handle}'")
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"{handle} failed: {e}")
+                results.append(f"Error in {handle}: {type(e).__name__}: {e}")
+        return results
+
+
+class SubmitAgentTask(Tool):
+    name = "submit_agent_task"
+    description = (
+        "Start an app agent call in the background and return a handle immediately. "
+        "Use it to overlap independent subtasks, then wait for them with gather_agent_results. "
+        "Agents take turns on the desktop for clicks and typing; file and browser work runs alongside."
+    )
+    inputs = {
+        "agent_name": {"description": "Name of the app agent tool to call, e.g. 'browser_use'", "type": "string"},
+        "arguments": {"description": "Keyword arguments of the agent call, e.g. {'instruction': '...'}", "type": "object"},
+    }
+    output_type = "string"
+
+    def __init__(self, session: DispatchSession):
+        self.session = session
+        super().__init__()
+
+    def forward(self, agent_name: str, arguments: dict) -> str:
+        return self.session.submit(agent_name, arguments)
+
+
+class GatherAgentResults(Tool):
+    name = "gather_agent_results"
+    description = (
+        "Wait for app agent calls started with submit_agent_task and return their results, "
+        "in the order of the given handles. A failed call yields a string starting with 'Error'."
+    )
+    inputs = {
+        "handles": {"description": "Handles returned by submit_agent_task", "type": "array"},
+    }
+    output_type = "array"
+
+    def __init__(self, session: DispatchSession):
+        self.session = session
+        super().__init__()
+
+    def forward(self, handles: list) -> list:
+        return self.session.gather(handles)
+
+
+def create_dispatch_tools(tools: list[Tool]) -> list[Tool]:
+    """Build the submit/gather tools for an orchestrator using ``tools``."""
+    session = DispatchSession(tools)
+    return [SubmitAgentTask(session), GatherAgentResults(session)]
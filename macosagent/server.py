@@ -0,0 +1,275 @@
+"""Long-lived ``macosagent serve`` daemon and its ``submit`` client.
+
+The daemon builds the orchestrator once and keeps it, its LLM client and the
+app agents it has already loaded warm between tasks. Clients connect to a Unix
+socket, send one task per connection as a JSON line (same schema as
+``examples/tasks/*.json``) and receive progress as a stream of JSON lines:
+
+    {"event": "accepted", "run_id": ..., "queue_position": 0}
+    {"event": "step", "run_id": ..., "step": 1, "duration": 3.2, "observations": ...}
+    {"event": "result", "run_id": ..., "result": ..., "latency": 41.7, "queue_wait": 0.0, "usage": {...}}
+
+A ``{"command": "status"}`` line returns the daemon status instead of running
+a task. Tasks run one at a time since app agents drive the shared desktop.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from smolagents.memory import ActionStep, MemoryStep
+
+from macosagent.artifacts import get_artifact_writer
+from macosagent.llm import configured_tiers, get_llm_pool
+from macosagent.llm.cache import get_llm_cache
+from macosagent.llm.ratelimit import get_rate_limiter
+from macosagent.llm.tracing import get_tracer, trace_with_metadata
+from macosagent.metrics import get_metrics, metric_context
+from macosagent.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.getenv("MACOSAGENT_SOCKET", "/tmp/macosagent.sock")
+
+
+def _step_duration(step: Any) -> float | None:
+    timing = getattr(step, "timing", None)
+    if timing is not None and getattr(timing, "duration", None) is not None:
+        return timing.duration
+    return getattr(step, "duration", None)
+
+
+def _truncate(value: Any, limit: int = 2000) -> str | None:
+    if value is None:
+        return None
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class AgentDaemon:
+    """Owns the warm orchestrator and runs submitted tasks one at a time."""
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], Any] | None = None,
+        preload: bool = False,
+        metrics_dir: str | None = None,
+    ):
+        if agent_factory is None:
+            from macosagent.macosagent import create_agent
+
+            agent_factory = create_agent
+        start_time = time.perf_counter()
+        self.agent = agent_factory()
+        self.startup_duration = time.perf_counter() - start_time
+        self.metrics_dir = metrics_dir
+        if preload:
+            self.preload_tools()
+        self.run_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies: list[float] = []
+        self.started_at = time.time()
+
+    def preload_tools(self) -> None:
+        """Import and build every lazily registered app agent up front."""
+        for tool in self.agent.tools.values():
+            if hasattr(tool, "is_loaded") and not tool.is_loaded:
+                tool.setup()
+
+    def status(self) -> dict[str, Any]:
+        with self.stats_lock:
+            latencies = self.latencies
+            return {
+                "event": "status",
+                "uptime": time.time() - self.started_at,
+                "startup_duration": self.startup_duration,
+                "completed": self.completed,
+                "failed": self.failed,
+                "waiting": self.waiting,
+                "busy": self.run_lock.locked(),
+                "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+                "gui_lock": get_scheduler().gui_lock.stats.to_dict(),
+                "llm_tiers": configured_tiers(),
+                "llm_connections": get_llm_pool().stats.to_dict(),
+                "llm_cache": cache.info() if (cache := get_llm_cache()) is not None else None,
+                "llm_rate_limit": get_rate_limiter(get_llm_pool().max_connections).info(),
+                "tracing": tracer.info() if (tracer := get_tracer()) is not None else None,
+                "artifacts": get_artifact_writer().info(),
+                "loaded_tools": [
+                    name for name, tool in self.agent.tools.items() if getattr(tool, "is_loaded", True)
+                ],
+            }
+
+    def run_task(self, task: str, run_id: str) -> Iterator[dict[str, Any]]:
+        """Run one task and yield progress events, ending with a result or error event."""
+        submitted = time.perf_counter()
+        with self.stats_lock:
+            queue_position = self.waiting + (1 if self.run_lock.locked() else 0)
+            self.waiting += 1
+        try:
+            yield {"event": "accepted", "run_id": run_id, "queue_position": queue_position}
+            self.run_lock.acquire()
+        finally:
+            with self.stats_lock:
+                self.waiting -= 1
+
+        try:
+            started = time.perf_counter()
+            queue_wait = started - submitted
+            logger.info(f"Running task {run_id} after {queue_wait:.2f}s in queue: {task}")
+            events: list[dict[str, Any]] = []
+
+            @trace_with_metadata(custom_id=run_id, name="macosagent")
+            def run_agent(task):
+                final_output = None
+                for step in self.agent.run(task, stream=True, reset=True):
+                    if isinstance(step, ActionStep):
+                        events.append({
+                            "event": "step",
+                            "run_id": run_id,
+                            "step": step.step_number,
+                            "duration": _step_duration(step),
+                            "observations": _truncate(step.observations),
+                            "error": _truncate(step.error),
+                        })
+                    elif hasattr(step, "output") and isinstance(step, MemoryStep):
+                        final_output = step.output
+                    elif not isinstance(step, MemoryStep) and not type(step).__name__.endswith("StreamDelta"):
+                        # Older smolagents yield the final answer itself as the last item.
+                        final_output = step
+                return final_output
+
+            # The agent runs in a worker thread so that step events can be streamed while it works.
+            outcome: dict[str, Any] = {}
+
+            def target():
+                with metric_context(run_id=run_id):
+                    try:
+                        outcome["result"] = run_agent(task)
+                    except Exception as e:  # noqa: BLE001
+                        logger.exception(f"Task {run_id} failed")
+                        outcome["error"] = f"{type(e).__name__}: {e}"
+
+            worker = threading.Thread(target=target, name=f"macosagent-task-{run_id}", daemon=True)
+            worker.start()
+            sent = 0
+            try:
+                while worker.is_alive() or sent < len(events):
+                    worker.join(timeout=0.2)
+                    while sent < len(events):
+                        yield events[sent]
+                        sent += 1
+            finally:
+                # Keep the desktop locked until the task is over, and count it, even if the client went away.
+                worker.join()
+                latency = time.perf_counter() - started
+                with self.stats_lock:
+                    self.latencies.append(latency)
+                    if "error" in outcome:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+                logger.info(f"Task {run_id} finished in {latency:.2f}s")
+                if self.metrics_dir is not None:
+                    get_metrics().export(self.metrics_dir, run_id)
+
+            usage = get_metrics().run_summary(run_id)["total"]
+            if "error" in outcome:
+                yield {
+                    "event": "error",
+                    "run_id": run_id,
+                    "error": outcome["error"],
+                    "latency": latency,
+                    "queue_wait": queue_wait,
+                    "usage": usage,
+                }
+            else:
+                yield {
+                    "event": "result",
+                    "run_id": run_id,
+                    "result": _truncate(outcome.get("result"), limit=100_000),
+                    "latency": latency,
+                    "queue_wait": queue_wait,
+                    "usage": usage,
+                }
+        finally:
+            self.run_lock.release()
+
+
+class _TaskRequestHandler(socketserver.StreamRequestHandler):
+    server: "AgentServer"
+
+    def _send(self, event: dict[str, Any]) -> None:
+        self.wfile.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            self._send({"event": "error", "error": f"Invalid request: {e}"})
+            return
+        if request.get("command") == "status":
+            self._send(self.server.agent_daemon.status())
+            return
+        task = request.get("task")
+        if not isinstance(task, str) or not task:
+            self._send({"event": "error", "error": "Request must contain a non-empty 'task'"})
+            return
+        run_id = request.get("run_id") or str(uuid.uuid4())
+        try:
+            for event in self.server.agent_daemon.run_task(task, run_id):
+                self._send(event)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"Client disconnected while task {run_id} was running")
+
+
+class AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, daemon: AgentDaemon):
+        self.agent_daemon = daemon
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _TaskRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH, preload: bool = False, metrics_dir: str | None = None) -> None:
+    """Build the warm daemon and serve tasks on ``socket_path`` until interrupted.
+
+    Metrics are exported to ``metrics_dir`` after each task, if given.
+    """
+    daemon = AgentDaemon(preload=preload, metrics_dir=metrics_dir)
+    logger.info(f"MacOS Agent daemon ready in {daemon.startup_duration:.2f}s on {socket_path}")
+    with AgentServer(socket_path, daemon) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("MacOS Agent daemon shutting down")
+
+
+def submit(request: dict[str, Any], socket_path: str = DEFAULT_SOCKET_PATH) -> Iterator[dict[str, Any]]:
+    """Send one request to the daemon and yield the events it streams back."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        with client.makefile("r", encoding="utf-8") as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,50 @@
+"""Record the prompts of a two-step run of every app agent into ``react_replay.json``.
+
+The fixture was recorded from the tree before the per-app ReactJsonAgent copies
+were replaced by the shared engine, and is not edited by hand afterwards::
+
+    git worktree add /tmp/base c862981^
+    LANG=en_US.UTF-8 python tests/data/record_react_replay.py /tmp/base tests/data/react_replay.json
+
+Intended prompt changes since then are listed in ``react_replay_changes.json``.
+"""
+
+import inspect
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path[:0] = [sys.argv[1], str(Path(__file__).resolve().parents[1])]
+
+from langchain_core.messages import messages_to_dict  # noqa: E402
+from react_fakes import APPS, FakeLLM, FrozenDatetime, forget_app, import_service  # noqa: E402
+
+from macosagent import artifacts  # noqa: E402
+
+
+def record(app: str) -> dict:
+    service = import_service(app)
+    service.create_llm_engine = lambda tier: None
+    service.datetime = FrozenDatetime
+    # The old agents assign ``self.system_prompt``, a read-only property of newer smolagents.
+    agent_class = type("ReactJsonAgent", (service.ReactJsonAgent,), {"system_prompt": None})
+    llm, final = FakeLLM(), []
+    agent = agent_class(llm=llm)
+    agent.stream_actions = False
+    agent.llm_engine = lambda prompt: final.append(prompt) or "answer"
+    assert agent.run("Click OK") == "answer"
+    forget_app(app)
+    context = getattr(agent, f"{app}_context")
+    return {
+        "max_iterations": inspect.signature(service.ReactJsonAgent).parameters["max_iterations"].default,
+        "apps": {name: {"config": opened.config, "activated": opened.activated} for name, opened in vars(context).items()},
+        "prompts": [messages_to_dict(prompt) for prompt in llm.prompts],
+        "final_prompt": [{"role": message["role"].value, "content": message["content"]} for message in final[0]],
+    }
+
+
+if __name__ == "__main__":
+    artifacts._writer = artifacts.ArtifactWriter(tempfile.mkdtemp(), level="none")
+    with open(sys.argv[2], "w") as f:
+        json.dump({app: record(app) for app in APPS}, f, indent=1, ensure_ascii=False)
@@ -0,0 +1,154 @@
+"""Fake apps, controller and LLM of the ReAct app agent replay test.
+
+Kept free of ``macosagent`` imports so that ``tests/data/record_react_replay.py``
+can record the prompts with them from any tree of the repository.
+"""
+
+import sys
+import types
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any
+
+from langchain_core.messages import AIMessage
+from PIL import Image
+from pydantic import BaseModel, create_model
+
+APPS = ("calendar", "excel", "player", "powerpoint", "preview", "wechat", "word")
+
+STEPS = [
+    {"current_state": {"evaluation_previous_goal": "Unknown", "memory": "Started", "next_goal": "Click OK"}, "action": [{"click_element": {"index": 0}}]},
+    {"current_state": {"evaluation_previous_goal": "Success", "memory": "Clicked OK", "next_goal": "Finish"}, "action": [{"done": {"text": "ok"}}]},
+]
+
+
+class CurrentState(BaseModel):
+    evaluation_previous_goal: str
+    memory: str
+    next_goal: str
+
+
+class AgentOutput(BaseModel):
+    current_state: CurrentState
+    action: list[Any]
+
+    @staticmethod
+    def type_with_custom_actions(action_model: type[BaseModel]) -> type[BaseModel]:
+        return create_model("AgentOutput", __base__=AgentOutput, action=(list[action_model], ...))
+
+
+@dataclass
+class ActionResult:
+    is_done: bool = False
+    extracted_content: str | None = None
+    error: str | None = None
+    include_in_memory: bool = True
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.registry = SimpleNamespace(actions={"click_element": "Click the element", "done": "Finish the task"})
+
+    def create_action_model(self) -> type[BaseModel]:
+        return create_model("ActionModel", **{name: (dict | None, None) for name in self.registry.actions})
+
+    def get_prompt_description(self) -> str:
+        return "\n".join(f"{name}: {description}" for name, description in self.registry.actions.items())
+
+
+class FakeController:
+    def __init__(self):
+        self.registry = FakeRegistry()
+
+    async def act(self, action, context) -> ActionResult:
+        name, params = next(iter(action.model_dump(exclude_unset=True).items()))
+        return ActionResult(is_done=name == "done", extracted_content=f"{name} {params}")
+
+
+class FakeApp:
+    def __init__(self, config=None):
+        self.config = config
+        self.activated = 0
+
+    def activate(self):
+        self.activated += 1
+
+
+class FakeContext:
+    def __init__(self, **apps):
+        self.__dict__.update(apps)
+
+    def get_state(self):
+        return SimpleNamespace(screenshots_som=[Image.new("RGB", (64, 48), "white")])
+
+    def get_accessibility_tree_prompt(self):
+        return "[0]<AXButton title='OK'>", [{"index": 0, "role": "AXButton"}]
+
+
+class FakeLLM:
+    model_name = "gpt-4o"
+
+    def __init__(self):
+        self.prompts = []
+
+    def with_structured_output(self, schema, include_raw, method):
+        self.schema = schema
+        return self
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        args = STEPS[len(self.prompts) - 1]
+        raw = AIMessage(content="", tool_calls=[{"name": "AgentOutput", "args": args, "id": f"call_{len(self.prompts)}", "type": "tool_call"}])
+        return {"raw": raw, "parsed": self.schema.model_validate(args)}
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 1, 2, 3, 4)
+
+
+def _app_classes(app: str) -> dict[str, dict[str, Any]]:
+    """Modules of ``app`` that open the real app, mapped to the names the agent imports from them."""
+    title = {"powerpoint": "PowerPoint"}.get(app, app.capitalize())
+    package = f"macosagent.agents.{app}_agent"
+    app_names = {title: FakeApp, f"{title}Config": lambda **kwargs: kwargs}
+    context_names = {f"{title}Context": FakeContext}
+    modules = {
+        f"{package}.agent.views": {"ActionModel": BaseModel, "ActionResult": ActionResult, "AgentOutput": AgentOutput},
+        f"{package}.controller": {"Controller": FakeController},
+    }
+    if app == "calendar":
+        modules[f"{package}.calendar"] = {**app_names, **context_names}
+    elif app in ("player", "wechat"):
+        modules[f"{package}.{app}"] = {}
+        modules[f"{package}.{app}.{app}"] = app_names
+        modules[f"{package}.{app}.context"] = context_names
+    else:
+        modules[f"{package}.{app}"] = app_names
+        modules[f"{package}.{app}.context"] = context_names
+    return modules
+
+
+def fake_app_modules(app: str) -> dict[str, types.ModuleType]:
+    modules = {}
+    for name, attributes in _app_classes(app).items():
+        module = types.ModuleType(name)
+        module.__path__ = []
+        module.__dict__.update(attributes)
+        modules[name] = module
+    return modules
+
+
+def import_service(app: str) -> types.ModuleType:
+    """Import the agent service of ``app`` with its app modules faked; call :func:`forget_app` afterwards."""
+    forget_app(app)
+    sys.modules.update(fake_app_modules(app))
+    return __import__(f"macosagent.agents.{app}_agent.agent.service", fromlist=["ReactJsonAgent"])
+
+
+def forget_app(app: str) -> None:
+    prefix = f"macosagent.agents.{app}_agent"
+    for name in [name for name in sys.modules if name == prefix or name.startswith(prefix + ".")]:
+        del sys.modules[name]
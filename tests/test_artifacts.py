@@ -0,0 +1,82 @@
+import gzip
+import json
+import threading
+from types import SimpleNamespace
+
+from macosagent.artifacts import ArtifactWriter
+from macosagent.metrics import metric_context
+
+
+def screenshot(data: bytes) -> SimpleNamespace:
+    return SimpleNamespace(data=data, extension="jpg")
+
+
+def test_steps_are_indexed_and_images_stored_once(tmp_path):
+    writer = ArtifactWriter(tmp_path, compress=True)
+    with metric_context(run_id="run-1"), writer.open_run("excel_agent") as run:
+        for _ in range(2):
+            run.write_step(lambda f: f.write("hello"), screenshot(b"jpeg"), [{"role": "AXButton"}, {"role": "AXCell"}])
+    writer.flush()
+    directory = tmp_path / "run-1" / "excel_agent_1"
+    steps = [json.loads(line) for line in (directory / "steps.jsonl").read_text().splitlines()]
+    assert [step["step"] for step in steps] == [1, 2]
+    assert steps[0]["screenshot"] == steps[1]["screenshot"] and writer.stats.images_deduplicated == 1
+    assert len(list((tmp_path / "run-1" / "images").iterdir())) == 1
+    assert gzip.decompress((directory / steps[1]["conversation"]).read_bytes()) == b"hello"
+    tree = gzip.decompress((directory / steps[1]["tree"]).read_bytes()).decode().splitlines()
+    assert tree == ['{"role":"AXButton"}', '{"role":"AXCell"}']
+    writer.close()
+
+
+def test_light_level_writes_only_conversations(tmp_path):
+    writer = ArtifactWriter(tmp_path, level="light")
+    with metric_context(run_id="run-1"), writer.open_run("excel_agent") as run:
+        run.write_step(lambda f: f.write("hello"), screenshot(b"jpeg"), [])
+    writer.flush()
+    assert sorted(path.name for path in tmp_path.rglob("*") if path.is_file()) == ["0001.txt", "steps.jsonl"]
+    writer.close()
+
+
+def test_none_level_writes_nothing(tmp_path):
+    writer = ArtifactWriter(tmp_path / "results", level="none")
+    with writer.open_run("excel_agent") as run:
+        run.write_step(lambda f: f.write("hello"))
+    assert not (tmp_path / "results").exists()
+
+
+def test_full_queue_drops_and_old_runs_are_pruned(tmp_path):
+    writer = ArtifactWriter(tmp_path, max_queue=1, max_runs=2)
+    release = threading.Event()
+    with metric_context(run_id="run-0"), writer.open_run("excel_agent") as run:
+        run.write_step(lambda f: release.wait(5))
+        # The writer thread may not have taken the slow step yet; fill the queue either way.
+        while writer.stats.dropped == 0:
+            run.write_step(lambda f: f.write("hello"))
+        release.set()
+    for number in (1, 2):
+        writer.flush()
+        with metric_context(run_id=f"run-{number}"), writer.open_run("excel_agent") as run:
+            run.write_step(lambda f: f.write("hello"))
+    writer.flush()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run-1", "run-2"]
+    assert writer.stats.runs_deleted == 1
+    writer.close()
+
+
+def test_pruning_keeps_open_runs_and_other_directories(tmp_path):
+    writer = ArtifactWriter(tmp_path, max_runs=1)
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "notes" / "todo.txt").write_text("keep")
+    with metric_context(run_id="run-long"), writer.open_run("word_agent") as long_run:
+        long_run.write_step(lambda f: f.write("hello"))
+        for number in (1, 2):
+            with metric_context(run_id=f"run-{number}"), writer.open_run("excel_agent") as run:
+                run.write_step(lambda f: f.write("hello"))
+            writer.flush()
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["notes", "run-2", "run-long"]
+        # Still running: its last step is newer than run-2, though its directory was created first.
+        long_run.write_step(lambda f: f.write("hello"))
+    writer.flush()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["notes", "run-long"]
+    assert writer.stats.runs_deleted == 2
+    writer.close()
@@ -0,0 +1,113 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from macosagent import batch
+from macosagent.batch import BatchRunner, BatchSummary, BatchTask, format_summary, load_completed_ids, load_tasks, percentile
+from macosagent.metrics import MetricsRegistry
+
+EXAMPLES = Path(__file__).parents[1] / "examples" / "tasks"
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = MetricsRegistry()
+    monkeypatch.setattr(batch, "get_metrics", lambda: metrics)
+    return metrics
+
+
+def read_results(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_tasks_load_from_files_and_jsonl(tmp_path):
+    (tmp_path / "b.json").write_text(json.dumps({"task": "search", "agents": ["browser_agent"]}))
+    (tmp_path / "a.json").write_text(json.dumps({"task": "click", "id": "first"}))
+    jsonl = tmp_path / "more.jsonl"
+    jsonl.write_text('{"task": "plan", "gui": false}\n\n{"task": "search and note", "agents": ["browser_agent", "notes_agent"]}\n')
+
+    assert load_tasks(tmp_path) == [BatchTask("first", "click", gui=True), BatchTask("b", "search", gui=False)]
+    # Unknown agents are assumed to drive the desktop.
+    assert load_tasks(jsonl) == [BatchTask("more:1", "plan", gui=False), BatchTask("more:3", "search and note", gui=True)]
+    assert [task.gui for task in load_tasks(EXAMPLES)] == [False] + [True] * 8
+
+
+def test_rerun_skips_completed_tasks(tmp_path):
+    results = tmp_path / "results.jsonl"
+    results.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "c", "sta')
+    assert load_completed_ids(results) == {"a"}
+
+    ran = []
+    runner = BatchRunner(results, run_task=lambda task: ran.append(task) or task.upper())
+    tasks = [BatchTask(name, f"task {name}", gui=False) for name in "abc"]
+    summary = runner.run(tasks)
+    assert sorted(ran) == ["task b", "task c"]
+    assert (summary.total, summary.skipped, summary.completed, summary.failed) == (3, 1, 2, 0)
+    assert load_completed_ids(results) == {"a", "b", "c"}
+    assert runner.run(tasks).skipped == 3
+
+
+def test_gui_tasks_run_one_at_a_time_next_to_the_pool(tmp_path):
+    both_running = threading.Barrier(2, timeout=5)
+    gui_running, gui_overlap, threads = [], [], {}
+
+    def run_task(task):
+        threads[task] = threading.current_thread().name
+        if task.startswith("gui"):
+            gui_running.append(task)
+            gui_overlap.append(len(gui_running))
+            if task == "gui 1":
+                both_running.wait()
+            gui_running.remove(task)
+        elif task == "web 1":
+            # Non-GUI tasks run while a GUI task holds the desktop.
+            both_running.wait()
+        if task == "web 2":
+            raise RuntimeError("no network")
+        return "done"
+
+    tasks = [BatchTask("g1", "gui 1"), BatchTask("g2", "gui 2"), BatchTask("w1", "web 1", gui=False), BatchTask("w2", "web 2", gui=False)]
+    summary = BatchRunner(tmp_path / "results.jsonl", concurrency=2, run_task=run_task).run(tasks)
+    assert (summary.completed, summary.failed) == (3, 1)
+    assert gui_overlap == [1, 1]
+    assert {threads["gui 1"], threads["gui 2"]} == {"batch-gui_0"}
+    assert all(threads[task].startswith("batch_") for task in ("web 1", "web 2"))
+    failed = [record for record in read_results(tmp_path / "results.jsonl") if record["status"] == "error"]
+    assert [(record["id"], record["error"]) for record in failed] == [("w2", "RuntimeError: no network")]
+
+
+def test_bookkeeping_errors_do_not_stop_the_batch(tmp_path, metrics, monkeypatch):
+    results = tmp_path / "results.jsonl"
+
+    def broken_export(metrics_dir, run_id):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(metrics, "export", broken_export)
+    runner = BatchRunner(results, run_task=str.upper, metrics_dir=tmp_path / "metrics")
+    summary = runner.run([BatchTask("a", "one", gui=False)])
+    # The task is still recorded, so a rerun skips it.
+    assert (summary.completed, summary.failed) == (1, 0)
+    assert load_completed_ids(results) == {"a"}
+
+    def broken_append(record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(runner, "_append", broken_append)
+    summary = runner.run([BatchTask("b", "two", gui=False), BatchTask("c", "three")])
+    assert (summary.skipped, summary.completed, summary.failed) == (0, 0, 2)
+
+
+def test_summary_reports_percentiles():
+    assert percentile([], 50) is None
+    assert percentile([3.0, 1.0, 2.0, 4.0], 50) == 2.0
+    assert percentile([3.0, 1.0, 2.0, 4.0], 95) == 4.0
+
+    summary = BatchSummary(total=3, skipped=1, completed=1, failed=1, wall_time=7.2, durations=[1.0, 3.0])
+    assert format_summary(summary) == (
+        "tasks: 3 (skipped 1, completed 1, failed 1)\n"
+        + "wall time: 7.20s, throughput: 1000.0 tasks/hour\n"
+        + "latency p50: 1.00s, p95: 3.00s, time spent waiting for the GUI lock: 0.00s"
+    )
+    assert "latency p50: n/a, p95: n/a" in format_summary(BatchSummary())
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from pydantic import BaseModel, create_model
+
+from macosagent.agents.batching import ActionBatch, SkippedAction, settle
+
+EFFECTS = {"input_text": "input", "click_element": "gui", "open_app": "layout", "extract": "static"}
+ActionModel = create_model("ActionModel", **{name: (dict | None, None) for name in EFFECTS})
+
+
+def actions(*names: str) -> list[BaseModel]:
+    return [ActionModel(**{name: {}}) for name in names]
+
+
+def run(batch: ActionBatch, names: list[str], settle_seconds: float = 0.0) -> list:
+    async def act(action):
+        name = next(iter(action.model_dump(exclude_unset=True)))
+        if settle_seconds:
+            await asyncio.to_thread(settle, settle_seconds)
+        return name
+
+    return asyncio.run(batch.run(actions(*names), act))
+
+
+def test_consecutive_inputs_share_one_session_and_settle_wait():
+    sessions = []
+
+    @asynccontextmanager
+    async def session():
+        sessions.append("enter")
+        yield
+        sessions.append("exit")
+
+    batch = ActionBatch(EFFECTS, session=session)
+    start = time.monotonic()
+    assert run(batch, ["input_text", "input_text", "input_text"], settle_seconds=0.2) == ["input_text"] * 3
+    assert time.monotonic() - start < 0.5
+    assert sessions == ["enter", "exit"]
+    assert batch.settle_saved > 0.3
+
+
+def test_layout_change_stops_the_batch():
+    batch = ActionBatch(EFFECTS)
+    results = run(batch, ["click_element", "open_app", "input_text", "click_element"])
+    assert results[:2] == ["click_element", "open_app"]
+    assert all(isinstance(result, SkippedAction) for result in results[2:])
+    assert batch.skipped == ["input_text", "click_element"]
+    assert "open_app changed the layout" in results[2].extracted_content
+
+
+def test_static_actions_leave_the_state_valid():
+    batch = ActionBatch(EFFECTS)
+    run(batch, ["extract", "extract"])
+    assert not batch.touched_screen
+    run(batch, ["click_element"])
+    assert batch.touched_screen
@@ -0,0 +1,68 @@
+import threading
+
+from smolagents.memory import ActionStep
+
+from macosagent.server import AgentDaemon
+
+
+def action_step(number: int) -> ActionStep:
+    # The ActionStep constructor differs between smolagents versions; the daemon only reads these fields.
+    step = ActionStep.__new__(ActionStep)
+    step.step_number, step.observations, step.error = number, f"step {number}", None
+    return step
+
+
+class StubAgent:
+    """Orchestrator whose runs wait for ``release`` after their first step."""
+
+    def __init__(self):
+        self.tools = {}
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def run(self, task, stream, reset):
+        yield action_step(1)
+        self.started.set()
+        self.release.wait(5)
+        yield f"done: {task}"
+
+
+def test_tasks_queue_behind_the_running_one():
+    daemon = AgentDaemon(agent_factory=StubAgent)
+    first = daemon.run_task("first", "run-1")
+    assert next(first)["queue_position"] == 0
+    assert next(first)["event"] == "step"
+
+    second_events = []
+    second = daemon.run_task("second", "run-2")
+    second_events.append(next(second))
+    worker = threading.Thread(target=lambda: second_events.extend(second))
+    worker.start()
+    assert second_events[0]["queue_position"] == 1
+    status = daemon.status()
+    assert status["busy"] and status["waiting"] == 1
+
+    daemon.agent.release.set()
+    assert list(first)[-1]["result"] == "done: first"
+    worker.join(5)
+    assert [event["event"] for event in second_events] == ["accepted", "step", "result"]
+    assert second_events[-1]["result"] == "done: second"
+    status = daemon.status()
+    assert (status["completed"], status["waiting"], status["busy"]) == (2, 0, False)
+
+
+def test_task_is_counted_when_the_client_disconnects():
+    daemon = AgentDaemon(agent_factory=StubAgent)
+    gone = daemon.run_task("gone", "run-1")
+    next(gone)
+    gone.close()
+    assert daemon.waiting == 0 and not daemon.run_lock.locked()
+
+    task = daemon.run_task("task", "run-2")
+    next(task)
+    assert next(task)["event"] == "step"
+    daemon.agent.release.set()
+    # Closing the stream waits for the task to finish and records it.
+    task.close()
+    assert daemon.completed == 1 and len(daemon.latencies) == 1
+    assert not daemon.run_lock.locked()
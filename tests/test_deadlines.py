@@ -0,0 +1,58 @@
+import asyncio
+import sys
+import time
+
+import pytest
+from pydantic import create_model
+
+from macosagent.agents.batching import ActionBatch, SkippedAction, TimedOutAction
+from macosagent.agents.pipeline import StepLoop
+from macosagent.deadlines import PhaseTimeout, Timeouts, deadline_scope, run_command
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(5)"]
+
+
+def test_run_command_kills_the_process_at_the_deadline():
+    assert run_command([sys.executable, "-c", "print('ok')"], capture_output=True, text=True).stdout == "ok\n"
+    start = time.monotonic()
+    with deadline_scope("capture", 0.2), pytest.raises(PhaseTimeout) as error:
+        run_command(SLEEP)
+    assert time.monotonic() - start < 2
+    assert error.value.phase == "capture"
+
+
+def test_step_loop_call_times_out_and_cancels_its_subprocess():
+    with StepLoop() as loop:
+        start = time.monotonic()
+        with pytest.raises(PhaseTimeout) as error:
+            loop.run(loop.call("capture", run_command, SLEEP, timeout=0.2))
+    # The subprocess was killed, so closing the loop did not wait for it either.
+    assert time.monotonic() - start < 2
+    assert error.value.to_dict() == {"phase": "capture", "seconds": 0.2}
+
+
+def test_the_run_deadline_bounds_the_phases():
+    with deadline_scope("run", 0.2), StepLoop() as loop, pytest.raises(PhaseTimeout) as error:
+        loop.run(loop.call("llm", time.sleep, 0.5, timeout=10))
+    assert error.value.phase == "run"
+
+
+def test_timed_out_action_stops_the_batch():
+    ActionModel = create_model("ActionModel", wait=(dict | None, None), click=(dict | None, None))
+
+    async def act(action):
+        await asyncio.sleep(1)
+
+    batch = ActionBatch({}, timeout=0.1)
+    results = asyncio.run(batch.run([ActionModel(wait={}), ActionModel(click={})], act))
+    assert isinstance(results[0], TimedOutAction)
+    assert "timed out after 0.1s" in results[0].error
+    assert isinstance(results[1], SkippedAction)
+    assert batch.timed_out == [{"action": "wait", "phase": "action", "seconds": 0.1}]
+
+
+def test_timeouts_from_env(monkeypatch):
+    monkeypatch.setenv("MACOSAGENT_RUN_TIMEOUT", "600")
+    monkeypatch.setenv("MACOSAGENT_TIMEOUT_ACTION_WORD_AGENT", "0")
+    assert Timeouts.from_env("word_agent") == Timeouts(run=600, capture=60, llm=300, action=None)
+    assert Timeouts.from_env("excel_agent").action == 300
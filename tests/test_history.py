@@ -0,0 +1,61 @@
+from langchain_core.messages import HumanMessage
+
+from macosagent.agents.history import MAX_SUMMARY_LINE_CHARS, StepHistory, TokenCounter, history_budget
+
+
+class CharCounter(TokenCounter):
+    def __init__(self):
+        super().__init__()
+        self.longest = 0
+
+    def count_text(self, text: str) -> int:
+        self.longest = max(self.longest, len(text))
+        return len(text)
+
+
+def _step(number: int) -> dict:
+    args = {
+        "current_state": {"memory": f"done {number} steps", "next_goal": f"goal {number}"},
+        "action": [{"click": {"index": number}}],
+    }
+    return {"tool_calls": [{"name": "AgentOutput", "args": args, "id": str(number)}], "observation": ["x" * 200]}
+
+
+def test_old_steps_are_summarized_within_the_budget():
+    history = StepHistory(budget_tokens=1200, keep_steps=2, counter=CharCounter())
+    for number in range(10):
+        history.append(_step(number))
+    assert len(history) == 10 and [step["tool_calls"][0]["id"] for step in history][0] == "0"
+    assert 0 < history.collapsed <= 8
+    assert history.verbatim_tokens() + history.summary_tokens() <= 1200
+    messages = history.messages()
+    summary = messages[0].content
+    assert summary.startswith(f"[Summary of steps 1-{history.collapsed}]")
+    assert f"Memory at step {history.collapsed}: done {history.collapsed - 1} steps" in summary
+    assert messages[-2].tool_call_id == "9"
+
+
+def test_summary_tokens_are_counted_once_per_line():
+    counter = CharCounter()
+    history = StepHistory(budget_tokens=4000, keep_steps=1, counter=counter)
+    for number in range(20):
+        history.append(_step(number))
+    # The summary as a whole was never tokenized while compacting.
+    assert counter.longest <= MAX_SUMMARY_LINE_CHARS + 1
+    summary = history.summary()
+    assert "omitted" in summary and summary.count("\nStep ") > 1
+    assert history.summary_tokens() == counter.count_message(HumanMessage(content=summary))
+
+
+def test_last_steps_stay_verbatim_over_the_budget():
+    history = StepHistory(budget_tokens=10, keep_steps=2, counter=CharCounter())
+    for number in range(3):
+        history.append(_step(number))
+    assert history.collapsed == 1 and len(history.messages()) == 1 + 2 * 3
+
+
+def test_per_agent_budget(monkeypatch):
+    monkeypatch.setenv("MACOSAGENT_HISTORY_TOKENS", "5000")
+    monkeypatch.setenv("MACOSAGENT_HISTORY_TOKENS_EXCEL_AGENT", "2000")
+    assert history_budget("excel_agent") == 2000
+    assert history_budget("word_agent") == 5000
@@ -0,0 +1,68 @@
+import random
+
+from PIL import Image, ImageDraw
+
+from macosagent.agents.imaging import ImagePolicy, ScreenDiffer
+
+
+def _screenshot() -> Image.Image:
+    image = Image.new("RGBA", (2880, 1800), "white")
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(0)
+    for index in range(300):
+        x, y = rng.randrange(2800), rng.randrange(1750)
+        draw.rectangle([x, y, x + 80, y + 30], outline="red")
+        draw.text((x + 3, y + 3), f"[{index}] Button", fill="black")
+    return image
+
+
+def test_screenshots_are_scaled_down_and_fit_the_byte_target():
+    image = _screenshot()
+    encoded = ImagePolicy().encode(image)
+    assert encoded.size == (1229, 768) and encoded.data_url.startswith("data:image/jpeg;base64,")
+
+    target_bytes = len(encoded.data) * 3 // 4
+    target = ImagePolicy(target_bytes=target_bytes).encode(image)
+    assert len(target.data) <= target_bytes and target.quality < 85
+
+    # Position-based actions keep the pixel coordinates of the screenshot.
+    assert ImagePolicy(format="png").encode(image, resize=False).size == (2880, 1800)
+
+
+def test_per_agent_overrides(monkeypatch):
+    monkeypatch.setenv("MACOSAGENT_IMAGE_FORMAT", "webp")
+    monkeypatch.setenv("MACOSAGENT_IMAGE_FORMAT_WORD_AGENT", "png")
+    monkeypatch.setenv("MACOSAGENT_IMAGE_GRAYSCALE_WORD_AGENT", "true")
+    assert ImagePolicy.from_env("excel_agent").format == "webp"
+    word = ImagePolicy.from_env("word_agent")
+    assert word.format == "png" and word.grayscale
+    assert ImagePolicy(max_edge=0, short_edge=0).fit((2880, 1800)) == (2880, 1800)
+
+
+def test_unchanged_and_partly_changed_screens_resend_the_last_frame():
+    differ = ScreenDiffer(enabled=True, max_reuse=2)
+    image = _screenshot()
+    changed = image.copy()
+    ImageDraw.Draw(changed).rectangle([100, 100, 300, 200], fill="blue")
+
+    full = differ.prepare(image)
+    assert full.kind == "full"
+    unchanged = differ.prepare(image)
+    assert unchanged.kind == "unchanged" and unchanged.image is None
+    # The model still sees the screen: the last frame, as encoded, follows the note.
+    assert unchanged.reference is full.image
+    assert [part["type"] for part in unchanged.content()] == ["text", "image_url"]
+    crop = differ.prepare(changed)
+    assert crop.kind == "crop" and crop.reference is full.image
+    assert [part["type"] for part in crop.content()] == ["text", "image_url", "image_url"]
+    # Coordinates of the crop in the 1229x768 frame sent with it.
+    assert crop.box == (36, 36, 101, 58) and crop.frame_size == (1229, 768)
+    # A full frame again after max_reuse partial ones.
+    assert differ.prepare(changed).kind == "full"
+    assert differ.stats.unchanged == 1 and differ.stats.crop == 1
+
+    differ.reset()
+    assert differ.prepare(changed).kind == "full"
+    # Diffing is off by default.
+    disabled = ScreenDiffer()
+    assert [disabled.prepare(image).kind for _ in range(2)] == ["full", "full"]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from macosagent.benchmarks.startup import parse_importtime
+
+# Total self import time allowed for the CLI hot path, override with MACOSAGENT_IMPORT_BUDGET_MS.
+IMPORT_BUDGET_MS = float(os.getenv("MACOSAGENT_IMPORT_BUDGET_MS", "2500"))
+
+# Modules only needed inside sub-agent actions; importing them at startup is a regression.
+DEFERRED_MODULES = [
+    "transformers",
+    "langchain_openai",
+    "docx2pdf",
+    "pdf2docx",
+    "openpyxl",
+    "pandas",
+    "matplotlib",
+    "moviepy",
+    "macosagent.agents.excel_agent",
+    "macosagent.agents.word_agent",
+    "macosagent.agents.player_agent",
+]
+
+
+def _importtime(*args: str) -> list:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert process.returncode == 0, process.stderr[-2000:]
+    return parse_importtime(process.stderr)
+
+
+@pytest.fixture(scope="module")
+def cli_imports():
+    pytest.importorskip("click")
+    pytest.importorskip("smolagents")
+    return _importtime("-m", "macosagent", "--help")
+
+
+@pytest.fixture(scope="module")
+def orchestrator_imports():
+    pytest.importorskip("smolagents")
+    return _importtime("-c", "import macosagent.cli, macosagent.macosagent")
+
+
+def test_cli_import_time_within_budget(cli_imports):
+    total_ms = sum(record.self_us for record in cli_imports) / 1000
+    assert total_ms <= IMPORT_BUDGET_MS, f"`macosagent --help` imports took {total_ms:.0f}ms > {IMPORT_BUDGET_MS:.0f}ms"
+
+
+def test_orchestrator_import_time_within_budget(orchestrator_imports):
+    total_ms = sum(record.self_us for record in orchestrator_imports) / 1000
+    assert total_ms <= IMPORT_BUDGET_MS, f"orchestrator imports took {total_ms:.0f}ms > {IMPORT_BUDGET_MS:.0f}ms"
+
+
+@pytest.mark.parametrize("module", DEFERRED_MODULES)
+def test_heavy_modules_are_deferred(orchestrator_imports, module):
+    imported = {record.name for record in orchestrator_imports}
+    assert module not in imported, f"{module} is imported before any sub-agent runs"
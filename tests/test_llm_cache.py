@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from macosagent.llm.cache import CachingTransport, LLMResponseCache, request_key  # noqa: E402
+
+URL = "https://llm.example.com/v1/chat/completions"
+
+
+def _body(text: str, image: bytes = b"pixels") -> bytes:
+    import base64
+
+    image_url = "data:image/png;base64," + base64.b64encode(image).decode()
+    return json.dumps({
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": text},
+            {"type": "image_url", "image_url": {"url": image_url}},
+        ]}],
+    }).encode()
+
+
+def test_key_masks_timestamps_and_hashes_images():
+    key = request_key("/v1/chat/completions", _body("step 1\nCurrent date and time: 2025-01-01 10:00\n"))
+    assert key == request_key("/v1/chat/completions", _body("step 1\nCurrent date and time: 2025-06-30 23:59\n"))
+    assert key != request_key("/v1/chat/completions", _body("step 2\nCurrent date and time: 2025-01-01 10:00\n"))
+    assert key != request_key("/v1/chat/completions", _body("step 1\n", image=b"other pixels"))
+    assert request_key("/v1/models", _body("step 1")) is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = LLMResponseCache(tmp_path, max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, {"value": key})
+    assert cache.get("a") == {"value": "a"}
+    cache.put("c", {"value": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats.evictions == 1
+    # A new instance restores the index from disk.
+    assert LLMResponseCache(tmp_path).info()["entries"] == 2
+
+
+def _client(tmp_path, mode, calls):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"answer": len(calls)})
+
+    cache = LLMResponseCache(tmp_path, mode=mode)
+    return httpx.Client(transport=CachingTransport(httpx.MockTransport(handler), cache)), cache
+
+
+def test_record_then_replay(tmp_path):
+    calls = []
+    client, cache = _client(tmp_path, "record", calls)
+    first = client.post(URL, content=_body("hello")).json()
+    assert client.post(URL, content=_body("hello")).json() == first
+    assert len(calls) == 1 and cache.stats.hit_rate == 0.5
+
+    replay_calls = []
+    client, cache = _client(tmp_path, "replay", replay_calls)
+    assert client.post(URL, content=_body("hello")).json() == first
+    assert client.post(URL, content=_body("unknown")).status_code == 404
+    assert replay_calls == []
+
+
+def test_passthrough_stores_nothing(tmp_path):
+    calls = []
+    client, cache = _client(tmp_path, "passthrough", calls)
+    client.post(URL, content=_body("hello"))
+    client.post(URL, content=_body("hello"))
+    assert len(calls) == 2 and cache.info()["entries"] == 0
@@ -0,0 +1,35 @@
+from macosagent.benchmarks.stub_server import LatencyModel, StubLLM, StubServer
+from macosagent.llm import llm
+
+
+def test_pool_settings_are_read_on_first_use(monkeypatch):
+    # Set after macosagent.llm was imported, as the CLI does when it loads .env.
+    monkeypatch.setattr(llm, "_pool", None)
+    monkeypatch.setenv("MACOSAGENT_LLM_MAX_CONNECTIONS", "3")
+    monkeypatch.setenv("MACOSAGENT_LLM_KEEPALIVE_EXPIRY", "5")
+    pool = llm.get_llm_pool()
+    assert (pool.max_connections, pool.keepalive_expiry, pool.http2) == (3, 5.0, False)
+    assert llm.get_llm_pool() is pool
+
+    monkeypatch.setattr(llm, "_pool", None)
+    monkeypatch.setenv("MACOSAGENT_LLM_WARMUP", "false")
+    llm.warm_up_llm_connections(background=False)
+    assert llm._pool is None
+
+
+def test_requests_reuse_the_connection_and_record_ttfb():
+    server = StubServer(StubLLM(latency=LatencyModel("fixed", (0.1,)))).start()
+    pool = llm.LLMClientPool(max_connections=2)
+    try:
+        url = f"{server.base_url}/chat/completions"
+        for _ in range(2):
+            response = pool.http_client.post(url, json={"messages": [{"role": "user", "content": "hi"}]})
+            assert response.status_code == 200
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+    stats = pool.stats.to_dict()
+    assert (stats["requests"], stats["new_connections"], stats["reused_connections"]) == (2, 1, 1)
+    # Time to first byte includes the simulated model latency.
+    assert 0.1 <= stats["ttfb_mean"] <= stats["ttfb_max"] < 5
@@ -0,0 +1,27 @@
+import pytest
+
+from macosagent.llm.llm import create_langchain_llm_client, resolve_tier_model
+
+
+def test_missing_tiers_follow_the_fallback_chain(monkeypatch):
+    for tier in ("FAST", "VISION", "PLANNER"):
+        monkeypatch.delenv(f"MACOSAGENT_LLM_TIER_{tier}", raising=False)
+    assert resolve_tier_model("planner", "gpt-4o") == "gpt-4o"
+    monkeypatch.setenv("MACOSAGENT_LLM_TIER_VISION", "gpt-4.1")
+    assert resolve_tier_model("planner", "gpt-4o") == "gpt-4.1"
+    assert resolve_tier_model("fast", "gpt-4o") == "gpt-4o"
+    monkeypatch.setenv("MACOSAGENT_LLM_TIER_FAST", "gpt-4o-mini")
+    assert resolve_tier_model("fast", "gpt-4o") == "gpt-4o-mini"
+    with pytest.raises(ValueError):
+        resolve_tier_model("cheap", "gpt-4o")
+
+
+def test_clients_are_built_per_tier(monkeypatch):
+    pytest.importorskip("langchain_openai")
+    monkeypatch.setenv("API_SERVER_TYPE", "openai")
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("MACOSAGENT_LLM_TIER_FAST", "gpt-4o-mini")
+    monkeypatch.delenv("MACOSAGENT_LLM_TIER_VISION", raising=False)
+    assert create_langchain_llm_client("fast").model_name == "gpt-4o-mini"
+    assert create_langchain_llm_client("vision") is create_langchain_llm_client()
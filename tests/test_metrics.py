@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from macosagent.metrics import MetricsRegistry, estimate_cost, metric_context
+
+httpx = pytest.importorskip("httpx")
+
+
+def test_usage_is_labeled_by_agent_and_run():
+    metrics = MetricsRegistry()
+    with metric_context(run_id="run-1"):
+        metrics.record_llm_call("gpt-4o-2024-08-06", 1.5, 200, prompt_tokens=1000, completion_tokens=100, images=1)
+        with metric_context(agent="excel_agent"):
+            metrics.record_llm_call("gpt-4o-2024-08-06", 0.5, 200, prompt_tokens=2000, completion_tokens=50)
+            metrics.record_step(3.0)
+            metrics.record_step(1.0, error=True)
+    metrics.record_step(2.0)
+
+    summary = metrics.run_summary("run-1")
+    assert set(summary["agents"]) == {"orchestrator", "excel_agent"}
+    assert summary["agents"]["excel_agent"]["steps"] == 2
+    assert summary["agents"]["excel_agent"]["step_errors"] == 1
+    assert summary["total"]["prompt_tokens"] == 3000
+    assert summary["total"]["images"] == 1
+    assert summary["total"]["llm_latency_max"] == 1.5
+    assert summary["total"]["cost_usd"] == pytest.approx(estimate_cost("gpt-4o", 3000, 150))
+
+    text = metrics.to_prometheus()
+    assert 'macosagent_llm_prompt_tokens_total{agent="excel_agent",model="gpt-4o-2024-08-06"} 2000' in text
+    assert 'macosagent_steps_total{agent="excel_agent",status="error"} 1' in text
+    assert 'macosagent_step_duration_seconds_bucket{agent="orchestrator",le="2"} 1' in text
+    assert 'macosagent_step_duration_seconds_count{agent="excel_agent"} 2' in text
+
+
+def test_export_writes_prometheus_file_and_run_summary(tmp_path):
+    metrics = MetricsRegistry()
+    with metric_context(run_id="run-2"):
+        metrics.record_step(1.0)
+    metrics.export(tmp_path, "run-2")
+    assert json.loads((tmp_path / "run_run-2.json").read_text())["total"]["steps"] == 1
+    assert "macosagent_steps_total" in (tmp_path / "macosagent.prom").read_text()
+    assert metrics.run_summary("run-2")["agents"] == {}
+
+
+def test_metered_transport_reads_usage(monkeypatch):
+    from macosagent.llm import metering
+
+    metrics = MetricsRegistry()
+    monkeypatch.setattr(metering, "get_metrics", lambda: metrics)
+    body = {"model": "gpt-4o-mini", "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+    transport = metering.MeteredTransport(httpx.MockTransport(lambda request: httpx.Response(200, json=body)))
+    with metric_context(run_id="run-3"):
+        httpx.Client(transport=transport).post(
+            "https://llm.example.com/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:image/png;base64,AA"}}]}]},
+        )
+    total = metrics.run_summary("run-3")["total"]
+    assert (total["llm_calls"], total["prompt_tokens"], total["completion_tokens"], total["images"]) == (1, 12, 3, 1)
@@ -0,0 +1,55 @@
+import time
+
+from macosagent.agents.pipeline import StepLoop, capture_windows
+from macosagent.llm.streaming import stream_step
+from macosagent.metrics import get_metrics
+
+
+def test_phases_overlap_and_background_work_is_off_the_critical_path():
+    written = []
+
+    async def step():
+        encoding = loop.submit("encode", time.sleep, 0.2)
+        with loop.phase("prompt"):
+            time.sleep(0.2)
+            await encoding
+        loop.background("log", lambda: (time.sleep(0.2), written.append(True)))
+        return await loop.call("llm", lambda: "response")
+
+    with StepLoop() as loop:
+        assert loop.run(step()) == "response"
+        timeline = loop.timeline.to_dict()
+        assert timeline["duration"] < 0.35
+        assert timeline["overlap"] > 0.1
+        assert [phase["name"] for phase in timeline["phases"] if phase["critical"]] == ["encode", "prompt", "llm"]
+    assert written == [True]
+    assert "macosagent_step_phase_seconds_count" in get_metrics().to_prometheus()
+
+
+def test_actions_stream_on_the_run_loop():
+    async def get_next_action(on_action):
+        await loop.call("llm", lambda: [on_action(action) for action in ("a", "b")])
+        return {"parsed": None}
+
+    async def multi_act(actions):
+        return [action async for action in actions]
+
+    with StepLoop() as loop:
+        for _ in range(2):
+            assert loop.run(stream_step(get_next_action, multi_act)) == ({"parsed": None}, ["a", "b"])
+
+
+def test_screenshots_are_taken_during_the_walk():
+    frames = {"small": (0, 0, 10, 10), "large": (0, 0, 100, 100), "hidden": None}
+    captured = []
+
+    def take_screenshot(frame):
+        captured.append(frame)
+        return f"shot{frame}"
+
+    trees, screenshots = capture_windows(
+        ["small", "large", "hidden"], frames.get, lambda window: {"window": window}, take_screenshot
+    )
+    assert [tree["window"] for tree in trees] == ["small", "large", "hidden"]
+    assert screenshots == [f"shot{frames['small']}", f"shot{frames['large']}"]
+    assert sorted(captured) == [frames["small"], frames["large"]]
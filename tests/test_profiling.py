@@ -0,0 +1,39 @@
+import json
+import time
+
+from macosagent import profiling
+from macosagent.agents.pipeline import StepLoop
+from macosagent.profiling import profile_phase, start_profiling, stop_profiling
+
+
+def capture():
+    with profile_phase("ax_walk"):
+        time.sleep(0.02)
+    with profile_phase("screencapture"):
+        time.sleep(0.01)
+
+
+def test_phases_are_nested_across_worker_threads(tmp_path):
+    with profile_phase("ignored"):
+        pass
+    profiler = start_profiling(sample_interval=0.005)
+    try:
+        with StepLoop() as loop:
+            loop.run(loop.call("capture", capture))
+    finally:
+        assert stop_profiling() is profiler
+    assert profiling.get_profiler() is None
+
+    paths = profiler.write(tmp_path)
+    timeline = json.loads(paths["timeline"].read_text())
+    spans = {span["name"]: span for span in timeline["spans"]}
+    assert "ignored" not in spans
+    assert spans["ax_walk"]["path"] == ["step", "capture"]
+    assert spans["ax_walk"]["thread"].startswith("macosagent-step")
+    assert timeline["phases"]["ax_walk"]["count"] == 1
+
+    folded = dict(line.rsplit(" ", 1) for line in paths["phases"].read_text().splitlines())
+    assert int(folded["orchestrator;step;capture;ax_walk"]) >= 20000
+    assert "orchestrator;step;capture;screencapture" in folded
+    assert timeline["samples"] > 0
+    assert "test_profiling:capture" in paths["samples"].read_text()
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from macosagent.llm.ratelimit import (  # noqa: E402
+    AdaptiveConcurrency,
+    RateLimitedTransport,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+)
+
+URL = "https://llm.example.com/v1/chat/completions"
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.acquire(600) == 0.0
+    assert bucket.acquire(1) > 0.0
+
+
+def test_aimd_halves_on_throttle_and_grows_back():
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    concurrency.acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+    for _ in range(8):
+        concurrency.acquire()
+        concurrency.release(latency=0.1)
+    assert 5 <= concurrency.limit <= 8
+
+
+def test_estimate_counts_text_images_and_completion():
+    body = json.dumps({
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "x" * 400},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+        ]}],
+        "max_tokens": 100,
+    }).encode()
+    assert estimate_tokens(body) == len("user" + "text" + "x" * 400 + "image_url") // 4 + 765 + 100
+
+
+def test_retries_throttled_requests():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(429, headers={"retry-after-ms": "10"}, json={"error": "slow down"})
+        return httpx.Response(200, json={"usage": {"total_tokens": 5}})
+
+    limiter = RateLimiter(tokens_per_minute=10_000, max_retries=3, retry_base=0.01, retry_max=0.05)
+    client = httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handler), limiter))
+    response = client.post(URL, json={"messages": []})
+    assert response.status_code == 200 and response.json()["usage"]["total_tokens"] == 5
+    assert len(calls) == 3
+    assert limiter.stats.retries == 2 and limiter.stats.throttled == 2
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_gives_up_after_max_retries():
+    limiter = RateLimiter(max_retries=1, retry_base=0.01, retry_max=0.01)
+    transport = RateLimitedTransport(httpx.MockTransport(lambda request: httpx.Response(503)), limiter)
+    response = httpx.Client(transport=transport).post(URL, json={"messages": []})
+    assert response.status_code == 503
+    assert limiter.stats.retries == 1 and limiter.concurrency.in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "error, calls_made",
+    [(httpx.ConnectError("refused"), 2), (httpx.RemoteProtocolError("disconnected"), 2), (httpx.ReadTimeout("slow"), 1)],
+    ids=["connect", "stale-connection", "read-timeout"],
+)
+def test_retries_only_requests_that_did_not_reach_the_model(error, calls_made):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            raise error
+        return httpx.Response(200, json={})
+
+    limiter = RateLimiter(max_retries=3, retry_base=0.01, retry_max=0.01)
+    client = httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handler), limiter))
+    if calls_made == 1:
+        with pytest.raises(httpx.ReadTimeout):
+            client.post(URL, json={"messages": []})
+        assert limiter.stats.failed == 1
+    else:
+        assert client.post(URL, json={"messages": []}).status_code == 200
+        assert limiter.stats.retries == 1
+    assert len(calls) == calls_made
+    assert limiter.concurrency.in_flight == 0
@@ -0,0 +1,132 @@
+import copy
+import json
+import time
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import AIMessageChunk, messages_to_dict
+
+import macosagent.agents.react.engine as engine
+from macosagent import artifacts
+from macosagent.agents.react import AppAdapter, ReactAppAgent
+from tests.react_fakes import APPS, STEPS, AgentOutput, FakeContext, FakeController, FakeLLM, FrozenDatetime, forget_app, import_service
+
+DATA = Path(__file__).parent / "data"
+
+# Prompts of a two-step run of every app agent, recorded with these fakes by
+# data/record_react_replay.py before their ReactJsonAgent copies were replaced by
+# the shared engine. Intended prompt changes since then are in react_replay_changes.json.
+RECORDED = json.loads((DATA / "react_replay.json").read_text())
+CHANGES = json.loads((DATA / "react_replay_changes.json").read_text())
+
+
+def expected_prompts(app: str) -> list:
+    prompts = copy.deepcopy(RECORDED[app]["prompts"])
+    for change in CHANGES:
+        for message in (message for prompt in prompts for message in prompt):
+            if isinstance(message["data"]["content"], list):
+                message["data"]["content"] = [change["replace"] if part == change["find"] else part for part in message["data"]["content"]]
+    return prompts
+
+
+@pytest.fixture
+def service(request, monkeypatch, tmp_path):
+    monkeypatch.setenv("LANG", "en_US.UTF-8")
+    monkeypatch.setattr(engine, "datetime", FrozenDatetime)
+    monkeypatch.setattr(engine, "create_llm_engine", lambda tier: None)
+    monkeypatch.setattr(artifacts, "_writer", artifacts.ArtifactWriter(tmp_path, level="none"))
+    yield import_service(request.param)
+    forget_app(request.param)
+
+
+@pytest.mark.parametrize("service", APPS, indirect=True)
+def test_engine_replays_the_recorded_prompts(service):
+    app = service.ReactJsonAgent.adapter.name.removesuffix("_agent")
+    recorded = RECORDED[app]
+    assert service.ReactJsonAgent.adapter.max_iterations == recorded["max_iterations"]
+
+    llm, final = FakeLLM(), []
+    agent = service.ReactJsonAgent(llm=llm)
+    agent.stream_actions = False
+    agent.llm_engine = lambda prompt: final.append(prompt) or "answer"
+    assert agent.run("Click OK") == "answer"
+    assert {name: {"config": opened.config, "activated": opened.activated} for name, opened in vars(agent.context).items()} == recorded["apps"]
+    assert [messages_to_dict(prompt) for prompt in llm.prompts] == expected_prompts(app)
+    assert [{"role": message["role"].value, "content": message["content"]} for message in final[0]] == recorded["final_prompt"]
+
+
+class SlowLLM(FakeLLM):
+    def invoke(self, prompt):
+        if self.prompts:
+            time.sleep(0.5)
+        return super().invoke(prompt)
+
+
+def test_run_deadline_answers_from_the_partial_history(monkeypatch, tmp_path):
+    monkeypatch.setenv("MACOSAGENT_RUN_TIMEOUT", "1")
+    monkeypatch.setenv("MACOSAGENT_TIMEOUT_LLM", "0.3")
+    monkeypatch.setattr(engine, "create_llm_engine", lambda tier: None)
+    monkeypatch.setattr(artifacts, "_writer", artifacts.ArtifactWriter(tmp_path, level="none"))
+
+    class Agent(ReactAppAgent):
+        adapter = AppAdapter(
+            name="excel_agent",
+            system_prompt="You are an agent.",
+            agent_output=AgentOutput,
+            create_context=FakeContext,
+            create_controller=FakeController,
+        )
+
+    final = []
+    agent = Agent(llm=SlowLLM(), max_iterations=20)
+    agent.stream_actions = False
+    agent.llm_engine = lambda prompt: final.append(prompt) or "partial answer"
+    start = time.monotonic()
+    assert agent.run("Click OK") == "partial answer"
+    assert time.monotonic() - start < 2
+    assert {timed_out["phase"] for timed_out in agent.timed_out} == {"llm", "run"}
+    assert agent.timed_out[-1]["phase"] == "run"
+    assert "got stuck" in final[0][0]["content"]
+    assert "click_element" in final[0][1]["content"]
+
+
+class StreamingLLM(FakeLLM):
+    """Streams the last step of STEPS, after a first output that is not a tool call."""
+
+    def bind_tools(self, tools, tool_choice, parallel_tool_calls):
+        return self
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        if len(self.prompts) == 1:
+            yield AIMessageChunk(content="I cannot see the screen.")
+            return
+        args = json.dumps(STEPS[-1])
+        yield AIMessageChunk(content="", tool_call_chunks=[{"name": "AgentOutput", "args": args, "id": "call_2", "index": 0}])
+
+
+def test_invalid_streamed_output_is_recorded_in_the_history(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, "create_llm_engine", lambda tier: None)
+    monkeypatch.setattr(artifacts, "_writer", artifacts.ArtifactWriter(tmp_path, level="none"))
+
+    class Agent(ReactAppAgent):
+        adapter = AppAdapter(
+            name="excel_agent",
+            system_prompt="You are an agent.",
+            agent_output=AgentOutput,
+            create_context=FakeContext,
+            create_controller=FakeController,
+        )
+
+    llm = StreamingLLM()
+    agent = Agent(llm=llm, max_iterations=3)
+    agent.stream_actions = True
+    agent.llm_engine = lambda prompt: "answer"
+    assert agent.run("Click OK") == "answer"
+    assert len(llm.prompts) == 2
+    first = list(agent.history)[0]
+    assert (first["tool_calls"], first["content"]) == ([], "I cannot see the screen.")
+    assert first["observation"] == ["Output error: The model did not call AgentOutput: I cannot see the screen."]
+    # The next step is prompted with the failed output and its error.
+    contents = [message.content for message in llm.prompts[1]]
+    assert contents.index("I cannot see the screen.") + 1 == contents.index(first["observation"][0])
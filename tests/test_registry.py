@@ -0,0 +1,82 @@
+from dataclasses import replace
+
+import pytest
+from smolagents import Tool
+
+from macosagent import scheduler
+from macosagent.agents.registry import AGENT_SPECS, AgentSpec, LazyAgentTool
+from macosagent.scheduler import ToolScheduler
+
+
+@pytest.mark.parametrize("spec", AGENT_SPECS, ids=lambda spec: spec.key)
+def test_spec_matches_the_real_tool(spec):
+    module_name, class_name = spec.target.split(":")
+    tool_class = getattr(pytest.importorskip(module_name), class_name)
+    assert (spec.name, spec.description, spec.inputs, spec.output_type) == (
+        tool_class.name,
+        tool_class.description,
+        tool_class.inputs,
+        tool_class.output_type,
+    )
+
+
+class EchoAgent(Tool):
+    name = "echo_agent"
+    description = "Echoes its instruction."
+    inputs = {"instruction": {"description": "Text to echo", "type": "string"}}
+    output_type = "string"
+    built = 0
+
+    def __init__(self):
+        super().__init__()
+        EchoAgent.built += 1
+
+    def setup(self):
+        self.gui_lock = scheduler.get_scheduler().gui_lock
+        self.is_initialized = True
+
+    def forward(self, instruction: str) -> str:
+        return f"{instruction} ({self.gui_lock.holder})"
+
+
+ECHO_SPEC = AgentSpec(
+    key="echo_agent",
+    name=EchoAgent.name,
+    description=EchoAgent.description,
+    target=f"{__name__}:EchoAgent",
+    inputs=EchoAgent.inputs,
+)
+
+
+@pytest.fixture(autouse=True)
+def tool_scheduler(monkeypatch):
+    tool_scheduler = ToolScheduler(max_workers=1)
+    monkeypatch.setattr(scheduler, "_scheduler", tool_scheduler)
+    yield tool_scheduler
+    tool_scheduler.shutdown()
+
+
+def test_real_tool_is_built_on_first_call(monkeypatch):
+    monkeypatch.setattr(EchoAgent, "built", 0)
+    tool = LazyAgentTool(ECHO_SPEC)
+    assert not tool.is_loaded and EchoAgent.built == 0
+
+    # The real tool's own setup runs before its forward.
+    assert tool(instruction="hi") == "hi (echo_agent)"
+    assert tool({"instruction": "again"}) == "again (echo_agent)"
+    assert tool.is_loaded and EchoAgent.built == 1
+    assert tool.load_duration is not None
+
+
+@pytest.mark.parametrize(
+    "spec, holder",
+    [
+        (ECHO_SPEC, "echo_agent"),
+        (replace(ECHO_SPEC, locks_per_action=True), None),
+        (replace(ECHO_SPEC, gui_bound=False), None),
+    ],
+    ids=["whole-run", "per-action", "not-gui"],
+)
+def test_gui_lock_is_held_for_the_whole_run_only_when_needed(spec, holder, tool_scheduler):
+    assert LazyAgentTool(spec)(instruction="hi") == f"hi ({holder})"
+    assert not tool_scheduler.gui_lock.locked()
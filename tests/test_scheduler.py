@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from smolagents import Tool
+
+from macosagent import scheduler
+from macosagent.scheduler import (
+    FairLock,
+    GuiActionRegistry,
+    ToolScheduler,
+    async_gui_session,
+    create_dispatch_tools,
+    gui_session,
+)
+
+
+@pytest.fixture
+def gui_lock(monkeypatch):
+    tool_scheduler = ToolScheduler(max_workers=2)
+    monkeypatch.setattr(scheduler, "_scheduler", tool_scheduler)
+    yield tool_scheduler.gui_lock
+    tool_scheduler.shutdown()
+
+
+def test_lock_is_granted_in_request_order():
+    lock = FairLock()
+    order = []
+    lock.acquire("first")
+
+    def take(name):
+        lock.acquire(name)
+        order.append(name)
+        lock.release()
+
+    threads = []
+    for name in ("a", "b", "c"):
+        threads.append(threading.Thread(target=take, args=(name,)))
+        threads[-1].start()
+        while len(lock._queue) < len(threads):
+            time.sleep(0.001)
+    lock.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["a", "b", "c"]
+    assert (lock.stats.acquisitions, lock.stats.contended) == (4, 3)
+    assert (lock.last_holder, lock.holder) == ("b", "c")
+
+
+def test_lock_is_reentrant_per_owner():
+    lock = FairLock()
+    lock.acquire("word_agent")
+    assert lock.acquire("word_agent") == 0.0
+    lock.release()
+    assert lock.locked()
+    lock.release()
+    assert not lock.locked()
+    assert lock.stats.acquisitions == 1
+
+    owner = object()
+    lock.acquire("excel_agent", owner)
+    assert lock.owned_by(owner)
+    with pytest.raises(RuntimeError):
+        lock.release()
+    lock.release(owner)
+    assert not lock.locked()
+
+
+def test_second_agent_waits_without_blocking_its_event_loop(gui_lock):
+    held = threading.Event()
+
+    def first_agent():
+        with gui_session("word_agent"):
+            held.set()
+            time.sleep(0.3)
+
+    async def second_agent():
+        async with async_gui_session("excel_agent") as waited:
+            return waited, gui_lock.last_holder
+
+    async def ticker(ticks):
+        while True:
+            await asyncio.sleep(0.02)
+            ticks.append(gui_lock.holder)
+
+    async def main():
+        ticks = []
+        task = asyncio.create_task(ticker(ticks))
+        result = await asyncio.wait_for(second_agent(), 5)
+        task.cancel()
+        return result, ticks
+
+    thread = threading.Thread(target=first_agent)
+    thread.start()
+    held.wait()
+    (waited, last_holder), ticks = asyncio.run(main())
+    thread.join()
+    assert waited > 0.2
+    assert last_holder == "word_agent"
+    # The event loop kept running while the lock was held by the other agent.
+    assert ticks.count("word_agent") >= 5
+    assert not gui_lock.locked()
+
+
+def test_nested_sessions_of_a_task_reenter_the_lock(gui_lock):
+    async def action():
+        async with async_gui_session("word_agent"):
+            with gui_session("word_agent"):
+                return gui_lock._depth
+
+    async def burst():
+        async with async_gui_session("word_agent"):
+            # Actions run in child tasks and worker threads of the burst.
+            depths = [await asyncio.wait_for(action(), 5)]
+            depths.append(await asyncio.to_thread(lambda: asyncio.run(action())))
+            return depths
+
+    assert asyncio.run(asyncio.wait_for(burst(), 5)) == [3, 3]
+    assert not gui_lock.locked()
+    assert gui_lock.stats.acquisitions == 1
+
+
+class WordRegistry(GuiActionRegistry):
+    holder = "word_agent"
+    app_name = "word"
+
+    def __init__(self):
+        self.init_gui_actions()
+        for name, gui_bound, effect in [("click", True, None), ("type_text", True, "input"), ("save_docx", False, None)]:
+            self.register_gui_action(name, gui_bound, self.action_effect(gui_bound, effect))
+
+
+def test_registry_locks_only_gui_bound_actions(gui_lock):
+    registry = WordRegistry()
+    context = SimpleNamespace(word=SimpleNamespace(word_app=None))
+    assert registry.action_effects == {"click": "gui", "type_text": "input", "save_docx": "static"}
+    with pytest.raises(ValueError, match="Unknown action effect"):
+        registry.action_effect(True, "scroll")
+
+    async def holders():
+        held = []
+        for name in ("click", "save_docx"):
+            async with registry.action_session(name, context):
+                held.append(gui_lock.locked())
+        return held
+
+    assert asyncio.run(holders()) == [True, False]
+    assert (gui_lock.holder, gui_lock.stats.acquisitions) == ("word_agent", 1)
+    assert not gui_lock.locked()
+
+
+class EchoTool(Tool):
+    name = "echo_agent"
+    description = "Echoes its instruction."
+    inputs = {"instruction": {"description": "Text to echo", "type": "string"}}
+    output_type = "string"
+
+    def forward(self, instruction: str) -> str:
+        if instruction == "fail":
+            raise ValueError("cannot echo")
+        time.sleep(0.05)
+        return instruction.upper()
+
+
+def test_submitted_calls_are_gathered_in_handle_order(gui_lock):
+    submit, gather = create_dispatch_tools([EchoTool()])
+    first = submit.forward("echo_agent", {"instruction": "one"})
+    second = submit.forward("echo_agent", {"instruction": "fail"})
+    assert first == "echo_agent#1"
+    assert gather.forward([second, first, first]) == [
+        "Error in echo_agent#2: ValueError: cannot echo",
+        "ONE",
+        "Error: unknown or already gathered handle 'echo_agent#1'",
+    ]
+    with pytest.raises(ValueError, match="Unknown agent"):
+        submit.forward("word_agent", {})
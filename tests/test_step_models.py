@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from pydantic import BaseModel, create_model
+
+from macosagent.agents.step_models import StepModelCache
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.registry = SimpleNamespace(actions={"click": "click action"})
+        self.created = 0
+
+    def create_action_model(self) -> type[BaseModel]:
+        self.created += 1
+        return create_model("ActionModel", **{name: (str | None, None) for name in self.registry.actions})
+
+    def get_prompt_description(self) -> str:
+        return ", ".join(self.registry.actions)
+
+
+class AgentOutput(BaseModel):
+    @staticmethod
+    def type_with_custom_actions(action_model: type[BaseModel]) -> type[BaseModel]:
+        return create_model("AgentOutput", action=(list[action_model], ...))
+
+
+class FakeLLM:
+    def __init__(self):
+        self.structured = 0
+
+    def with_structured_output(self, schema, include_raw, method):
+        self.structured += 1
+        return (schema, method)
+
+
+def test_models_are_built_once_per_action_set():
+    registry, llm = FakeRegistry(), FakeLLM()
+    cache = StepModelCache(registry, AgentOutput)
+    first = cache.get()
+    assert cache.get() is first and registry.created == 1
+    assert cache.structured_llm(llm, "function_calling") is cache.structured_llm(llm, "function_calling")
+    assert llm.structured == 1
+
+    registry.registry.actions["type"] = "type action"
+    second = cache.get()
+    assert second is not first and second.prompt_description == "click, type"
+    assert "type" in second.action_model.model_fields
+    assert cache.structured_llm(llm, "function_calling")[0] is second.agent_output
+    assert registry.created == 2 and llm.structured == 2
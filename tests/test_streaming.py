@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+from pydantic import BaseModel, ConfigDict
+
+from macosagent.deadlines import PhaseTimeout, deadline_scope
+from macosagent.llm.streaming import ActionArrayParser, iterate_actions, stream_agent_output, stream_step
+
+ARGS = json.dumps({
+    "current_state": {"memory": "escaped \"quote\" and [brackets] {braces}", "next_goal": "action"},
+    "action": [{"click_element": {"index": 1}}, {"input_text": {"index": 2, "text": "a}]b"}}],
+})
+
+
+def test_actions_are_emitted_as_soon_as_they_close():
+    parser = ActionArrayParser()
+    emitted = []
+    for i, char in enumerate(ARGS):
+        for action in parser.feed(char):
+            emitted.append((i, action))
+    assert [action for _, action in emitted] == json.loads(ARGS)["action"]
+    first_end = ARGS.index("}}") + 1
+    assert emitted[0][0] == first_end
+
+
+def test_other_arrays_are_ignored():
+    parser = ActionArrayParser()
+    assert parser.feed('{"memory": [{"x": 1}], "action": [') == []
+    assert parser.feed('{"done": {"text": "ok"}}]}') == [{"done": {"text": "ok"}}]
+
+
+class Action(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    click_element: dict | None = None
+    input_text: dict | None = None
+    done: dict | None = None
+
+
+class AgentOutput(BaseModel):
+    current_state: dict
+    action: list[Action]
+
+
+class StreamingLLM:
+    """Streams the arguments of an ``AgentOutput`` tool call in small chunks."""
+
+    def __init__(self, args: str, chunk_size: int = 8, pause: float = 0.0, wait_for: threading.Event | None = None):
+        self.args = args
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.wait_for = wait_for
+        self.finished = False
+
+    def bind_tools(self, tools, tool_choice, parallel_tool_calls):
+        assert tool_choice == "AgentOutput"
+        return self
+
+    def stream(self, prompt):
+        yield AIMessageChunk(content="", tool_call_chunks=[{"name": "AgentOutput", "args": "", "id": "call_1", "index": 0}])
+        for start in range(0, len(self.args), self.chunk_size):
+            if self.wait_for is not None and start > len(self.args) // 2:
+                # Generation only continues once the first action has run.
+                assert self.wait_for.wait(5)
+            time.sleep(self.pause)
+            yield AIMessageChunk(content="", tool_call_chunks=[{"args": self.args[start:start + self.chunk_size], "index": 0}])
+        self.finished = True
+
+
+def test_actions_run_while_the_model_generates():
+    first_ran = threading.Event()
+    llm = StreamingLLM(ARGS.replace('"a}]b"', '"' + "x" * 200 + '"'), wait_for=first_ran)
+    ran = []
+
+    async def multi_act(actions):
+        results = []
+        async for action in iterate_actions(actions):
+            ran.append((action.model_dump(exclude_unset=True), llm.finished))
+            first_ran.set()
+            results.append(len(ran))
+        return results
+
+    async def main():
+        return await stream_step(
+            lambda on_action: asyncio.to_thread(stream_agent_output, llm, [], AgentOutput, Action, on_action),
+            multi_act,
+        )
+
+    response, results = asyncio.run(main())
+    assert response["parsing_error"] is None and len(response["parsed"].action) == 2
+    assert results == [1, 2]
+    assert ran[0] == ({"click_element": {"index": 1}}, False)
+
+
+def test_actions_after_an_invalid_element_run_from_the_parsed_output():
+    args = json.dumps({"current_state": {}, "action": [{"click_element": {"index": 1}}, {"scroll": {}}, {"done": {}}]})
+    dispatched = []
+    response = stream_agent_output(StreamingLLM(args), [], AgentOutput, Action, dispatched.append)
+    # Dispatching stops at the first invalid element, and the output fails to parse.
+    assert [action.model_dump(exclude_unset=True) for action in dispatched] == [{"click_element": {"index": 1}}]
+    assert response["parsed"] is None and response["parsing_error"] is not None
+    assert response["raw"].tool_calls[0]["args"]["action"][1] == {"scroll": {}}
+
+    actions = [{"click_element": {"index": 1}}, {"input_text": {"index": 2, "text": "a}]b"}}, {"done": {}}]
+    parsed = AgentOutput(current_state={}, action=[Action.model_validate(action) for action in actions])
+
+    async def get_next_action(on_action):
+        # As if the second element had failed validation while streaming.
+        on_action(parsed.action[0])
+        return {"raw": None, "parsed": parsed, "parsing_error": None}
+
+    async def multi_act(actions):
+        return [action.model_dump(exclude_unset=True) async for action in iterate_actions(actions)]
+
+    _, results = asyncio.run(stream_step(get_next_action, multi_act))
+    assert results == actions
+
+
+def test_stream_stops_at_the_deadline():
+    llm = StreamingLLM(ARGS, chunk_size=1, pause=0.01)
+    start = time.monotonic()
+    with deadline_scope("llm", 0.2), pytest.raises(PhaseTimeout) as error:
+        stream_agent_output(llm, [], AgentOutput, Action, lambda action: None)
+    assert time.monotonic() - start < 1
+    assert error.value.phase == "llm"
+    assert not llm.finished
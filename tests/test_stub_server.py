@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from macosagent.benchmarks.stub_server import LatencyModel, StubLLM, StubServer, default_script
+
+httpx = pytest.importorskip("httpx")
+
+TOOLS = [{"type": "function", "function": {"name": "AgentOutput", "parameters": {}}}]
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer(StubLLM(default_script(steps=2))).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _arguments(response: httpx.Response) -> dict:
+    return json.loads(response.json()["choices"][0]["message"]["tool_calls"][0]["function"]["arguments"])
+
+
+def test_agent_outputs_follow_the_conversation(stub_server):
+    url = f"{stub_server.base_url}/chat/completions"
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "task"}]
+    with httpx.Client() as client:
+        first = _arguments(client.post(url, json={"messages": messages, "tools": TOOLS}))
+        assert first["action"] == []
+        messages.append({"role": "assistant", "content": None})
+        second = _arguments(client.post(url, json={"messages": messages, "tools": TOOLS}))
+        assert second["action"][0]["done"]["success"] is True
+        # A new run of the same task starts over.
+        restart = _arguments(client.post(url, json={"messages": messages[:2], "tools": TOOLS}))
+        assert restart["action"] == []
+        text = client.post(url, json={"messages": messages[:1]}).json()
+        assert text["choices"][0]["message"]["content"] == default_script()["text"]
+        assert text["usage"]["prompt_tokens"] > 0
+
+
+def test_injected_errors_and_latency():
+    stub = StubLLM(latency=LatencyModel.parse("uniform:0.1:0.2"), error_rate=1.0, error_status=503, seed=0)
+    latency, fail = stub.sample("text")
+    assert 0.1 <= latency <= 0.2 and fail
+    with pytest.raises(ValueError):
+        LatencyModel.parse("gamma:1")
@@ -0,0 +1,80 @@
+from macosagent.llm import tracing
+from macosagent.llm.tracing import Span, Tracer, trace_function, trace_with_metadata
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _tracer(sample_rate: float = 1.0) -> tuple[Tracer, ListExporter]:
+    exporter = ListExporter()
+    return Tracer(exporter, sample_rate=sample_rate, flush_interval=60), exporter
+
+
+def test_disabled_tracing_returns_the_function_itself():
+    def step():
+        return 1
+
+    assert trace_function(step, None, "step") is step
+
+
+def test_spans_nest_under_the_run_and_record_generations():
+    tracer, exporter = _tracer()
+    agent = trace_function(lambda: tracer.record_generation("gpt", 1.0, 2.0, 200, 10, 2), tracer, "excel", tags=["excel"])
+    run = trace_function(agent, tracer, "run", trace_name="execute", trace_key="run-1")
+    run()
+    tracer.shutdown()
+
+    generation, span, root = exporter.spans
+    assert root.kind == "trace" and root.name == "execute" and root.tags == ["excel"]
+    assert span.parent_id == root.span_id and span.trace_id == root.trace_id
+    assert generation.parent_id == span.span_id
+    assert generation.metadata["prompt_tokens"] == 10 and generation.error is None
+    assert tracer.stats.exported == 3
+
+
+def test_unsampled_runs_record_nothing():
+    tracer, exporter = _tracer(sample_rate=0.0)
+    inner = trace_function(lambda: tracer.record_generation("gpt", 1.0, 2.0, 500), tracer, "inner")
+    trace_function(inner, tracer, "run", trace_key="run-1")()
+    tracer.shutdown()
+    assert exporter.spans == [] and tracer.stats.unsampled == 1
+
+
+def test_decorated_functions_use_the_tracer_configured_later(monkeypatch):
+    monkeypatch.setattr(tracing, "_tracer", None)
+    monkeypatch.setattr(tracing, "_configured", False)
+    monkeypatch.delenv("ENABLE_TRACING", raising=False)
+
+    # Decorated at import time, before the CLI loads the tracing settings.
+    @trace_with_metadata(name="execute", custom_id="run-1")
+    def run():
+        return "done"
+
+    assert not tracing._configured
+    tracer, exporter = _tracer()
+    monkeypatch.setattr(tracing, "create_tracer", lambda: tracer)
+    assert run() == "done"
+    tracer.shutdown()
+    assert [(span.kind, span.name, span.metadata["custom_id"]) for span in exporter.spans] == [("trace", "execute", "run-1")]
+
+
+def test_calls_skip_tracing_once_it_is_found_disabled(monkeypatch):
+    monkeypatch.setattr(tracing, "_tracer", None)
+    monkeypatch.setattr(tracing, "_configured", False)
+    created = []
+    monkeypatch.setattr(tracing, "create_tracer", lambda: created.append(1))
+
+    @trace_with_metadata(name="execute")
+    def run():
+        return "done"
+
+    assert [run(), run()] == ["done", "done"]
+    assert created == [1]